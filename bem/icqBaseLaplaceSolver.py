@@ -1,84 +1,697 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+import os
+import tempfile
+import multiprocessing
 import vtk
+from vtk.util import numpy_support
 import numpy
 from icqsol.bem.icqBaseSolver import BaseSolver
-from icqsol.bem.icqPotentialIntegrals import PotentialIntegrals
+from icqsol.bem.icqPotentialIntegrals import getIntegralsOneOverR
 from icqsol.bem.icqQuadrature import gaussPtsAndWeights
+from icqsol.bem.icqFastMultipole import FastMultipoleOperator
+from icqsol.bem.icqHierarchicalMatrix import HierarchicalMatrix
+from icqsol.bem.icqPackedSymmetricMatrix import PackedSymmetricMatrix
+from icqsol.bem.icqMatrixCache import MatrixCache
+from icqsol.bem.icqOutOfCoreMatrix import OutOfCoreMatrix
+from icqsol.bem.icqCirculantMatrix import BlockCirculantMatrix, getSectorTriangles
+from icqsol.bem.icqMirrorMatrix import MirrorSymmetricMatrix
+from icqsol.bem.icqDistributedAssembly import assembleWithPool, FileCoordinator, runWorker
 from icqsol.util.icqSharedLibraryUtils import getSharedLibraryName
-from ctypes import cdll, POINTER, byref, c_void_p, c_double, c_long
+from ctypes import cdll, POINTER, byref, c_void_p, c_double, c_long, c_int
 
 FOUR_PI = 4. * numpy.pi
 
+# storage of the Green function matrix
+DENSE = 'dense'
+FMM = 'fmm'
+HMATRIX = 'hmatrix'
+PACKED = 'packed'
+STREAM = 'stream'
+OUT_OF_CORE = 'outofcore'
+CIRCULANT = 'circulant'
+MIRROR = 'mirror'
+STORAGE_TYPES = [DENSE, FMM, HMATRIX, PACKED, STREAM, OUT_OF_CORE, CIRCULANT, MIRROR]
+
+# discretization of the integral equation
+GALERKIN = 'galerkin'
+COLLOCATION = 'collocation'
+METHOD_TYPES = [GALERKIN, COLLOCATION]
+# storage compatible with the (non-symmetric) collocation matrix
+COLLOCATION_STORAGE_TYPES = [DENSE, FMM, HMATRIX, STREAM, CIRCULANT, MIRROR]
+
+
+class StreamingGreenOperator:
+
+    def __init__(self, diag, computeMatVec):
+        """
+        Constructor
+        @param diag diagonal elements of the matrix
+        @param computeMatVec function x -> off-diagonal part of G.x,
+                             x of shape (n,) or (n, nrhs)
+        @note the matrix elements are recomputed on every product, the
+              memory footprint is O(n)
+        """
+        n = len(diag)
+        self.shape = (n, n)
+        self.diag = diag
+        self.computeMatVec = computeMatVec
+
+    def dot(self, vec):
+        """
+        Apply the operator to a vector
+        @param vec vector or array of shape (n, nrhs)
+        @return result, same shape as vec
+        """
+        vec = numpy.asarray(vec, numpy.float64)
+        diag = self.diag
+        if vec.ndim == 2:
+            diag = self.diag[:, numpy.newaxis]
+        return self.computeMatVec(vec) + diag * vec
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        return self.diag.copy()
+
+
 class BaseLaplaceSolver(BaseSolver):
 
-    def __init__(self, pdata, max_edge_length, order=5):
+    def __init__(self, pdata, max_edge_length, order=5, num_threads=0,
+                 quadrature_tol=0., storage=DENSE, leaf_size=32, fmm_theta=0.5,
+                 hmatrix_eta=1.0, hmatrix_tol=1.e-6, cache_dir=None,
+                 tile_size=512, scratch_dir=None, num_procs=1, job_dir=None,
+                 job_timeout=None, job_lease_time=None,
+                 double_layer=False, method=GALERKIN, num_sectors=None,
+                 symmetry_axis=None, mirror_planes=None, mirror_center=None):
         """
         Constructor
-        @param pdata instance of vtkPolyData
+        @param pdata instance of vtkPolyData, or a BemMesh shared with 
+                     other solvers (operators assembled with the same
+                     parameters are then reused)
         @param max_edge_length maximum edge length, used to turn
                                polygons into triangles
+        @param order order of the Gauss quadrature scheme
+        @param num_threads number of OpenMP threads used in the assembly
+                           (0 to use the OpenMP default)
+        @param quadrature_tol relative tolerance used to lower the quadrature
+                              order of well separated triangle pairs (0 to
+                              use the maximum order for all pairs). The
+                              near field pairs (e.g. sharing an edge or a
+                              vertex) are integrated in closed form over
+                              one triangle
+        @param storage DENSE (assemble the full matrix), FMM (matrix-free,
+                       multipole approximation of the far field), HMATRIX
+                       (low rank compression of the far field blocks),
+                       PACKED (upper triangle of the symmetric matrix A.G),
+                       STREAM (matrix-free, the elements are recomputed 
+                       in each product), OUT_OF_CORE (dense matrix in a
+                       memory-mapped file), CIRCULANT (rotationally
+                       symmetric surface, the rows of one sector are 
+                       assembled and the matrix is block diagonalized by
+                       FFTs, see num_sectors) or MIRROR (surface symmetric
+                       about coordinate planes, the rows of the fundamental
+                       domain are assembled and folded into one block per
+                       parity, see mirror_planes)
+        @param leaf_size maximum number of triangles in a leaf of the FMM
+                         octree or of the HMATRIX cluster tree
+        @param fmm_theta opening parameter of the FMM operator, smaller
+                         values are more accurate and more expensive
+        @param hmatrix_eta admissibility parameter of the HMATRIX blocks,
+                           smaller values are more accurate and more expensive
+        @param hmatrix_tol relative accuracy of the HMATRIX low rank blocks
+        @param cache_dir directory where DENSE and PACKED matrices are cached,
+                         a matrix assembled for the same mesh and parameters
+                         is memory-mapped instead of recomputed (None to
+                         disable the cache)
+        @param tile_size number of rows and columns of the OUT_OF_CORE tiles
+        @param scratch_dir directory of the OUT_OF_CORE and of the 
+                           distributed DENSE memory-mapped files (None for 
+                           the default temporary directory)
+        @param num_procs number of processes assembling the DENSE matrix,
+                         each uses num_threads OpenMP threads (1 if
+                         num_threads is 0)
+        @param job_dir job directory, shared with workers on other hosts
+                       (see examples/assemblyWorker.py), through which the
+                       DENSE matrix is assembled (None to use a local pool
+                       of processes)
+        @param job_timeout maximum time in seconds to wait for the tasks of
+                           the job directory (None to wait forever)
+        @param job_lease_time time in seconds after which a task claimed by
+                              a worker of another host is put back in the
+                              queue (None to only requeue the tasks of dead
+                              processes of this host), see FileCoordinator
+        @param double_layer also assemble the double layer matrix (normal
+                            derivative of the kernel), in the same pass 
+                            as the DENSE Green matrix
+        @param method GALERKIN (integrate over the observer and source 
+                      triangles) or COLLOCATION (observer at the centroid,
+                      about order times faster to assemble but less 
+                      accurate, and A.G is no longer symmetric). 
+                      COLLOCATION supports storage DENSE (single process), 
+                      FMM, HMATRIX, STREAM, CIRCULANT and MIRROR
+        @param num_sectors number of identical sectors of a rotationally
+                           symmetric surface (e.g. n_theta of the sphere,
+                           cylinder and cone primitives), required by the
+                           CIRCULANT storage
+        @param symmetry_axis direction of the symmetry axis of the CIRCULANT
+                             storage, the axis goes through the centroid of
+                             the surface (None to try the x, y and z axes)
+        @param mirror_planes coordinate planes of mirror symmetry, e.g. 
+                             ['x', 'z'], required by the MIRROR storage. 
+                             The surface is cut by the planes and its part
+                             on their positive side is reflected, see BemMesh
+        @param mirror_center point of the mirror planes (None for the 
+                             centroid of the surface)
+        @note the operators are assembled when first needed (getGreenMatrix,
+              getGreenOperator, computeResponseField, ...) or by assemble()
         """
 
-        BaseSolver.__init__(self, pdata, max_edge_length, order)
+        BaseSolver.__init__(self, pdata, max_edge_length, order, mirror_planes=mirror_planes,
+                            mirror_center=mirror_center)
+
+        if storage not in STORAGE_TYPES:
+            msg = 'ERROR: unknown storage {0}, must be one of {1}!'.format(storage, STORAGE_TYPES)
+            raise RuntimeError(msg)
+        if double_layer and storage != DENSE:
+            msg = 'ERROR: the double layer matrix requires storage {0}!'.format(DENSE)
+            raise RuntimeError(msg)
+        if storage == CIRCULANT and num_sectors is None:
+            msg = 'ERROR: storage {0} requires the number of sectors!'.format(storage)
+            raise RuntimeError(msg)
+        if storage == MIRROR and self.mesh.numImages == 1:
+            msg = 'ERROR: storage {0} requires mirror planes!'.format(storage)
+            raise RuntimeError(msg)
+        if method not in METHOD_TYPES:
+            msg = 'ERROR: unknown method {0}, must be one of {1}!'.format(method, METHOD_TYPES)
+            raise RuntimeError(msg)
+        if method == COLLOCATION:
+            if storage not in COLLOCATION_STORAGE_TYPES:
+                msg = 'ERROR: method {0} requires storage {1}!'.format(method,
+                                                                      COLLOCATION_STORAGE_TYPES)
+                raise RuntimeError(msg)
+            if double_layer or num_procs > 1 or job_dir is not None:
+                msg = 'ERROR: method {0} does not support the double layer matrix ' \
+                      'nor the distributed assembly!'.format(method)
+                raise RuntimeError(msg)
+
+        self.numThreads = num_threads
+        self.quadTol = quadrature_tol
+        self.storage = storage
+        self.method = method
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = MatrixCache(cache_dir)
 
         libName = getSharedLibraryName('icqLaplaceMatricesCpp')
         self.lib = cdll.LoadLibrary(libName)
 
-        shp = (self.numTriangles, self.numTriangles)
-        self.gMat = numpy.zeros(shp, numpy.float64)
+        self.__computeGeometry()
+
+        if symmetry_axis is not None:
+            # hashable, part of the assembly key
+            symmetry_axis = tuple(symmetry_axis)
+
+        # the operators are assembled on demand, see assemble()
+        self.assemblyOptions = dict(storage=storage, leaf_size=leaf_size,
+                                    fmm_theta=fmm_theta, hmatrix_eta=hmatrix_eta,
+                                    hmatrix_tol=hmatrix_tol, tile_size=tile_size,
+                                    scratch_dir=scratch_dir, num_procs=num_procs,
+                                    job_dir=job_dir, job_timeout=job_timeout,
+                                    job_lease_time=job_lease_time, double_layer=double_layer,
+                                    num_sectors=num_sectors, symmetry_axis=symmetry_axis)
+        self.assembly = None
+        self.diag = None
+        self.gMat = None
+        self.gOp = None
+        self.kMat = None
 
-        self.__computeResponseMatrix()
+    def assemble(self):
+        """
+        Assemble the Green operator (and the double layer matrix), unless
+        done already. This is called when the operators are first needed, 
+        call it explicitly to assemble ahead of the first solve
+        """
+        if self.assembly is not None:
+            return
+
+        # the operators are assembled once per mesh and set of assembly
+        # parameters, and shared by all the solvers built on the mesh
+        opts = self.assemblyOptions
+        assemblyKey = (self.order, self.quadTol, self.method, opts['storage'],
+                       opts['leaf_size'], opts['fmm_theta'], opts['hmatrix_eta'],
+                       opts['hmatrix_tol'], opts['tile_size'], opts['num_sectors'],
+                       opts['symmetry_axis'])
+        assembly = self.mesh.getAssembly(assemblyKey)
+        if assembly is None or (opts['double_layer'] and assembly['kMat'] is None):
+            self.__assemble(**opts)
+            assembly = {'diag': self.diag, 'gMat': self.gMat, 'gOp': self.gOp,
+                        'kMat': self.kMat}
+            self.mesh.setAssembly(assemblyKey, assembly)
+        self.diag = assembly['diag']
+        self.gMat = assembly['gMat']
+        self.gOp = assembly['gOp']
+        self.kMat = assembly['kMat']
+        self.assembly = assembly
+
+    def isAssembled(self):
+        """
+        Check whether the operators have been assembled
+        @return True or False
+        """
+        return self.assembly is not None
+
+    def __assemble(self, storage, leaf_size, fmm_theta, hmatrix_eta, hmatrix_tol,
+                   tile_size, scratch_dir, num_procs, job_dir, job_timeout,
+                   job_lease_time, double_layer, num_sectors, symmetry_axis):
+
+        self.diag = self.__getDiagonalTerms()
+
+        self.gMat = None
+        self.gOp = None
+        self.kMat = None
+        if storage == DENSE and double_layer:
+            self.gMat = self.__loadFromCache()
+            self.kMat = self.__loadFromCache(kernel='laplace-double-layer')
+            if self.gMat is None or self.kMat is None:
+                self.__computeGreenAndDoubleLayerMatrices()
+                self.__saveToCache(self.gMat)
+                self.__saveToCache(self.kMat, kernel='laplace-double-layer')
+        elif storage == DENSE:
+            self.gMat = self.__loadFromCache()
+            if self.gMat is None:
+                if num_procs > 1 or job_dir is not None:
+                    self.gMat = self.__computeDistributedResponseMatrix(num_procs, job_dir,
+                                                                        job_timeout,
+                                                                        job_lease_time,
+                                                                        scratch_dir)
+                else:
+                    shp = (self.numTriangles, self.numTriangles)
+                    self.gMat = numpy.zeros(shp, numpy.float64)
+                    self.__computeResponseMatrix()
+                self.__saveToCache(self.gMat)
+        elif storage == FMM:
+            self.gOp = FastMultipoleOperator(self.centers, self.areas, self.diag,
+                                             self.getGreenMatrixElements,
+                                             theta=fmm_theta,
+                                             leaf_size=leaf_size)
+        elif storage == HMATRIX:
+            self.gOp = HierarchicalMatrix(self.centers, self.diag,
+                                          self.getGreenMatrixBlock,
+                                          eta=hmatrix_eta,
+                                          leaf_size=leaf_size,
+                                          tol=hmatrix_tol)
+        elif storage == PACKED:
+            # copy on write, the factorization is done in place
+            sPacked = self.__loadFromCache(mmap_mode='c')
+            if sPacked is None:
+                sPacked = self.__computePackedMatrix()
+                self.__saveToCache(sPacked)
+            self.gOp = PackedSymmetricMatrix(sPacked, self.areas, num_threads=self.numThreads)
+        elif storage == STREAM:
+            self.gOp = StreamingGreenOperator(self.diag, self.computeGreenMatVec)
+        elif storage == OUT_OF_CORE:
+            self.gOp = OutOfCoreMatrix(self.diag, self.areas,
+                                       self.getGreenMatrixBlock,
+                                       tile_size=tile_size,
+                                       scratch_dir=scratch_dir)
+        elif storage == CIRCULANT:
+            sectors = getSectorTriangles(self.centers, self.areas, num_sectors,
+                                         axis=symmetry_axis)
+            self.gOp = BlockCirculantMatrix(sectors, self.getGreenMatrixBlock)
+        elif storage == MIRROR:
+            self.gOp = MirrorSymmetricMatrix(self.numTriangles, self.mesh.numImages,
+                                             self.getGreenMatrixBlock)
+
+    def __computeGeometry(self):
+
+        self.pointArray = self.getPoints()
+        self.cellArray = numpy.ascontiguousarray(self.getCells(), numpy.int32)
+        self.areas = self.mesh.getAreas()
+        self.centers = self.mesh.getCenters()
+
+    def __getDiagonalTerms(self):
+
+        if self.diag is None:
+            self.diag = self.__computeDiagonalTerms()
+        return self.diag
 
     def __computeDiagonalTerms(self):
 
         # Gauss points and weights
         gpws = gaussPtsAndWeights[self.order]
-        npts = gpws.shape[1]
         xsis, etas, weights = gpws[0, :], gpws[1, :], gpws[2, :]
 
-        # iterate over the source triangles
-        for jSrc in range(self.numTriangles):
-
-            ia, ib, ic = self.ptIdList[jSrc]
-
-            # The triangle vertex positions
-            paSrc = numpy.array(self.points.GetPoint(ia))
-            pbSrc = numpy.array(self.points.GetPoint(ib))
-            pcSrc = numpy.array(self.points.GetPoint(ic))
-            dbSrc = pbSrc - paSrc
-            dcSrc = pcSrc - paSrc
-
-            # Iterate over the observer points
-            g = 0
-            for ipt in range(npts):
-                # Observer point
-                xObs = paSrc + xsis[ipt]*dbSrc + etas[ipt]*dcSrc
-                # Three triangles having observer point as one corner
-                pot0ab = PotentialIntegrals(xObs, paSrc, pbSrc, self.order)
-                pot0bc = PotentialIntegrals(xObs, pbSrc, pcSrc, self.order)
-                pot0ca = PotentialIntegrals(xObs, pcSrc, paSrc, self.order)
-                g += weights[ipt] * (pot0ab.getIntegralOneOverR() + \
-                                     pot0bc.getIntegralOneOverR() + \
-                                     pot0ca.getIntegralOneOverR())
-
-            self.gMat[jSrc, jSrc] = g / (-FOUR_PI)
+        # The triangle vertex positions, shape (numTriangles, 1, 3)
+        paSrc = self.pointArray[self.cellArray[:, 0], :][:, numpy.newaxis, :]
+        pbSrc = self.pointArray[self.cellArray[:, 1], :][:, numpy.newaxis, :]
+        pcSrc = self.pointArray[self.cellArray[:, 2], :][:, numpy.newaxis, :]
+        dbSrc = pbSrc - paSrc
+        dcSrc = pcSrc - paSrc
+
+        # The observer points, shape (numTriangles, npts, 3)
+        xObs = paSrc + xsis[:, numpy.newaxis]*dbSrc + etas[:, numpy.newaxis]*dcSrc
+        if self.method == COLLOCATION:
+            # a single observer point, the centroid
+            xObs = self.centers[:, numpy.newaxis, :]
+            weights = numpy.ones((1,), numpy.float64)
+
+        # Three triangles having observer point as one corner
+        g = getIntegralsOneOverR(xObs, paSrc, pbSrc, self.order) + \
+            getIntegralsOneOverR(xObs, pbSrc, pcSrc, self.order) + \
+            getIntegralsOneOverR(xObs, pcSrc, paSrc, self.order)
+
+        return g.dot(weights) / (-FOUR_PI)
 
     def __computeOffDiagonalTerms(self):
 
-        addr = int(self.pdata.GetAddressAsString('vtkPolyData')[5:], 0)
-        self.lib.computeOffDiagonalTerms(c_long(addr),
-                                         self.gMat.ctypes.data_as(POINTER(c_double)))
+        self.lib.computeOffDiagonalTerms(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                         self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                         c_long(self.numTriangles),
+                                         self.gMat.ctypes.data_as(POINTER(c_double)),
+                                         c_int(self.numThreads),
+                                         c_double(self.quadTol))
+
+    def __computeCollocationTerms(self):
+
+        self.lib.computeCollocationTerms(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                         self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                         c_long(self.numTriangles),
+                                         self.gMat.ctypes.data_as(POINTER(c_double)),
+                                         c_int(self.numThreads),
+                                         c_double(self.quadTol))
 
     def __computeResponseMatrix(self):
 
-        self.__computeDiagonalTerms()
-        self.__computeOffDiagonalTerms()
+        diag = numpy.arange(self.numTriangles)
+        self.gMat[diag, diag] = self.diag
+        if self.method == COLLOCATION:
+            self.__computeCollocationTerms()
+        else:
+            self.__computeOffDiagonalTerms()
+
+    def __computeGreenAndDoubleLayerMatrices(self):
+
+        n = self.numTriangles
+        self.gMat = numpy.zeros((n, n), numpy.float64)
+        self.kMat = numpy.zeros((n, n), numpy.float64)
+        self.lib.computeGreenAndDoubleLayerTerms(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                                 self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                                 c_long(n),
+                                                 self.gMat.ctypes.data_as(POINTER(c_double)),
+                                                 self.kMat.ctypes.data_as(POINTER(c_double)),
+                                                 c_int(self.numThreads),
+                                                 c_double(self.quadTol))
+        diag = numpy.arange(n)
+        self.gMat[diag, diag] = self.diag
+
+    def __computeDistributedResponseMatrix(self, numProcs, jobDir, jobTimeout, jobLeaseTime,
+                                           scratchDir):
+
+        n = self.numTriangles
+        # the processes write into a shared, memory-mapped matrix
+        fd, fileName = tempfile.mkstemp(suffix='.gmat', dir=scratchDir)
+        os.close(fd)
+        gMat = numpy.memmap(fileName, dtype=numpy.float64, mode='w+', shape=(n, n))
+
+        # avoid oversubscribing the cores
+        numThreads = max(self.numThreads, 1)
+        if jobDir is None:
+            assembleWithPool(self.pointArray, self.cellArray, self.areas, fileName,
+                             numProcs, num_threads=numThreads,
+                             quadrature_tol=self.quadTol)
+        else:
+            coordinator = FileCoordinator(jobDir, lease_time=jobLeaseTime)
+            coordinator.submit(self.pointArray, self.cellArray, self.areas,
+                               numBlocks=4*max(numProcs, 1),
+                               quadrature_tol=self.quadTol)
+            # local workers, workers on other hosts may join
+            workers = [multiprocessing.Process(target=runWorker, args=(jobDir, numThreads))
+                       for i in range(numProcs)]
+            for worker in workers:
+                worker.start()
+            try:
+                coordinator.gather(gMat, timeout=jobTimeout)
+            except RuntimeError:
+                for worker in workers:
+                    worker.terminate()
+                raise
+            finally:
+                for worker in workers:
+                    worker.join()
+
+        diag = numpy.arange(n)
+        gMat[diag, diag] = self.diag
+        gMat.flush()
+        try:
+            # the mapping remains valid after the file is unlinked (POSIX)
+            os.remove(fileName)
+        except OSError:
+            pass
+        return gMat
+
+    def __computePackedMatrix(self):
+
+        n = self.numTriangles
+        sPacked = numpy.zeros((n*(n + 1)//2,), numpy.float64)
+        self.lib.computePackedTerms(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                    self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                    c_long(n),
+                                    sPacked.ctypes.data_as(POINTER(c_double)),
+                                    c_int(self.numThreads),
+                                    c_double(self.quadTol))
+        diag = numpy.arange(n)
+        sPacked[diag + diag*(diag + 1)//2] = self.areas * self.diag
+        return sPacked
+
+    def __getCacheKey(self, kernel='laplace'):
+
+        if self.method == COLLOCATION:
+            kernel += '-' + COLLOCATION
+
+        return self.cache.getKey([self.pointArray, self.cellArray],
+                                 kernel=kernel,
+                                 order=self.order,
+                                 quadrature_tol=self.quadTol,
+                                 storage=self.storage)
+
+    def __loadFromCache(self, mmap_mode='r', kernel='laplace'):
+
+        if self.cache is None:
+            return None
+        return self.cache.load(self.__getCacheKey(kernel), mmap_mode=mmap_mode)
+
+    def __saveToCache(self, mat, kernel='laplace'):
+
+        if self.cache is not None:
+            self.cache.save(self.__getCacheKey(kernel), mat)
+
+    def getGreenMatrixElements(self, obsIds, srcIds):
+        """
+        Compute selected elements of the Green function matrix
+        @param obsIds observer triangle indices (rows)
+        @param srcIds source triangle indices (columns)
+        @return array of matrix elements
+        """
+        obsIds = numpy.ascontiguousarray(obsIds, numpy.int32)
+        srcIds = numpy.ascontiguousarray(srcIds, numpy.int32)
+        vals = numpy.zeros(obsIds.shape, numpy.float64)
+        self.lib.computeGreenPairs(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                   self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                   c_long(len(vals)),
+                                   obsIds.ctypes.data_as(POINTER(c_int)),
+                                   srcIds.ctypes.data_as(POINTER(c_int)),
+                                   vals.ctypes.data_as(POINTER(c_double)),
+                                   c_int(self.numThreads),
+                                   c_double(self.quadTol),
+                                   c_int(self.method == COLLOCATION))
+        isDiag = (obsIds == srcIds)
+        vals[isDiag] = self.__getDiagonalTerms()[obsIds[isDiag]]
+        return vals
+
+    def getGreenMatrixBlock(self, obsIds, srcIds):
+        """
+        Compute a block of the Green function matrix
+        @param obsIds observer triangle indices (rows)
+        @param srcIds source triangle indices (columns)
+        @return array of shape (len(obsIds), len(srcIds))
+        """
+        obsIds = numpy.ascontiguousarray(obsIds, numpy.int32)
+        srcIds = numpy.ascontiguousarray(srcIds, numpy.int32)
+        block = numpy.zeros((len(obsIds), len(srcIds)), numpy.float64)
+        self.lib.computeGreenBlock(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                   self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                   c_long(len(obsIds)),
+                                   obsIds.ctypes.data_as(POINTER(c_int)),
+                                   c_long(len(srcIds)),
+                                   srcIds.ctypes.data_as(POINTER(c_int)),
+                                   block.ctypes.data_as(POINTER(c_double)),
+                                   c_int(self.numThreads),
+                                   c_double(self.quadTol),
+                                   c_int(self.method == COLLOCATION))
+        iDiag, jDiag = numpy.nonzero(obsIds[:, numpy.newaxis] == srcIds[numpy.newaxis, :])
+        block[iDiag, jDiag] = self.__getDiagonalTerms()[obsIds[iDiag]]
+        return block
+
+    def computeGreenMatVec(self, vec):
+        """
+        Apply the off-diagonal part of the Green function matrix without
+        storing it
+        @param vec vector or array of shape (numTriangles, nrhs)
+        @return result, same shape as vec
+        """
+        x = numpy.ascontiguousarray(vec, numpy.float64)
+        nrhs = 1
+        if x.ndim == 2:
+            nrhs = x.shape[1]
+        res = numpy.zeros(x.shape, numpy.float64)
+        computeMatVec = self.lib.computeGreenMatVec
+        if self.method == COLLOCATION:
+            computeMatVec = self.lib.computeCollocationMatVec
+        computeMatVec(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                      self.cellArray.ctypes.data_as(POINTER(c_int)),
+                      c_long(self.numTriangles),
+                      x.ctypes.data_as(POINTER(c_double)),
+                      res.ctypes.data_as(POINTER(c_double)),
+                      c_long(nrhs),
+                      c_int(self.numThreads),
+                      c_double(self.quadTol))
+        return res
+
+    def getSurfaceDensity(self):
+        """
+        Get the charge density on the triangles, set in the derived classes
+        @return array of shape (n,) or (n, numComps)
+        """
+        msg = 'ERROR: the surface density is not defined for {0}!'.format(self.__class__.__name__)
+        raise RuntimeError(msg)
+
+    def computePotentialAndGradient(self, points, density=None, tree_theta=0.,
+                                    leaf_size=32):
+        """
+        Compute the potential and its gradient at arbitrary points, e.g. 
+        on a probe grid
+        @param points evaluation points, array of shape (m, 3), the points
+                      should not lie on the surface
+        @param density charge density on the triangles, array of shape (n,)
+                       or (n, numComps) (None to use the density of the 
+                       last solve, see getSurfaceDensity)
+        @param tree_theta opening parameter of the tree code, boxes of 
+                          triangles whose radius is less than tree_theta 
+                          times their distance are approximated by their
+                          multipole expansion (0 to integrate all the 
+                          triangles)
+        @param leaf_size maximum number of triangles in a leaf of the tree
+        @return potential, array of shape (m,) or (m, numComps), and 
+                gradient, array of shape (m, 3) or (m, numComps, 3)
+        """
+        if density is None:
+            density = self.getSurfaceDensity()
+        density = numpy.asarray(density, numpy.float64)
+        points = numpy.ascontiguousarray(points, numpy.float64).reshape((-1, 3))
+        m = points.shape[0]
+
+        # one column per density component, all evaluated against the same
+        # geometry and tree
+        densities = numpy.ascontiguousarray(density.reshape((self.numTriangles, -1)))
+        numComps = densities.shape[1]
+        potential = numpy.zeros((m, numComps), numpy.float64)
+        gradient = numpy.zeros((m, numComps, 3), numpy.float64)
+        self.lib.computePotentialAtPoints(self.pointArray.ctypes.data_as(POINTER(c_double)),
+                                          self.cellArray.ctypes.data_as(POINTER(c_int)),
+                                          c_long(self.numTriangles),
+                                          densities.ctypes.data_as(POINTER(c_double)),
+                                          c_int(numComps),
+                                          c_long(m),
+                                          points.ctypes.data_as(POINTER(c_double)),
+                                          potential.ctypes.data_as(POINTER(c_double)),
+                                          gradient.ctypes.data_as(POINTER(c_double)),
+                                          c_double(tree_theta),
+                                          c_int(leaf_size),
+                                          c_int(self.numThreads),
+                                          c_double(self.quadTol))
+
+        if density.ndim == 1:
+            return potential[:, 0], gradient[:, 0, :]
+        return potential, gradient
+
+    def computeFieldOnGrid(self, grid, density=None, potential_name='potential',
+                           field_name='electric_field', **kwargs):
+        """
+        Compute the potential and the electric field (minus the gradient)
+        at the points of a grid and attach them as point data
+        @param grid vtkStructuredGrid, vtkImageData or any other vtkDataSet
+        @param density charge density on the triangles (None to use the
+                       density of the last solve)
+        @param potential_name name of the potential point array
+        @param field_name name of the electric field point array
+        @param kwargs options of computePotentialAndGradient (tree_theta, 
+                      leaf_size)
+        @return grid
+        """
+        numPoints = grid.GetNumberOfPoints()
+        if grid.IsA('vtkImageData'):
+            # implicit points, x varies fastest
+            origin = numpy.array(grid.GetOrigin())
+            spacing = numpy.array(grid.GetSpacing())
+            extent = grid.GetExtent()
+            axes = [origin[j] + spacing[j]*numpy.arange(extent[2*j], extent[2*j + 1] + 1)
+                    for j in range(3)]
+            zz, yy, xx = numpy.meshgrid(axes[2], axes[1], axes[0], indexing='ij')
+            points = numpy.column_stack((xx.ravel(), yy.ravel(), zz.ravel()))
+        elif grid.GetPoints() is not None:
+            # structured, unstructured grids, point sets, ...
+            points = numpy_support.vtk_to_numpy(grid.GetPoints().GetData())
+        else:
+            msg = 'ERROR: could not get the points of {0}!'.format(grid.GetClassName())
+            raise RuntimeError(msg)
+
+        potential, gradient = self.computePotentialAndGradient(points, density, **kwargs)
+        potential = potential.reshape((numPoints, -1))
+        field = - gradient.reshape((numPoints, -1))
+
+        for name, values in (potential_name, potential), (field_name, field):
+            arr = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(values), deep=1)
+            arr.SetName(name)
+            grid.GetPointData().AddArray(arr)
+
+        return grid
 
     def getGreenMatrix(self):
         """
         Return the Green function matrix
         @return matrix
         """
+        self.assemble()
+        if self.gMat is None:
+            msg = 'ERROR: the Green matrix is not assembled with storage {0}!'.format(self.storage)
+            raise RuntimeError(msg)
         return self.gMat
+
+    def getDoubleLayerMatrix(self):
+        """
+        Return the double layer matrix, element (i, j) is the integral of
+        the derivative of the kernel along the normal of triangle j, 
+        divided by the area of triangle i. The normals follow the 
+        orientation of the triangles
+        @return matrix
+        """
+        self.assemble()
+        if self.kMat is None:
+            msg = 'ERROR: the double layer matrix is not assembled, use double_layer=True!'
+            raise RuntimeError(msg)
+        return self.kMat
+
+    def getGreenOperator(self):
+        """
+        Return the Green function operator, an object with a shape, a
+        dot (matrix-vector product) and a diagonal method
+        @return the dense matrix or the matrix-free operator
+        """
+        self.assemble()
+        if self.gMat is not None:
+            return self.gMat
+        return self.gOp
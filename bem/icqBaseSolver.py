@@ -2,40 +2,48 @@
 
 from __future__ import print_function
 import vtk
+from vtk.util import numpy_support
 import numpy
-from icqsol.shapes.icqRefineSurface import RefineSurface
+from icqsol.bem.icqBemMesh import BemMesh
 from icqsol.util.icqDataFetcher import getArrayIndexFromNameAndProjectOntoCells
+from icqsol.util.icqExpression import Expression
 
 class BaseSolver:
 
-    def __init__(self, pdata, max_edge_length, order=5):
+    def __init__(self, pdata, max_edge_length, order=5, mirror_planes=None,
+                 mirror_center=None):
         """
         Constructor
-        @param pdata instance of vtkPolyData
+        @param pdata instance of vtkPolyData, or a BemMesh shared with
+                     other solvers (the surface is then not refined again)
         @param max_edge_length maximum edge length, used to turn
-                               polygons into triangles
+                               polygons into triangles (ignored if pdata
+                               is a BemMesh)
+        @param mirror_planes coordinate planes of mirror symmetry of the
+                             surface, e.g. ['x', 'y'], see BemMesh (ignored
+                             if pdata is a BemMesh)
+        @param mirror_center point of the mirror planes (None for the 
+                             centroid of the surface)
         """
 
         # triangulate
-        rs = RefineSurface(pdata)
-        rs.refine(max_edge_length=max_edge_length)
-        self.pdata = rs.getVtkPolyData()
-
-        # store the point indices for each cell
-        self.ptIdList = []
-        ptIds = vtk.vtkIdList()
-        polys = self.pdata.GetPolys()
-        polys.InitTraversal()
-        for i in range(polys.GetNumberOfCells()):
-            polys.GetNextCell(ptIds)
-            assert(ptIds.GetNumberOfIds() == 3)
-            self.ptIdList.append([ptIds.GetId(0),
-                                  ptIds.GetId(1),
-                                  ptIds.GetId(2)])
+        if isinstance(pdata, BemMesh):
+            self.mesh = pdata
+        else:
+            self.mesh = BemMesh(pdata, max_edge_length, mirror_planes=mirror_planes,
+                                mirror_center=mirror_center)
+
+        # the fields of the solvers sharing a mesh are kept apart, the 
+        # points and cells are shared
+        self.pdata = vtk.vtkPolyData()
+        self.pdata.ShallowCopy(self.mesh.getVtkPolyData())
+
+        # point indices of each cell, array of shape (numTriangles, 3). 
+        self.cells = self.mesh.getCells()
 
         self.points = self.pdata.GetPoints()
         self.polys = self.pdata.GetPolys()
-        self.numTriangles = self.polys.GetNumberOfCells()
+        self.numTriangles = self.mesh.numTriangles
 
         # order of the integration, method dependent
         self.order = order
@@ -51,32 +59,27 @@ class BaseSolver:
         """
         return self.pdata
 
+    def getMesh(self):
+        """
+        Get the triangulated surface, which can be shared with other solvers
+        @return BemMesh instance
+        """
+        return self.mesh
+
     def getPoints(self):
         """
         Get grid points
-        @return points
+        @return array of shape (numPoints, 3), a view of the VTK point 
+                coordinates if these are stored in double precision
         """
-        points = self.pdata.GetPoints()
-        numPoints = points.GetNumberOfPoints()
-        res = numpy.zeros((numPoints, 3), numpy.float64)
-        for i in range(numPoints):
-            res[i, :] = points.GetPoint(i)
-        return res
+        return self.mesh.getPoints()
 
     def getCells(self):
         """
         Get cell connectivity
-        @return cells
-        """
-        polys = self.pdata.GetPolys()
-        numCells = polys.GetNumberOfCells()
-        res = numpy.zeros((numCells, 3), numpy.int)
-        polys.InitTraversal()
-        ptIds = vtk.vtkIdList()
-        for i in range(numCells):
-            polys.GetNextCell(ptIds)
-            res[i, :] = ptIds.GetId(0), ptIds.GetId(1), ptIds.GetId(2)
-        return res
+        @return array of shape (numTriangles, 3), a view of the VTK cell array
+        """
+        return self.cells
     
     def setResponseFieldName(self, name):
         """
@@ -106,53 +109,34 @@ class BaseSolver:
         """
         Set the source array 
         @param srcIndex source array index
+        @return array of shape (n,) for a single component field or
+                (n, numComps) for a multi-component field (e.g. one 
+                component per time point)
         """
         srcArray = self.pdata.GetCellData().GetArray(srcIndex)
-        n = self.pdata.GetNumberOfPolys()
-        src = numpy.zeros((n,), numpy.float64)
-        for i in range(n):
-            src[i] = srcArray.GetComponent(i, 0)
-        return src
+        return numpy.asarray(numpy_support.vtk_to_numpy(srcArray), numpy.float64)
 
     def addResponseField(self, rsp):
         """
         Add the response field to the polydata
-        @param rsp response numpy array
+        @param rsp response numpy array, of shape (n,) or (n, numComps)
         """
-        rspData = vtk.vtkDoubleArray()
-        rspData.SetNumberOfComponents(1)
-        n = len(rsp)
-        rspData.SetNumberOfTuples(n)
+        rsp = numpy.ascontiguousarray(rsp, numpy.float64)
+        # deep copy, the VTK array must not depend on the lifetime of rsp
+        rspData = numpy_support.numpy_to_vtk(rsp, deep=1)
         rspData.SetName(self.responseName)
-        for i in range(n):
-            rspData.SetTuple(i, [rsp[i]])
         self.pdata.GetCellData().AddArray(rspData)
 
     def setSourceFromExpression(self, expression):
         """
         Set the source from expression
-        @param expression expression of x, y, and z
-        """
-        from math import sqrt, pi, sin, cos, tan, log, exp
-        
-        n = self.pdata.GetNumberOfPolys()
-        sourceData = vtk.vtkDoubleArray()
-        sourceData.SetNumberOfComponents(1)
-        sourceData.SetNumberOfTuples(n)
+        @param expression expression of x, y, and z, evaluated at the 
+                          triangle centroids
+        """
+        expr = Expression(expression, variables=('x', 'y', 'z'))
+        midPoints = self.getPoints()[self.cells, :].mean(axis=1)
+        v = expr.evaluate(x=midPoints[:, 0], y=midPoints[:, 1], z=midPoints[:, 2])
+        sourceData = numpy_support.numpy_to_vtk(v, deep=1)
         sourceData.SetName(self.sourceName)
-        midPoint = numpy.zeros((3,), numpy.float64)
-        ptIds = vtk.vtkIdList()
-        cells = self.pdata.GetPolys()
-        cells.InitTraversal()
-        for i in range(n):
-            cell = cells.GetNextCell(ptIds)
-            npts = ptIds.GetNumberOfIds()
-            midPoint *= 0 # reset
-            for j in range(npts):
-                midPoint += self.points.GetPoint(ptIds.GetId(j))
-            midPoint /= float(npts)
-            x, y, z = midPoint
-            v = eval(expression)
-            sourceData.SetTuple(i, [v])
         self.pdata.GetCellData().AddArray(sourceData)
 
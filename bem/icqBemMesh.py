@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+
+"""
+@brief Triangulated surface shared by several solvers. The surface is
+       refined and its triangle data are extracted once; the operators
+       assembled by one solver are reused by the solvers built later on
+       the same mesh with the same assembly parameters.
+"""
+
+from __future__ import print_function
+import vtk
+from vtk.util import numpy_support
+import numpy
+from icqsol.shapes.icqRefineSurface import RefineSurface
+
+# coordinate planes of mirror symmetry, named after their normal
+MIRROR_AXES = {'x': 0, 'y': 1, 'z': 2}
+# tolerance on the distance of the points to the mirror planes, relative
+# to the size of the surface
+MIRROR_TOL = 1.e-6
+
+
+class BemMesh:
+
+    def __init__(self, pdata, max_edge_length, mirror_planes=None, mirror_center=None):
+        """
+        Constructor
+        @param pdata instance of vtkPolyData
+        @param max_edge_length maximum edge length, used to turn
+                               polygons into triangles
+        @param mirror_planes coordinate planes of mirror symmetry, e.g. 
+                             ['x', 'z'] for the planes normal to the x and
+                             z axes. The surface is cut by the planes and the
+                             part on their positive side (the fundamental 
+                             domain) is reflected, so that the mesh is exactly
+                             symmetric (None for no symmetry)
+        @param mirror_center point of the mirror planes (None for the 
+                             centroid of the surface)
+        """
+
+        # triangulate
+        rs = RefineSurface(pdata)
+        rs.refine(max_edge_length=max_edge_length)
+        self.pdata = rs.getVtkPolyData()
+
+        self.mirrorPlanes = list(mirror_planes or [])
+        # the triangles of image k of the fundamental domain are
+        # k*numFundamentalTriangles ... (k + 1)*numFundamentalTriangles - 1,
+        # image k is reflected about the planes of the bits of k
+        self.numImages = 2**len(self.mirrorPlanes)
+        if self.mirrorPlanes:
+            self.pdata = self.__mirror(self.pdata, mirror_center)
+
+        self.points, self.cells = self.__getTriangles(self.pdata)
+        self.numTriangles = self.cells.shape[0]
+        self.numFundamentalTriangles = self.numTriangles // self.numImages
+
+        self.areas, self.centers, normals, norms = self.__getTriangleGeometry(self.points,
+                                                                              self.cells)
+        # unit normals, following the orientation of the triangles
+        self.normals = normals / numpy.where(norms > 0., norms, 1.)[:, numpy.newaxis]
+
+        # assembled operators, keyed by the assembly parameters
+        self.assemblies = {}
+
+    def __getTriangles(self, pdata):
+        """
+        Get the points and the cells of a triangulated surface
+        @param pdata vtkPolyData instance
+        @return float64 array of shape (numPoints, 3), array of point indices
+                of shape (numTriangles, 3)
+        """
+        # The cell array stores (3, ia, ib, ic) for each triangle
+        conn = numpy_support.vtk_to_numpy(pdata.GetPolys().GetData())
+        if conn.shape[0] % 4 != 0 or (conn.reshape((-1, 4))[:, 0] != 3).any():
+            msg = 'ERROR: the surface must only contain triangles!'
+            raise RuntimeError(msg)
+        conn = conn.reshape((-1, 4))
+        points = numpy_support.vtk_to_numpy(pdata.GetPoints().GetData())
+        return numpy.asarray(points, numpy.float64), conn[:, 1:]
+
+    def __getTriangleGeometry(self, points, cells):
+        """
+        Compute the triangle areas, centroids and normals
+        @param points point coordinates
+        @param cells point indices of the triangles
+        @return areas, centroids, normals and norms of the normals (twice
+                the areas)
+        """
+        pa = points[cells[:, 0], :]
+        pb = points[cells[:, 1], :]
+        pc = points[cells[:, 2], :]
+        normals = numpy.cross(pb - pa, pc - pa)
+        norms = numpy.sqrt((normals**2).sum(axis=1))
+        return 0.5*norms, (pa + pb + pc)/3., normals, norms
+
+    def __getMoments(self, pdata, center):
+        """
+        Compute the area and the first and second area moments of a surface
+        @param pdata triangulated vtkPolyData instance
+        @param center origin of the moments
+        @return area, first moment (array of shape (3,)) and second moment
+                (array of shape (3, 3))
+        """
+        points, cells = self.__getTriangles(pdata)
+        if cells.shape[0] == 0:
+            return 0., numpy.zeros((3,)), numpy.zeros((3, 3))
+        areas, centers = self.__getTriangleGeometry(points, cells)[:2]
+        centers = centers - center
+        # exact over flat triangles, the integral of x.x^T is 
+        # area*(sum of v.v^T over the vertices + 9 c.c^T)/12
+        second = 9. * numpy.einsum('i,ij,ik->jk', areas, centers, centers)
+        for k in range(3):
+            verts = points[cells[:, k], :] - center
+            second += numpy.einsum('i,ij,ik->jk', areas, verts, verts)
+        return areas.sum(), areas.dot(centers), second / 12.
+
+    def __checkSymmetry(self, positive, negative, center, axis, size):
+        """
+        Check that the parts of a surface on either side of a mirror plane
+        are reflections of each other, comparing their area moments
+        @param positive triangulated part on the positive side
+        @param negative triangulated part on the negative side
+        @param center point of the plane
+        @param axis index of the normal of the plane
+        @param size size of the surface
+        """
+        area, first, second = self.__getMoments(positive, center)
+        areaRefl, firstRefl, secondRefl = self.__getMoments(negative, center)
+        refl = numpy.ones((3,))
+        refl[axis] = -1.
+        firstRefl *= refl
+        secondRefl *= numpy.outer(refl, refl)
+        tol = MIRROR_TOL * max(area, areaRefl)
+        if area == 0. or abs(area - areaRefl) > tol or \
+            numpy.abs(first - firstRefl).max() > tol * size or \
+            numpy.abs(second - secondRefl).max() > tol * size**2:
+            plane = [p for p in MIRROR_AXES if MIRROR_AXES[p] == axis][0]
+            msg = 'ERROR: the surface is not symmetric about the plane {0} through {1}!'.format(
+                plane, tuple(center.tolist()))
+            raise RuntimeError(msg)
+
+    def __reflectFields(self, data, res, ids):
+        """
+        Copy the fields of the fundamental domain onto its images, the 
+        active vectors and normals are reflected
+        @param data vtkPointData or vtkCellData of the fundamental domain
+        @param res vtkPointData or vtkCellData of the symmetric surface
+        @param ids indices of the tuples of the fundamental domain to copy
+        """
+        reflectedNames = [arr.GetName() for arr in (data.GetVectors(), data.GetNormals())
+                          if arr is not None]
+        for i in range(data.GetNumberOfArrays()):
+            arr = data.GetArray(i)
+            if arr is None:
+                # not a numeric array
+                continue
+            values = numpy_support.vtk_to_numpy(arr)[ids]
+            images = []
+            for image in range(self.numImages):
+                vals = values.copy()
+                if arr.GetName() in reflectedNames:
+                    for k, plane in enumerate(self.mirrorPlanes):
+                        if image & (1 << k):
+                            vals[:, MIRROR_AXES[plane]] *= -1
+                images.append(vals)
+            newArr = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(numpy.concatenate(images)),
+                                                deep=1, array_type=arr.GetDataType())
+            newArr.SetName(arr.GetName())
+            res.AddArray(newArr)
+
+        for arr, setActive in ((data.GetScalars(), res.SetActiveScalars),
+                               (data.GetVectors(), res.SetActiveVectors),
+                               (data.GetNormals(), res.SetActiveNormals)):
+            if arr is not None:
+                setActive(arr.GetName())
+
+    def __mirror(self, pdata, center):
+        """
+        Cut the surface by the mirror planes and reflect the fundamental 
+        domain. The point fields are interpolated onto the cut and the 
+        fields are copied onto the images
+        @param pdata triangulated vtkPolyData instance
+        @param center point of the planes (None for the centroid of the surface)
+        @return symmetric vtkPolyData instance
+        """
+        for plane in self.mirrorPlanes:
+            if plane not in MIRROR_AXES:
+                msg = 'ERROR: unknown mirror plane {0}, must be one of {1}!'.format(plane,
+                                                                                   sorted(MIRROR_AXES))
+                raise RuntimeError(msg)
+        if len(set(self.mirrorPlanes)) != len(self.mirrorPlanes):
+            msg = 'ERROR: repeated mirror planes {0}!'.format(self.mirrorPlanes)
+            raise RuntimeError(msg)
+
+        points, cells = self.__getTriangles(pdata)
+        if center is None:
+            areas, centers = self.__getTriangleGeometry(points, cells)[:2]
+            center = areas.dot(centers) / areas.sum()
+        center = numpy.asarray(center, numpy.float64)
+
+        # move the points lying on the planes up to round off onto the 
+        # planes, the cut would otherwise leave slivers
+        size = numpy.abs(points - center).max()
+        eps = MIRROR_TOL * size
+        for plane in self.mirrorPlanes:
+            axis = MIRROR_AXES[plane]
+            onPlane = numpy.abs(points[:, axis] - center[axis]) <= eps
+            points[onPlane, axis] = center[axis]
+        snapped = vtk.vtkPolyData()
+        snapped.DeepCopy(pdata)
+        snapped.GetPoints().SetData(numpy_support.numpy_to_vtk(points, deep=1))
+        pdata = snapped
+
+        # keep the positive side of each plane, after checking that the
+        # other side is its reflection
+        for plane in self.mirrorPlanes:
+            axis = MIRROR_AXES[plane]
+            normal = [0., 0., 0.]
+            normal[axis] = 1.
+            implicitPlane = vtk.vtkPlane()
+            implicitPlane.SetOrigin(center)
+            implicitPlane.SetNormal(normal)
+            clip = vtk.vtkClipPolyData()
+            clip.SetInputData(pdata)
+            clip.SetClipFunction(implicitPlane)
+            clip.GenerateClippedOutputOn()
+            clip.Update()
+            # the cut triangles may become quadrilaterals
+            parts = []
+            for part in clip.GetOutput(), clip.GetClippedOutput():
+                triFilter = vtk.vtkTriangleFilter()
+                triFilter.SetInputData(part)
+                triFilter.Update()
+                parts.append(triFilter.GetOutput())
+            self.__checkSymmetry(parts[0], parts[1], center, axis, size)
+            pdata = parts[0]
+
+        points, cells = self.__getTriangles(pdata)
+        if cells.shape[0] == 0:
+            msg = 'ERROR: no triangle on the positive side of the mirror planes {0}!'.format(
+                self.mirrorPlanes)
+            raise RuntimeError(msg)
+        # the cut may leave degenerate triangles
+        areas = self.__getTriangleGeometry(points, cells)[0]
+        cellIds = numpy.nonzero(areas > 1.e-12 * areas.max())[0]
+        cells = cells[cellIds, :]
+
+        # reflect the fundamental domain, the reflections reverse the
+        # orientation of the triangles
+        allPoints = []
+        allCells = []
+        for image in range(self.numImages):
+            pts = points.copy()
+            tris = cells + image*points.shape[0]
+            for k, plane in enumerate(self.mirrorPlanes):
+                if image & (1 << k):
+                    axis = MIRROR_AXES[plane]
+                    pts[:, axis] = 2.*center[axis] - pts[:, axis]
+                    tris = tris[:, [0, 2, 1]]
+            allPoints.append(pts)
+            allCells.append(tris)
+        allPoints = numpy.concatenate(allPoints)
+        allCells = numpy.concatenate(allCells)
+
+        res = vtk.vtkPolyData()
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_support.numpy_to_vtk(allPoints, deep=1))
+        res.SetPoints(vtkPoints)
+        conn = numpy.empty((allCells.shape[0], 4), numpy.int64)
+        conn[:, 0] = 3
+        conn[:, 1:] = allCells
+        polys = vtk.vtkCellArray()
+        polys.SetCells(allCells.shape[0],
+                       numpy_support.numpy_to_vtkIdTypeArray(conn.reshape(-1), deep=1))
+        res.SetPolys(polys)
+
+        self.__reflectFields(pdata.GetPointData(), res.GetPointData(),
+                             numpy.arange(points.shape[0]))
+        self.__reflectFields(pdata.GetCellData(), res.GetCellData(), cellIds)
+        return res
+
+    def getVtkPolyData(self):
+        """
+        Get the triangulated vtkPolyData object
+        @return object
+        """
+        return self.pdata
+
+    def getPoints(self):
+        """
+        Get grid points
+        @return array of shape (numPoints, 3)
+        """
+        return self.points
+
+    def getCells(self):
+        """
+        Get cell connectivity
+        @return array of shape (numTriangles, 3)
+        """
+        return self.cells
+
+    def getAreas(self):
+        """
+        Get the triangle areas
+        @return array of shape (numTriangles,)
+        """
+        return self.areas
+
+    def getCenters(self):
+        """
+        Get the triangle centroids
+        @return array of shape (numTriangles, 3)
+        """
+        return self.centers
+
+    def getNormals(self):
+        """
+        Get the unit normals of the triangles
+        @return array of shape (numTriangles, 3)
+        """
+        return self.normals
+
+    def getAssembly(self, key):
+        """
+        Get the operators assembled with given parameters
+        @param key assembly parameters, hashable
+        @return dictionary of operators or None if not assembled yet
+        """
+        return self.assemblies.get(key)
+
+    def setAssembly(self, key, assembly):
+        """
+        Store assembled operators, to be shared with the other solvers
+        @param key assembly parameters, hashable
+        @param assembly dictionary of operators
+        """
+        self.assemblies[key] = assembly
+
+    def clearAssemblies(self):
+        """
+        Release the assembled operators
+        """
+        self.assemblies = {}
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""
+Green function matrix of a rotationally symmetric surface (e.g. the sphere,
+cylinder and cone primitives, made of n_theta identical slices). Numbering
+the triangles sector by sector, the matrix is block circulant: only the
+rows of one sector are assembled and the matrix is block diagonalized by
+FFTs along the sectors
+"""
+
+from __future__ import print_function
+import numpy
+
+# candidate symmetry axes, tried in turn when the axis is not given
+COORDINATE_AXES = [(1., 0., 0.), (0., 1., 0.), (0., 0., 1.)]
+
+# the points are sorted along this direction, chosen not to be aligned
+# with the mesh
+SORT_DIRECTION = numpy.array([0.5377, 0.3241, 0.7787])
+
+
+def getRotationMatrix(axis, angle):
+    """
+    Get the matrix of a rotation
+    @param axis rotation axis
+    @param angle angle in radians
+    @return array of shape (3, 3)
+    """
+    a = numpy.asarray(axis, numpy.float64)
+    a = a / numpy.sqrt(a.dot(a))
+    cross = numpy.array([[0., -a[2], a[1]],
+                         [a[2], 0., -a[0]],
+                         [-a[1], a[0], 0.]])
+    return numpy.cos(angle)*numpy.eye(3) + numpy.sin(angle)*cross + \
+        (1. - numpy.cos(angle))*numpy.outer(a, a)
+
+
+def getSectorTriangles(centers, areas, num_sectors, axis=None, tol=1.e-6):
+    """
+    Find the sectors of a rotationally symmetric mesh
+    @param centers triangle centroids, array of shape (n, 3)
+    @param areas triangle areas
+    @param num_sectors number of sectors, the mesh must be invariant under
+                       the rotation by 2*pi/num_sectors
+    @param axis direction of the symmetry axis, which goes through the
+                centroid of the surface (None to try the x, y and z axes)
+    @param tol tolerance on the rotated centroids, relative to the size of
+               the mesh
+    @return array of shape (num_sectors, n/num_sectors), element (k, l)
+            is the triangle obtained by rotating triangle (0, l) k times
+    """
+    centers = numpy.asarray(centers, numpy.float64)
+    areas = numpy.asarray(areas, numpy.float64)
+    n = centers.shape[0]
+    if num_sectors < 1 or n % num_sectors != 0:
+        msg = 'ERROR: {0} triangles cannot be split into {1} sectors!'.format(n, num_sectors)
+        raise RuntimeError(msg)
+
+    origin = areas.dot(centers) / areas.sum()
+    size = numpy.abs(centers - origin).max()
+    eps = tol * size
+
+    axes = COORDINATE_AXES
+    if axis is not None:
+        axes = [axis]
+    for ax in axes:
+        rot = getRotationMatrix(ax, 2.*numpy.pi/num_sectors)
+        perm = _matchPoints(centers, (centers - origin).dot(rot.T) + origin, eps)
+        if perm is None or (numpy.abs(areas[perm] - areas) > eps*size).any():
+            continue
+
+        # orbits of the triangles, orbits[k, i] is triangle i rotated k times
+        orbits = numpy.empty((num_sectors, n), numpy.int64)
+        orbits[0, :] = numpy.arange(n)
+        for k in range(1, num_sectors):
+            orbits[k, :] = perm[orbits[k - 1, :]]
+        # each triangle is represented by the first triangle of its orbit
+        reps = numpy.unique(orbits.min(axis=0))
+        if len(reps)*num_sectors != n:
+            continue
+        return orbits[:, reps]
+
+    msg = 'ERROR: the mesh is not invariant under the rotation by 2*pi/{0}!'.format(num_sectors)
+    raise RuntimeError(msg)
+
+
+def _matchPoints(points, images, eps):
+    """
+    Find the permutation mapping points onto their images
+    @param points array of shape (n, 3)
+    @param images array of shape (n, 3)
+    @param eps distance tolerance
+    @return array perm such that images[i] is points[perm[i]], None if
+            there is no such permutation
+    """
+    n = points.shape[0]
+
+    # candidates of each image: the points whose projections are within eps
+    proj = points.dot(SORT_DIRECTION)
+    order = numpy.argsort(proj)
+    sortedProj = proj[order]
+    imageProj = images.dot(SORT_DIRECTION)
+    los = numpy.searchsorted(sortedProj, imageProj - eps, side='left')
+    his = numpy.searchsorted(sortedProj, imageProj + eps, side='right')
+
+    perm = numpy.empty((n,), numpy.int64)
+    for i in range(n):
+        cands = order[los[i]:his[i]]
+        if len(cands) == 0:
+            return None
+        dist2 = ((points[cands, :] - images[i, :])**2).sum(axis=1)
+        k = numpy.argmin(dist2)
+        if dist2[k] > eps*eps:
+            return None
+        perm[i] = cands[k]
+
+    if len(numpy.unique(perm)) != n:
+        return None
+    return perm
+
+
+class BlockCirculantMatrix:
+
+    def __init__(self, sectors, computeBlock):
+        """
+        Constructor
+        @param sectors triangles of each sector, array of shape
+                       (numSectors, numTrianglesPerSector), see
+                       getSectorTriangles
+        @param computeBlock function (obsIds, srcIds) -> exact matrix block
+                            of shape (len(obsIds), len(srcIds))
+        @note element (i, j) only depends on the relative position of the
+              sectors of i and j. The rows of the first sector are
+              assembled, numTriangles**2/numSectors elements
+        """
+        self.sectors = numpy.asarray(sectors, numpy.int64)
+        numSectors, m = self.sectors.shape
+        n = numSectors * m
+        self.shape = (n, n)
+
+        # blocks[d] couples the first sector with sector d
+        row = computeBlock(self.sectors[0, :], self.sectors.reshape(-1))
+        self.blocks = row.reshape((m, numSectors, m)).transpose((1, 0, 2))
+
+        # The blocks of the block diagonal matrix in Fourier space. As the
+        # blocks are real only half of the frequencies are stored
+        self.fourierBlocks = numpy.fft.rfft(self.blocks, axis=0).conj()
+
+        # inverses of the Fourier space blocks, computed by the first solve
+        self.inverseBlocks = None
+
+    def __gather(self, vec):
+        """
+        Arrange a vector by sectors
+        @param vec vector or array of shape (n, nrhs)
+        @return array of shape (numSectors, m) or (numSectors, m, nrhs)
+        """
+        return numpy.asarray(vec, numpy.float64)[self.sectors, ...]
+
+    def __scatter(self, arr):
+        """
+        Inverse of __gather
+        @param arr array of shape (numSectors, m) or (numSectors, m, nrhs)
+        @return vector or array of shape (n, nrhs)
+        """
+        res = numpy.empty((self.shape[0],) + arr.shape[2:], numpy.float64)
+        res[self.sectors, ...] = arr
+        return res
+
+    def __apply(self, fourierBlocks, vec):
+        """
+        Apply a block circulant matrix given by its Fourier space blocks
+        @param fourierBlocks array of shape (numSectors//2 + 1, m, m)
+        @param vec vector or array of shape (n, nrhs)
+        @return result, same shape as vec
+        """
+        numSectors = self.sectors.shape[0]
+        x = numpy.fft.rfft(self.__gather(vec), axis=0)
+        y = numpy.einsum('fij,fj...->fi...', fourierBlocks, x)
+        return self.__scatter(numpy.fft.irfft(y, numSectors, axis=0))
+
+    def dot(self, vec):
+        """
+        Apply the matrix to a vector
+        @param vec vector or array of shape (n, nrhs)
+        @return result, same shape as vec
+        """
+        return self.__apply(self.fourierBlocks, vec)
+
+    def solve(self, vec):
+        """
+        Solve the linear system, one dense m x m inverse per frequency
+        @param vec right hand side, vector or array of shape (n, nrhs)
+        @return solution, same shape as vec
+        """
+        if self.inverseBlocks is None:
+            self.inverseBlocks = numpy.linalg.inv(self.fourierBlocks)
+        return self.__apply(self.inverseBlocks, vec)
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        numSectors = self.sectors.shape[0]
+        diag = numpy.diagonal(self.blocks[0])
+        return self.__scatter(numpy.tile(diag, (numSectors, 1)))
+
+###############################################################################
+
+
+def testRandom():
+
+    numSectors, m = 5, 3
+    n = numSectors * m
+
+    # block circulant matrix, the triangles of the sectors are shuffled
+    blocks = numpy.random.rand(numSectors, m, m)
+    sectors = numpy.random.permutation(n).reshape((numSectors, m))
+    mat = numpy.zeros((n, n))
+    for k in range(numSectors):
+        for kk in range(numSectors):
+            mat[numpy.ix_(sectors[k], sectors[kk])] = blocks[(kk - k) % numSectors]
+    mat += n * numpy.eye(n)
+
+    def computeBlock(obsIds, srcIds):
+        return mat[numpy.ix_(obsIds, srcIds)]
+
+    cm = BlockCirculantMatrix(sectors, computeBlock)
+    x = numpy.random.rand(n, 2)
+    assert(numpy.allclose(cm.dot(x), mat.dot(x)))
+    assert(numpy.allclose(cm.dot(x[:, 0]), mat.dot(x[:, 0])))
+    assert(numpy.allclose(cm.solve(x), numpy.linalg.solve(mat, x)))
+    assert(numpy.allclose(cm.diagonal(), mat.diagonal()))
+
+    # sectors of a ring of points, rotated about the z axis
+    angles = 2.*numpy.pi*numpy.arange(numSectors)/numSectors
+    pts = numpy.array([[numpy.cos(a + da), numpy.sin(a + da), z]
+                       for a in angles for da, z in ((0.1, 0.), (0.2, 1.), (0.3, -1.))])
+    sectors = getSectorTriangles(pts, numpy.ones(n), numSectors)
+    for k in range(numSectors):
+        rot = getRotationMatrix((0., 0., 1.), angles[k])
+        assert(numpy.allclose(pts[sectors[0]].dot(rot.T), pts[sectors[k]]))
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+"""
+Assembly of the Green function matrix by several processes. The pairs
+(i, j), j < i, are split into row blocks holding the same number of
+kernel evaluations. The blocks are either handed to a local pool of
+worker processes or, through a job directory on a shared file system,
+to workers running on any host (see examples/assemblyWorker.py).
+"""
+
+from __future__ import print_function
+import os
+import glob
+import time
+import errno
+import socket
+import multiprocessing
+import numpy
+from icqsol.util.icqSharedLibraryUtils import getSharedLibraryName
+from ctypes import cdll, POINTER, c_double, c_long, c_int
+
+
+def getBalancedRowBlocks(n, numBlocks):
+    """
+    Split the rows of the strictly lower triangle so that each block has
+    the same number of elements, row i holds i elements
+    @param n number of rows
+    @param numBlocks number of blocks
+    @return list of (rowStart, rowEnd) pairs
+    """
+    # the number of elements up to row r is r^2/2
+    bounds = numpy.round(n * numpy.sqrt(numpy.arange(numBlocks + 1) / float(numBlocks)))
+    bounds = numpy.unique(bounds.astype(numpy.int64))
+    return [(int(bounds[k]), int(bounds[k + 1])) for k in range(len(bounds) - 1)]
+
+
+def computeLowerRows(lib, points, cells, rowStart, rowEnd, numThreads=1, quadTol=0.):
+    """
+    Compute the strictly lower triangular part of a range of rows
+    @param lib icqLaplaceMatricesCpp shared library
+    @param points point coordinates, array of shape (numPoints, 3)
+    @param cells connectivity, int32 array of shape (numTriangles, 3)
+    @param rowStart first row
+    @param rowEnd one past the last row
+    @param numThreads number of OpenMP threads
+    @param quadTol quadrature tolerance
+    @return array of shape (rowEnd - rowStart, rowEnd)
+    """
+    strip = numpy.zeros((rowEnd - rowStart, rowEnd), numpy.float64)
+    lib.computeGreenLowerRows(points.ctypes.data_as(POINTER(c_double)),
+                              cells.ctypes.data_as(POINTER(c_int)),
+                              c_long(rowStart), c_long(rowEnd),
+                              strip.ctypes.data_as(POINTER(c_double)),
+                              c_int(numThreads), c_double(quadTol))
+    return strip
+
+
+def storeLowerRows(gMat, areas, rowStart, rowEnd, strip):
+    """
+    Store a strip of rows and the corresponding columns, G_ji = G_ij A_i / A_j.
+    Different row ranges write to disjoint elements.
+    @param gMat matrix (array or memmap)
+    @param areas triangle areas
+    @param rowStart first row
+    @param rowEnd one past the last row
+    @param strip strictly lower rows, array of shape (rowEnd - rowStart, rowEnd)
+    """
+    r0, r1 = rowStart, rowEnd
+    scaled = (strip * areas[r0:r1, numpy.newaxis] / areas[numpy.newaxis, :r1]).T
+    gMat[r0:r1, :r0] = strip[:, :r0]
+    gMat[:r0, r0:r1] = scaled[:r0, :]
+    # the diagonal square holds both the rows and their transposes
+    gMat[r0:r1, r0:r1] = strip[:, r0:r1] + scaled[r0:r1, :]
+
+###############################################################################
+# local pool of processes
+
+# state of the pool worker processes
+_workerState = {}
+
+
+def _initPoolWorker(points, cells, areas, fileName, numThreads, quadTol):
+    n = len(areas)
+    _workerState['lib'] = cdll.LoadLibrary(getSharedLibraryName('icqLaplaceMatricesCpp'))
+    _workerState['points'] = points
+    _workerState['cells'] = cells
+    _workerState['areas'] = areas
+    _workerState['gMat'] = numpy.memmap(fileName, dtype=numpy.float64, mode='r+', shape=(n, n))
+    _workerState['numThreads'] = numThreads
+    _workerState['quadTol'] = quadTol
+
+
+def _assemblePoolBlock(block):
+    rowStart, rowEnd = block
+    ws = _workerState
+    strip = computeLowerRows(ws['lib'], ws['points'], ws['cells'], rowStart, rowEnd,
+                             numThreads=ws['numThreads'], quadTol=ws['quadTol'])
+    storeLowerRows(ws['gMat'], ws['areas'], rowStart, rowEnd, strip)
+    ws['gMat'].flush()
+    return rowEnd - rowStart
+
+
+def assembleWithPool(points, cells, areas, fileName, num_procs,
+                     blocks_per_proc=4, num_threads=1, quadrature_tol=0.):
+    """
+    Compute the off-diagonal elements with a pool of processes, which
+    write directly into a memory-mapped file
+    @param points point coordinates, array of shape (numPoints, 3)
+    @param cells connectivity, int32 array of shape (numTriangles, 3)
+    @param areas triangle areas
+    @param fileName memory-mapped file of shape (n, n), float64
+    @param num_procs number of processes
+    @param blocks_per_proc number of row blocks per process, more blocks
+                           even out the differences between processes
+    @param num_threads number of OpenMP threads in each process
+    @param quadrature_tol quadrature tolerance
+    """
+    blocks = getBalancedRowBlocks(len(areas), num_procs * blocks_per_proc)
+    # largest blocks first
+    blocks.reverse()
+    pool = multiprocessing.Pool(processes=num_procs,
+                                initializer=_initPoolWorker,
+                                initargs=(points, cells, areas, fileName,
+                                          num_threads, quadrature_tol))
+    try:
+        pool.map(_assemblePoolBlock, blocks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+###############################################################################
+# file based coordinator, workers may run on other hosts sharing the job
+# directory
+
+
+# claimed tasks are named <task>.running.<host>.<pid>
+RUNNING = '.running.'
+
+
+def isProcessAlive(pid):
+    """
+    Check whether a process of this host is running
+    @param pid process id
+    @return True or False
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        # EPERM: the process exists but belongs to another user
+        return err.errno == errno.EPERM
+    return True
+
+
+class FileCoordinator:
+
+    def __init__(self, job_dir, lease_time=None):
+        """
+        Constructor
+        @param job_dir job directory, must be visible to all the workers
+        @param lease_time time in seconds after which a task claimed by a
+                          worker of another host is considered abandoned
+                          and put back in the queue (None to only requeue
+                          the tasks of dead processes of this host)
+        """
+        self.jobDir = job_dir
+        self.leaseTime = lease_time
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+
+    def submit(self, points, cells, areas, numBlocks, quadrature_tol=0.):
+        """
+        Write the mesh and the task files. The task files of an earlier job
+        are removed, unless a worker is still processing them
+        @param points point coordinates, array of shape (numPoints, 3)
+        @param cells connectivity, array of shape (numTriangles, 3)
+        @param areas triangle areas
+        @param numBlocks number of row blocks
+        @param quadrature_tol quadrature tolerance
+        @return number of tasks
+        """
+        self.requeueStaleTasks()
+        running = glob.glob(os.path.join(self.jobDir, 'block_*' + RUNNING + '*'))
+        if running:
+            msg = 'ERROR: job directory {0} is in use, {1} tasks are running!'.format(self.jobDir,
+                                                                                   len(running))
+            raise RuntimeError(msg)
+        for fileName in glob.glob(os.path.join(self.jobDir, 'block_*')):
+            os.remove(fileName)
+
+        numpy.savez(os.path.join(self.jobDir, 'mesh.npz'),
+                    points=points, cells=cells, areas=areas,
+                    quadrature_tol=quadrature_tol)
+        blocks = getBalancedRowBlocks(len(areas), numBlocks)
+        for rowStart, rowEnd in blocks:
+            open(self.__getTaskName(rowStart, rowEnd) + '.todo', 'w').close()
+        return len(blocks)
+
+    def __getTaskName(self, rowStart, rowEnd):
+        return os.path.join(self.jobDir, 'block_{0:010d}_{1:010d}'.format(rowStart, rowEnd))
+
+    def requeueStaleTasks(self):
+        """
+        Put the tasks claimed by workers that died back in the queue. The
+        workers of this host are checked by process id, those of other
+        hosts by the age of their claim, see lease_time
+        @return number of requeued tasks
+        """
+        hostName = socket.gethostname()
+        numTasks = 0
+        for fileName in glob.glob(os.path.join(self.jobDir, 'block_*' + RUNNING + '*')):
+            taskName, owner = fileName.split(RUNNING)
+            host, pid = owner.rsplit('.', 1)
+            if host == hostName:
+                stale = not isProcessAlive(int(pid))
+            else:
+                try:
+                    age = time.time() - os.path.getmtime(fileName)
+                except OSError:
+                    # completed meanwhile
+                    continue
+                stale = self.leaseTime is not None and age > self.leaseTime
+            if not stale:
+                continue
+            try:
+                os.rename(fileName, taskName + '.todo')
+                numTasks += 1
+            except OSError:
+                # completed meanwhile
+                pass
+        return numTasks
+
+    def getNumberOfRemainingTasks(self):
+        """
+        Get the number of tasks that are not done
+        @return number
+        """
+        return len(glob.glob(os.path.join(self.jobDir, 'block_*.todo'))) + \
+            len(glob.glob(os.path.join(self.jobDir, 'block_*.running*')))
+
+    def gather(self, gMat, timeout=None, poll_interval=1.0):
+        """
+        Wait for the workers and store the results
+        @param gMat matrix (array or memmap)
+        @param timeout maximum waiting time in seconds (None to wait forever)
+        @param poll_interval time between checks of the job directory
+        """
+        areas = numpy.load(os.path.join(self.jobDir, 'mesh.npz'))['areas']
+        tStart = time.time()
+        while True:
+            for fileName in sorted(glob.glob(os.path.join(self.jobDir, 'block_*.npy'))):
+                rowStart, rowEnd = [int(w) for w in os.path.basename(fileName)[6:-4].split('_')]
+                storeLowerRows(gMat, areas, rowStart, rowEnd, numpy.load(fileName))
+                os.remove(fileName)
+            if self.getNumberOfRemainingTasks() == 0 and \
+               not glob.glob(os.path.join(self.jobDir, 'block_*.npy')):
+                break
+            self.requeueStaleTasks()
+            if timeout is not None and time.time() - tStart > timeout:
+                msg = 'ERROR: {0} tasks did not complete after {1}s!'.format(\
+                    self.getNumberOfRemainingTasks(), timeout)
+                raise RuntimeError(msg)
+            time.sleep(poll_interval)
+
+
+def runWorker(job_dir, num_threads=0):
+    """
+    Process the tasks of a job directory until there is none left
+    @param job_dir job directory
+    @param num_threads number of OpenMP threads (0 for the OpenMP default)
+    @return number of processed tasks
+    """
+    lib = cdll.LoadLibrary(getSharedLibraryName('icqLaplaceMatricesCpp'))
+    mesh = numpy.load(os.path.join(job_dir, 'mesh.npz'))
+    points = numpy.ascontiguousarray(mesh['points'], numpy.float64)
+    cells = numpy.ascontiguousarray(mesh['cells'], numpy.int32)
+    quadTol = float(mesh['quadrature_tol'])
+    suffix = RUNNING + '{0}.{1}'.format(socket.gethostname(), os.getpid())
+
+    numTasks = 0
+    while True:
+        # tasks may be requeued while the worker runs
+        todos = sorted(glob.glob(os.path.join(job_dir, 'block_*.todo')))
+        if not todos:
+            break
+        taskName = todos[0][:-5]
+        try:
+            # claim the task, the rename is atomic
+            os.rename(todos[0], taskName + suffix)
+        except OSError:
+            # taken by another worker
+            continue
+        rowStart, rowEnd = [int(w) for w in os.path.basename(taskName)[6:].split('_')]
+        strip = computeLowerRows(lib, points, cells, rowStart, rowEnd,
+                                 numThreads=num_threads, quadTol=quadTol)
+        # write under a temporary name, the coordinator only reads .npy files
+        tmpName = taskName + '.tmp.{0}.{1}'.format(socket.gethostname(), os.getpid())
+        with open(tmpName, 'wb') as f:
+            numpy.save(f, strip)
+        os.rename(tmpName, taskName + '.npy')
+        try:
+            os.remove(taskName + suffix)
+        except OSError:
+            # the claim was deemed stale and requeued
+            pass
+        numTasks += 1
+    return numTasks
+
+
+###############################################################################
+
+
+def testBalancedRowBlocks():
+
+    n = 1000
+    blocks = getBalancedRowBlocks(n, 8)
+    work = [(r1*(r1 - 1) - r0*(r0 - 1))//2 for r0, r1 in blocks]
+    print('row blocks: {0}'.format(blocks))
+    print('number of elements: {0}'.format(work))
+    assert(blocks[0][0] == 0 and blocks[-1][1] == n)
+    assert(max(work) < 1.1 * min(work))
+
+if __name__ == '__main__':
+    testBalancedRowBlocks()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+
+"""
+Matrix-free, multipole approximation of the Laplace single layer operator
+"""
+
+from __future__ import print_function
+import numpy
+
+FOUR_PI = 4. * numpy.pi
+
+
+class FastMultipoleOperator:
+
+    def __init__(self, centers, areas, diag, computePairs,
+                 theta=0.5, leaf_size=32, max_level=20, chunk_size=1000000):
+        """
+        Constructor
+        @param centers triangle centroids, array of shape (n, 3)
+        @param areas triangle areas, array of size n
+        @param diag diagonal elements of the Green matrix
+        @param computePairs function (obsIds, srcIds) -> exact Green matrix
+                            elements, used for the near field
+        @param theta opening parameter, the multipole expansion of a box
+                     is used when (box radius + leaf radius) < theta * distance
+        @param leaf_size maximum number of triangles in a leaf box
+        @param max_level maximum depth of the octree
+        @param chunk_size maximum number of (target, box) interactions
+                          evaluated at once
+        @note the triangles are reordered along the octree. Boxes are
+              approximated by their charge, dipole and quadrupole moments,
+              the far field costs O(n log n) per matrix-vector product
+              while the near field is stored as a sparse matrix
+        """
+        self.shape = (len(areas), len(areas))
+        self.areas = numpy.array(areas, numpy.float64)
+        self.diag = numpy.array(diag, numpy.float64)
+        self.theta = theta
+        self.leafSize = leaf_size
+        self.maxLevel = max_level
+        self.chunkSize = chunk_size
+
+        # work with coordinates relative to the center of mass, this
+        # reduces round-off errors in the moment computation
+        centers = numpy.array(centers, numpy.float64)
+        self.origin = centers.mean(axis=0)
+        self.x = centers - self.origin
+
+        self.__buildTree()
+        self.__buildInteractionLists()
+        self.__computeNearField(computePairs)
+
+    def __buildTree(self):
+        """
+        Build the octree, each box holding a contiguous range of the
+        permuted triangles
+        """
+        n = self.shape[0]
+        self.perm = numpy.arange(n)
+
+        xmin = self.x.min(axis=0)
+        xmax = self.x.max(axis=0)
+        starts = [0]
+        ends = [n]
+        boxCenters = [0.5*(xmin + xmax)]
+        halfWidths = [0.5*max((xmax - xmin).max(), 1.e-300)]
+        levels = [0]
+        children = [[-1]*8]
+
+        stack = [0]
+        while stack:
+            b = stack.pop()
+            s, e = starts[b], ends[b]
+            if e - s <= self.leafSize or levels[b] >= self.maxLevel:
+                continue
+            idx = self.perm[s:e]
+            c = boxCenters[b]
+            octants = (self.x[idx, 0] > c[0]) + \
+                2*(self.x[idx, 1] > c[1]) + \
+                4*(self.x[idx, 2] > c[2])
+            self.perm[s:e] = idx[numpy.argsort(octants, kind='mergesort')]
+            offsets = s + numpy.concatenate(([0],
+                                             numpy.cumsum(numpy.bincount(octants, minlength=8))))
+            hw = 0.5*halfWidths[b]
+            for k in range(8):
+                if offsets[k + 1] == offsets[k]:
+                    continue
+                signs = numpy.array([(k & 1) > 0, (k & 2) > 0, (k & 4) > 0])*2. - 1.
+                children[b][k] = len(starts)
+                stack.append(len(starts))
+                starts.append(offsets[k])
+                ends.append(offsets[k + 1])
+                boxCenters.append(c + hw*signs)
+                halfWidths.append(hw)
+                levels.append(levels[b] + 1)
+                children.append([-1]*8)
+
+        self.starts = numpy.array(starts)
+        self.ends = numpy.array(ends)
+        self.counts = self.ends - self.starts
+        self.boxCenters = numpy.array(boxCenters)
+        self.children = numpy.array(children)
+        self.isLeaf = (self.children < 0).all(axis=1)
+
+        # sorted positions
+        self.xs = self.x[self.perm, :]
+
+        # expansion centers and radii of the spheres that enclose the
+        # triangle centroids of each box
+        numBoxes = len(starts)
+        self.radii = numpy.zeros((numBoxes,), numpy.float64)
+        for b in range(numBoxes):
+            xb = self.xs[self.starts[b]:self.ends[b], :]
+            self.boxCenters[b, :] = 0.5*(xb.min(axis=0) + xb.max(axis=0))
+            self.radii[b] = numpy.sqrt(((xb - self.boxCenters[b, :])**2).sum(axis=1).max())
+
+    def __buildInteractionLists(self):
+        """
+        Traverse the tree for all the leaves at once and classify the
+        (leaf, box) pairs into far and near interactions
+        """
+        leaves = numpy.nonzero(self.isLeaf)[0]
+        pairLeaves = leaves
+        pairBoxes = numpy.zeros(leaves.shape, numpy.int64)
+        farLeaves, farBoxes, nearLeaves, nearBoxes = [], [], [], []
+
+        while len(pairLeaves) > 0:
+            dist = numpy.sqrt(((self.boxCenters[pairLeaves, :] -
+                                self.boxCenters[pairBoxes, :])**2).sum(axis=1))
+            far = (self.radii[pairLeaves] + self.radii[pairBoxes]) < self.theta*dist
+            farLeaves.append(pairLeaves[far])
+            farBoxes.append(pairBoxes[far])
+
+            near = ~far & self.isLeaf[pairBoxes]
+            nearLeaves.append(pairLeaves[near])
+            nearBoxes.append(pairBoxes[near])
+
+            # descend into the children of the remaining boxes
+            descend = ~far & ~self.isLeaf[pairBoxes]
+            kids = self.children[pairBoxes[descend], :]
+            pairLeaves = numpy.repeat(pairLeaves[descend], 8)
+            pairBoxes = kids.flatten()
+            valid = pairBoxes >= 0
+            pairLeaves = pairLeaves[valid]
+            pairBoxes = pairBoxes[valid]
+
+        self.farLeaves = numpy.concatenate(farLeaves)
+        self.farBoxes = numpy.concatenate(farBoxes)
+        self.nearLeaves = numpy.concatenate(nearLeaves)
+        self.nearBoxes = numpy.concatenate(nearBoxes)
+
+        # split the far interactions into chunks of at most chunkSize
+        # (target, box) evaluations
+        numTargets = numpy.cumsum(self.counts[self.farLeaves])
+        self.farChunks = [0]
+        while self.farChunks[-1] < len(numTargets):
+            beg = self.farChunks[-1]
+            offset = numTargets[beg - 1] if beg > 0 else 0
+            end = numpy.searchsorted(numTargets, offset + self.chunkSize, side='right')
+            self.farChunks.append(max(end, beg + 1))
+
+    @staticmethod
+    def __expandRanges(starts, counts):
+        """
+        Expand index ranges into indices
+        @param starts start indices of the ranges
+        @param counts sizes of the ranges
+        @return indices and the range to which each index belongs
+        """
+        rangeIds = numpy.repeat(numpy.arange(len(counts)), counts)
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+        return starts[rangeIds] + numpy.arange(counts.sum()) - offsets[rangeIds], rangeIds
+
+    def __expandPairs(self, rowStarts, rowCounts, colStarts, colCounts):
+        """
+        Expand pairs of index ranges into pairs of indices
+        @param rowStarts start indices of the row ranges
+        @param rowCounts sizes of the row ranges
+        @param colStarts start indices of the column ranges
+        @param colCounts sizes of the column ranges
+        @return row and column indices
+        """
+        sizes = rowCounts * colCounts
+        k, pairIds = self.__expandRanges(numpy.zeros(sizes.shape, numpy.int64), sizes)
+        nc = colCounts[pairIds]
+        return rowStarts[pairIds] + k // nc, colStarts[pairIds] + k % nc
+
+    def __computeNearField(self, computePairs):
+        """
+        Compute the exact matrix elements between the triangles of
+        neighbouring leaves
+        @param computePairs function (obsIds, srcIds) -> Green matrix elements
+        """
+        iSorted, jSorted = self.__expandPairs(self.starts[self.nearLeaves],
+                                              self.counts[self.nearLeaves],
+                                              self.starts[self.nearBoxes],
+                                              self.counts[self.nearBoxes])
+        self.nearRows = self.perm[iSorted]
+        self.nearCols = self.perm[jSorted]
+        self.nearVals = computePairs(self.nearRows, self.nearCols)
+        isSelf = self.nearRows == self.nearCols
+        self.nearVals[isSelf] = self.diag[self.nearRows[isSelf]]
+
+    def __computeMoments(self, q):
+        """
+        Compute the charge, dipole and quadrupole moments of all boxes
+        @param q charges in sorted order
+        @return moments
+        """
+        def rangeSum(arr):
+            cs = numpy.concatenate((numpy.zeros((1,) + arr.shape[1:]),
+                                    numpy.cumsum(arr, axis=0)))
+            return cs[self.ends] - cs[self.starts]
+
+        c = self.boxCenters
+        s0 = rangeSum(q)
+        s1 = rangeSum(q[:, numpy.newaxis] * self.xs)
+        s2 = rangeSum(q[:, numpy.newaxis, numpy.newaxis] * \
+                      self.xs[:, :, numpy.newaxis] * self.xs[:, numpy.newaxis, :])
+
+        # shift to the box centers
+        dipoles = s1 - c*s0[:, numpy.newaxis]
+        cs1 = c[:, :, numpy.newaxis] * s1[:, numpy.newaxis, :]
+        quadrupoles = s2 - cs1 - cs1.transpose((0, 2, 1)) + \
+            s0[:, numpy.newaxis, numpy.newaxis] * \
+            c[:, :, numpy.newaxis] * c[:, numpy.newaxis, :]
+        return s0, dipoles, quadrupoles
+
+    def __evaluateFarField(self, q):
+        """
+        Evaluate the far field potential at the (sorted) triangle centroids
+        @param q charges in sorted order
+        @return potential, sorted order
+        """
+        n = self.shape[0]
+        charges, dipoles, quadrupoles = self.__computeMoments(q)
+        traces = numpy.trace(quadrupoles, axis1=1, axis2=2)
+
+        res = numpy.zeros((n,), numpy.float64)
+        for k in range(len(self.farChunks) - 1):
+            beg, end = self.farChunks[k], self.farChunks[k + 1]
+            leaves = self.farLeaves[beg:end]
+            boxes = self.farBoxes[beg:end]
+            targets, pairIds = self.__expandRanges(self.starts[leaves],
+                                                   self.counts[leaves])
+            boxIds = boxes[pairIds]
+
+            d = self.xs[targets, :] - self.boxCenters[boxIds, :]
+            r2 = (d**2).sum(axis=1)
+            r = numpy.sqrt(r2)
+            dPd = (d * dipoles[boxIds, :]).sum(axis=1)
+            dMd = numpy.einsum('ki,kij,kj->k', d, quadrupoles[boxIds, :, :], d)
+            pot = charges[boxIds]/r + dPd/(r2*r) + \
+                (3.*dMd - r2*traces[boxIds])/(2.*r2*r2*r)
+            res += numpy.bincount(targets, weights=pot, minlength=n)
+
+        return res / (-FOUR_PI)
+
+    def dot(self, vec):
+        """
+        Apply the operator to a vector
+        @param vec vector of size n
+        @return result vector
+        """
+        vec = numpy.asarray(vec, numpy.float64)
+        n = self.shape[0]
+
+        # far field, the triangles are treated as point charges
+        q = (vec * self.areas)[self.perm]
+        res = numpy.zeros((n,), numpy.float64)
+        res[self.perm] = self.__evaluateFarField(q)
+
+        # near field
+        res += numpy.bincount(self.nearRows,
+                              weights=self.nearVals*vec[self.nearCols],
+                              minlength=n)
+        return res
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        return self.diag.copy()
+
+    def getNumberOfNearFieldElements(self):
+        """
+        Get the number of exactly computed matrix elements
+        @return number
+        """
+        return len(self.nearVals)
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 2000
+    centers = numpy.random.rand(n, 3)
+    areas = 1.e-3 * (1. + numpy.random.rand(n))
+    diag = -areas
+
+    def computePairs(obsIds, srcIds):
+        d = centers[obsIds, :] - centers[srcIds, :]
+        r = numpy.sqrt((d**2).sum(axis=1))
+        r[obsIds == srcIds] = 1.
+        return areas[srcIds] / (-FOUR_PI * r)
+
+    allIds = numpy.arange(n)
+    gMat = computePairs(numpy.repeat(allIds, n), numpy.tile(allIds, n)).reshape((n, n))
+    gMat[allIds, allIds] = diag
+
+    vec = numpy.random.rand(n) - 0.5
+    exact = gMat.dot(vec)
+    for theta in 0.3, 0.5:
+        op = FastMultipoleOperator(centers, areas, diag, computePairs,
+                                   theta=theta, leaf_size=16)
+        error = numpy.linalg.norm(op.dot(vec) - exact) / numpy.linalg.norm(exact)
+        print('theta = {0} near field elements: {1} relative error: {2}'.format(\
+            theta, op.getNumberOfNearFieldElements(), error))
+        assert(error < 1.e-2)
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+"""
+Hierarchical matrix compression of the Green function matrix, far field
+blocks are approximated by low rank factors obtained by adaptive cross
+approximation (ACA)
+"""
+
+from __future__ import print_function
+import numpy
+
+
+class HierarchicalMatrix:
+
+    def __init__(self, centers, diag, computeBlock,
+                 eta=1.0, leaf_size=32, tol=1.e-6, max_rank=None):
+        """
+        Constructor
+        @param centers triangle centroids, array of shape (n, 3)
+        @param diag diagonal elements of the matrix
+        @param computeBlock function (obsIds, srcIds) -> exact matrix block
+                            of shape (len(obsIds), len(srcIds))
+        @param eta admissibility parameter, a block is approximated if
+                   min(diameters) <= eta * distance between its clusters
+        @param leaf_size maximum number of triangles in a leaf cluster
+        @param tol relative accuracy of the low rank approximations
+        @param max_rank maximum rank of the low rank approximations
+        """
+        n = len(diag)
+        self.shape = (n, n)
+        self.diag = numpy.array(diag, numpy.float64)
+        self.eta = eta
+        self.leafSize = leaf_size
+        self.tol = tol
+        self.maxRank = max_rank
+
+        self.x = numpy.array(centers, numpy.float64)
+        self.__buildClusterTree()
+
+        # (row start, row end, col start, col end, matrix) in permuted order
+        self.denseBlocks = []
+        # (row start, row end, col start, col end, u, v) with block = u.v
+        self.lowRankBlocks = []
+        self.__buildBlocks(0, 0, computeBlock)
+
+    def __buildClusterTree(self):
+        """
+        Build a binary cluster tree by splitting the bounding boxes along
+        their largest extent at the median
+        """
+        n = self.shape[0]
+        self.perm = numpy.arange(n)
+        self.starts = [0]
+        self.ends = [n]
+        self.children = [None]
+        self.bboxes = []
+
+        stack = [0]
+        while stack:
+            c = stack.pop()
+            s, e = self.starts[c], self.ends[c]
+            idx = self.perm[s:e]
+            if e - s <= self.leafSize:
+                continue
+            extent = self.x[idx, :].max(axis=0) - self.x[idx, :].min(axis=0)
+            axis = numpy.argmax(extent)
+            self.perm[s:e] = idx[numpy.argsort(self.x[idx, axis], kind='mergesort')]
+            mid = (s + e) // 2
+            self.children[c] = (len(self.starts), len(self.starts) + 1)
+            for beg, end in (s, mid), (mid, e):
+                stack.append(len(self.starts))
+                self.starts.append(beg)
+                self.ends.append(end)
+                self.children.append(None)
+
+        for c in range(len(self.starts)):
+            xc = self.x[self.perm[self.starts[c]:self.ends[c]], :]
+            self.bboxes.append((xc.min(axis=0), xc.max(axis=0)))
+
+    def __isAdmissible(self, s, t):
+        """
+        Check whether the block between two clusters can be approximated
+        @param s row cluster
+        @param t column cluster
+        @return True if admissible
+        """
+        smin, smax = self.bboxes[s]
+        tmin, tmax = self.bboxes[t]
+        diamS = numpy.linalg.norm(smax - smin)
+        diamT = numpy.linalg.norm(tmax - tmin)
+        gap = numpy.maximum(0., numpy.maximum(tmin - smax, smin - tmax))
+        dist = numpy.linalg.norm(gap)
+        return min(diamS, diamT) <= self.eta * dist
+
+    def __buildBlocks(self, s, t, computeBlock):
+        """
+        Recursively partition the block (s, t) and compute its entries
+        @param s row cluster
+        @param t column cluster
+        @param computeBlock function (obsIds, srcIds) -> matrix block
+        """
+        rs, re = self.starts[s], self.ends[s]
+        cs, ce = self.starts[t], self.ends[t]
+
+        if self.__isAdmissible(s, t):
+            u, v = self.__aca(self.perm[rs:re], self.perm[cs:ce], computeBlock)
+            if u is not None:
+                self.lowRankBlocks.append((rs, re, cs, ce, u, v))
+                return
+
+        if self.children[s] is None or self.children[t] is None:
+            rows = self.perm[rs:re]
+            cols = self.perm[cs:ce]
+            block = computeBlock(rows, cols)
+            self.denseBlocks.append((rs, re, cs, ce, block))
+            return
+
+        for sc in self.children[s]:
+            for tc in self.children[t]:
+                self.__buildBlocks(sc, tc, computeBlock)
+
+    def __aca(self, rows, cols, computeBlock):
+        """
+        Adaptive cross approximation with partial pivoting
+        @param rows row indices
+        @param cols column indices
+        @param computeBlock function (obsIds, srcIds) -> matrix block
+        @return factors u (m x k) and v (k x n), or None, None if the
+                approximation does not pay off
+        """
+        m, n = len(rows), len(cols)
+        maxRank = min(m, n) // 2
+        if self.maxRank is not None:
+            maxRank = min(maxRank, self.maxRank)
+
+        us, vs = [], []
+        normApprox2 = 0.
+        usedRows = numpy.zeros((m,), numpy.bool_)
+        i = 0
+        while len(us) < maxRank:
+            usedRows[i] = True
+            row = computeBlock(rows[i:i + 1], cols)[0, :]
+            for u, v in zip(us, vs):
+                row -= u[i] * v
+            j = numpy.argmax(numpy.abs(row))
+            if row[j] == 0.:
+                # zero row, try another one
+                if usedRows.all():
+                    break
+                i = numpy.argmin(usedRows)
+                continue
+            v = row / row[j]
+            u = computeBlock(rows, cols[j:j + 1])[:, 0]
+            for uk, vk in zip(us, vs):
+                u -= vk[j] * uk
+
+            # update the Frobenius norm of the approximation
+            uNorm2 = u.dot(u)
+            vNorm2 = v.dot(v)
+            for uk, vk in zip(us, vs):
+                normApprox2 += 2. * u.dot(uk) * v.dot(vk)
+            normApprox2 += uNorm2 * vNorm2
+            us.append(u)
+            vs.append(v)
+
+            if uNorm2 * vNorm2 <= self.tol**2 * normApprox2:
+                break
+
+            # next pivot row
+            absU = numpy.abs(u)
+            absU[usedRows] = -1.
+            i = numpy.argmax(absU)
+            if absU[i] < 0:
+                break
+        else:
+            # did not converge
+            return None, None
+
+        if not us:
+            return numpy.zeros((m, 0)), numpy.zeros((0, n))
+
+        return self.__recompress(numpy.array(us).T, numpy.array(vs))
+
+    def __recompress(self, u, v):
+        """
+        Reduce the rank of a low rank factorization using QR and SVD
+        @param u left factor (m x k)
+        @param v right factor (k x n)
+        @return new factors
+        """
+        qu, ru = numpy.linalg.qr(u)
+        qv, rv = numpy.linalg.qr(v.T)
+        w, sigma, zt = numpy.linalg.svd(ru.dot(rv.T))
+        rank = max(1, (sigma > self.tol * sigma[0]).sum()) if sigma[0] > 0 else 0
+        return qu.dot(w[:, :rank] * sigma[:rank]), zt[:rank, :].dot(qv.T)
+
+    def dot(self, vec):
+        """
+        Apply the matrix to a vector
+        @param vec vector
+        @return result vector
+        """
+        vp = numpy.asarray(vec, numpy.float64)[self.perm]
+        res = numpy.zeros(self.shape[0], numpy.float64)
+        for rs, re, cs, ce, block in self.denseBlocks:
+            res[rs:re] += block.dot(vp[cs:ce])
+        for rs, re, cs, ce, u, v in self.lowRankBlocks:
+            res[rs:re] += u.dot(v.dot(vp[cs:ce]))
+        out = numpy.empty_like(res)
+        out[self.perm] = res
+        return out
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        return self.diag.copy()
+
+    def getMemoryFootprint(self):
+        """
+        Get the number of bytes used to store the compressed matrix
+        @return number of bytes
+        """
+        res = self.perm.nbytes
+        for block in self.denseBlocks:
+            res += block[4].nbytes
+        for block in self.lowRankBlocks:
+            res += block[4].nbytes + block[5].nbytes
+        return res
+
+    def getCompressionRatio(self):
+        """
+        Get the ratio of the compressed to the dense storage
+        @return ratio
+        """
+        return float(self.getMemoryFootprint()) / (8. * self.shape[0] * self.shape[1])
+
+###############################################################################
+
+
+def testRandomSurface():
+
+    numpy.random.seed(1234)
+    n = 2000
+    # points on the unit sphere
+    centers = numpy.random.randn(n, 3)
+    centers /= numpy.sqrt((centers**2).sum(axis=1))[:, numpy.newaxis]
+    diag = -numpy.ones((n,), numpy.float64)
+
+    def computeBlock(obsIds, srcIds):
+        d = centers[obsIds, numpy.newaxis, :] - centers[numpy.newaxis, srcIds, :]
+        r = numpy.sqrt((d**2).sum(axis=2))
+        r[obsIds[:, numpy.newaxis] == srcIds[numpy.newaxis, :]] = 1.
+        res = 1. / (-4. * numpy.pi * r)
+        res[obsIds[:, numpy.newaxis] == srcIds[numpy.newaxis, :]] = -1.
+        return res
+
+    allIds = numpy.arange(n)
+    gMat = computeBlock(allIds, allIds)
+
+    vec = numpy.random.rand(n) - 0.5
+    exact = gMat.dot(vec)
+    for tol in 1.e-4, 1.e-8:
+        hmat = HierarchicalMatrix(centers, diag, computeBlock, tol=tol)
+        error = numpy.linalg.norm(hmat.dot(vec) - exact) / numpy.linalg.norm(exact)
+        print('tol = {0} compression ratio: {1} relative error: {2}'.format(\
+            tol, hmat.getCompressionRatio(), error))
+        assert(error < 10*tol)
+
+if __name__ == '__main__':
+    testRandomSurface()
@@ -2,10 +2,77 @@
 #define ICQ_LAPLACE_FUNCTOR
 
 #include <icqFunctor.h>
+#include <cmath>
 
 class icqLaplaceFunctor : public icqFunctor {
 public:
     double operator()(const double* pSrc);
 };
 
+/**
+ * Evaluate the Laplace kernel -1/(4 pi r) for a block of observer points
+ * against a block of source points. The coordinates are stored in
+ * separate x, y and z arrays so that the inner loop vectorizes
+ * @param numObs number of observer points
+ * @param xObs observer x coordinates
+ * @param yObs observer y coordinates
+ * @param zObs observer z coordinates
+ * @param numSrc number of source points
+ * @param xSrc source x coordinates
+ * @param ySrc source y coordinates
+ * @param zSrc source z coordinates
+ * @param vals kernel values (output), row major array of shape (numObs, numSrc)
+ */
+inline void icqLaplaceKernelBlock(long numObs,
+                                  const double* xObs, const double* yObs, const double* zObs,
+                                  long numSrc,
+                                  const double* xSrc, const double* ySrc, const double* zSrc,
+                                  double* vals) {
+    const double c = -1.0 / (4. * M_PI);
+    for (long i = 0; i < numObs; ++i) {
+        double* v = &vals[i*numSrc];
+        for (long j = 0; j < numSrc; ++j) {
+            const double dx = xSrc[j] - xObs[i];
+            const double dy = ySrc[j] - yObs[i];
+            const double dz = zSrc[j] - zObs[i];
+            v[j] = c / sqrt(dx*dx + dy*dy + dz*dz);
+        }
+    }
+}
+
+/**
+ * Weighted sum of the Laplace kernel -1/(4 pi r) over all the pairs of
+ * a block of observer points and a block of source points
+ * @param numObs number of observer points
+ * @param xObs observer x coordinates
+ * @param yObs observer y coordinates
+ * @param zObs observer z coordinates
+ * @param wObs observer weights
+ * @param numSrc number of source points
+ * @param xSrc source x coordinates
+ * @param ySrc source y coordinates
+ * @param zSrc source z coordinates
+ * @param wSrc source weights
+ * @return sum over i and j of wObs[i] * wSrc[j] * kernel(i, j)
+ */
+inline double icqLaplaceWeightedSum(int numObs,
+                                    const double* xObs, const double* yObs, const double* zObs,
+                                    const double* wObs,
+                                    int numSrc,
+                                    const double* xSrc, const double* ySrc, const double* zSrc,
+                                    const double* wSrc) {
+    double res = 0;
+    for (int i = 0; i < numObs; ++i) {
+        double acc = 0;
+        for (int j = 0; j < numSrc; ++j) {
+            const double dx = xSrc[j] - xObs[i];
+            const double dy = ySrc[j] - yObs[i];
+            const double dz = zSrc[j] - zObs[i];
+            acc += wSrc[j] / sqrt(dx*dx + dy*dy + dz*dz);
+        }
+        res += wObs[i] * acc;
+    }
+    return res / (-4. * M_PI);
+}
+
 #endif // ICQ_LAPLACE_FUNCTOR
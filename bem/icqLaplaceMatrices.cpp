@@ -2,104 +2,496 @@
 #include <cmath>
 #include <icqQuadrature.h>
 #include <icqLaplaceMatrices.h>
-#include <vtkCellArray.h>
-#include <vtkPoints.h>
-#include <vtkIdList.h>
-
-double getArea(const std::vector<double>& pa, 
-               const std::vector<double>& pb,
-               const std::vector<double>& pc) {
-
-    std::vector<double> db(3);
-    std::vector<double> dc(3);
-    for (size_t j = 0; j < 3; ++j) {
-        db[j] = pb[j] - pa[j];
-        dc[j] = pc[j] - pa[j];
-    }
-
-    const double p12 = db[1]*dc[2];
-    const double p20 = db[2]*dc[0];
-    const double p01 = db[0]*dc[1];
-    const double p21 = db[2]*dc[1];
-    const double p02 = db[0]*dc[2];
-    const double p10 = db[1]*dc[0];
-    const double area = sqrt((p12-p21)*(p12-p21) +
-                             (p20-p02)*(p20-p02) +
-                             (p01-p10)*(p01-p10));
-    return area;
+#include <icqTriangleGeometry.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+/**
+ * Build the geometry of a set of triangles
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numIds number of triangles
+ * @param ids triangle indices (NULL for triangles 0...numIds - 1)
+ * @param quadTol quadrature tolerance, the Gauss points of the lower 
+ *                orders are only stored if quadTol > 0
+ * @return geometry, to be deleted by the caller
+ */
+icqTriangleGeometry* createGeometry(const double* points, const int* cells,
+                                    long numIds, const int* ids, double quadTol) {
+    int minOrder = (quadTol > 0? 1: ICQ_QUADRATURE_MAX_ORDER);
+    icqTriangleGeometry* geom = new icqTriangleGeometry(points, cells, numIds, ids,
+                                                        minOrder);
+    return geom;
+}
+
+/**
+ * Compute an influence matrix element
+ * @param obsGeom observer geometry
+ * @param iObs observer triangle in obsGeom
+ * @param srcGeom source geometry
+ * @param jSrc source triangle in srcGeom
+ * @param collocation 1 to use the observer centroid (collocation), 0 to 
+ *                    integrate over the observer triangle (Galerkin)
+ * @param quadTol tolerance used to select the quadrature order
+ * @return matrix element
+ */
+inline double evaluateGreen(const icqTriangleGeometry& obsGeom, long iObs,
+                            const icqTriangleGeometry& srcGeom, long jSrc,
+                            int collocation, double quadTol) {
+    // the kernel is nearly singular over the near field triangles (e.g. 
+    // sharing an edge or a vertex), where Gauss quadrature of any order is
+    // inaccurate.
+    // The integral over one of the triangles is then computed in closed form
+    if (collocation) {
+        const double* c = &obsGeom.centroids[3*iObs];
+        if (srcGeom.isPointNearField(c, jSrc) ||
+            obsGeom.isNearField(iObs, srcGeom, jSrc)) {
+            return obsGeom.evaluateCollocationNearField(iObs, srcGeom, jSrc);
+        }
+        int order = srcGeom.getPointQuadratureOrder(c, jSrc, quadTol);
+        return obsGeom.evaluateCollocation(iObs, srcGeom, jSrc, order);
+    }
+    if (obsGeom.isNearField(iObs, srcGeom, jSrc)) {
+        return obsGeom.evaluateNearField(iObs, srcGeom, jSrc);
+    }
+    int order = obsGeom.getQuadratureOrder(iObs, srcGeom, jSrc, quadTol);
+    return obsGeom.evaluate(iObs, srcGeom, jSrc, order);
 }
 
 /**
  * Compute the off diagonal influence matrix elements
- * @param pdata vtkPolyData instance
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
  * @param gMat influence matrix
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computeOffDiagonalTerms(const double* points, const int* cells,
+                             long numTriangles, double* gMat,
+                             int numThreads, double quadTol) {
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles,
+                                               NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    #pragma omp parallel num_threads(numThreads)
+    {
+        // Iterate over the source triangles. The number of observer 
+        // triangles decreases with jSrc, hence the dynamic schedule
+        #pragma omp for schedule(dynamic)
+        for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+
+            double areaSrc = geom->getArea(jSrc);
+
+            // Iterate over the observer triangles
+            for (long iObs = jSrc + 1; iObs < numTriangles; ++iObs) {
+                double g = evaluateGreen(*geom, iObs, *geom, jSrc, 0, quadTol);
+                gMat[numTriangles*iObs + jSrc] = g;
+                gMat[numTriangles*jSrc + iObs] = g * geom->getArea(iObs) / areaSrc;
+            }
+
+        }
+    }
+
+    delete geom;
+}
+
+/**
+ * Compute selected influence matrix elements
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numPairs number of matrix elements
+ * @param obsIds observer triangle indices (matrix rows)
+ * @param srcIds source triangle indices (matrix columns)
+ * @param vals matrix elements (output), diagonal elements are set to zero
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ * @param collocation 1 for the collocation elements (observer at the 
+ *                    centroid), 0 for the Galerkin elements
+ */
+extern "C"
+void computeGreenPairs(const double* points, const int* cells,
+                       long numPairs, const int* obsIds, const int* srcIds,
+                       double* vals, int numThreads, double quadTol,
+                       int collocation) {
+    // geometries of the observer and source triangles of the pairs
+    icqTriangleGeometry* obsGeom = createGeometry(points, cells, numPairs, obsIds, quadTol);
+    icqTriangleGeometry* srcGeom = createGeometry(points, cells, numPairs, srcIds, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (long k = 0; k < numPairs; ++k) {
+        if (obsIds[k] == srcIds[k]) {
+            vals[k] = 0;
+            continue;
+        }
+        vals[k] = evaluateGreen(*obsGeom, k, *srcGeom, k, collocation, quadTol);
+    }
+
+    delete obsGeom;
+    delete srcGeom;
+}
+
+/**
+ * Compute a block of the influence matrix
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numRows number of rows in the block
+ * @param obsIds observer triangle indices (block rows)
+ * @param numCols number of columns in the block
+ * @param srcIds source triangle indices (block columns)
+ * @param block matrix elements (output), row major, diagonal elements 
+ *              are set to zero
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ * @param collocation 1 for the collocation elements (observer at the 
+ *                    centroid), 0 for the Galerkin elements
+ */
+extern "C"
+void computeGreenBlock(const double* points, const int* cells,
+                       long numRows, const int* obsIds, 
+                       long numCols, const int* srcIds,
+                       double* block, int numThreads, double quadTol,
+                       int collocation) {
+    icqTriangleGeometry* obsGeom = createGeometry(points, cells, numRows, obsIds, quadTol);
+    icqTriangleGeometry* srcGeom = createGeometry(points, cells, numCols, srcIds, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (long i = 0; i < numRows; ++i) {
+        for (long j = 0; j < numCols; ++j) {
+            if (obsIds[i] == srcIds[j]) {
+                block[numCols*i + j] = 0;
+                continue;
+            }
+            block[numCols*i + j] = evaluateGreen(*obsGeom, i, *srcGeom, j, collocation, quadTol);
+        }
+    }
+
+    delete obsGeom;
+    delete srcGeom;
+}
+
+/**
+ * Compute the upper triangle of the symmetric influence matrix in packed, 
+ * column major storage. The symmetric matrix is the influence matrix 
+ * multiplied by the observer triangle areas.
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param sPacked matrix elements (output), element (i, j), i <= j, is 
+ *                stored at i + j*(j + 1)/2, diagonal elements are set to zero
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computePackedTerms(const double* points, const int* cells,
+                        long numTriangles, double* sPacked,
+                        int numThreads, double quadTol) {
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    // The number of elements increases with the column index, 
+    // hence the dynamic schedule
+    #pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+    for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+
+        double* col = &sPacked[jSrc*(jSrc + 1)/2];
+
+        for (long iObs = 0; iObs < jSrc; ++iObs) {
+            col[iObs] = geom->getArea(iObs) *
+                        evaluateGreen(*geom, iObs, *geom, jSrc, 0, quadTol);
+        }
+        col[jSrc] = 0;
+    }
+
+    delete geom;
+}
+
+/**
+ * Apply the influence matrix to vectors without storing the matrix,
+ * the elements are computed on the fly and discarded
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param x input vectors, row major array of shape (numTriangles, nrhs)
+ * @param y output vectors, row major array of shape (numTriangles, nrhs),
+ *          the diagonal elements of the matrix are not included
+ * @param nrhs number of vectors
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computeGreenMatVec(const double* points, const int* cells,
+                        long numTriangles, const double* x, double* y,
+                        long nrhs, int numThreads, double quadTol) {
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    for (long k = 0; k < numTriangles*nrhs; ++k) {
+        y[k] = 0;
+    }
+
+    #pragma omp parallel num_threads(numThreads)
+    {
+        // thread private accumulator, O(numTriangles) memory per thread
+        std::vector<double> yLocal(numTriangles*nrhs, 0.0);
+
+        #pragma omp for schedule(dynamic)
+        for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+
+            const double* xj = &x[jSrc*nrhs];
+            double* yj = &yLocal[jSrc*nrhs];
+            double areaSrc = geom->getArea(jSrc);
+
+            for (long iObs = jSrc + 1; iObs < numTriangles; ++iObs) {
+
+                double g = evaluateGreen(*geom, iObs, *geom, jSrc, 0, quadTol);
+                // element (jSrc, iObs) from the symmetry of A.G
+                double gT = g * geom->getArea(iObs) / areaSrc;
+
+                const double* xi = &x[iObs*nrhs];
+                double* yi = &yLocal[iObs*nrhs];
+                for (long m = 0; m < nrhs; ++m) {
+                    yi[m] += g * xj[m];
+                    yj[m] += gT * xi[m];
+                }
+            }
+        }
+
+        #pragma omp critical
+        {
+            for (long k = 0; k < numTriangles*nrhs; ++k) {
+                y[k] += yLocal[k];
+            }
+        }
+    }
+
+    delete geom;
+}
+
+/**
+ * Compute the strictly lower triangular part of a range of rows of the 
+ * influence matrix, the upper part follows from the symmetry of A.G
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param rowStart first row
+ * @param rowEnd one past the last row
+ * @param strip matrix elements (output), row major array of shape 
+ *              (rowEnd - rowStart, rowEnd), element (i, j) is stored at 
+ *              (i - rowStart)*rowEnd + j, elements with j >= i are set 
+ *              to zero
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
  */
 extern "C"
-void computeOffDiagonalTerms(vtkPolyData* pdata, double* gMat) {
-
-    icqQuadratureType* self;
-    icqQuadratureInit(&self);
-    int maxOrder = icqQuadratureGetMaxOrder(&self);
-
-    // Vertex coordinates for the source triangle
-    std::vector<double> paSrc(3);
-    std::vector<double> pbSrc(3);
-    std::vector<double> pcSrc(3);
-
-    // Observer triangle vertices
-    std::vector<double> paObs(3);
-    std::vector<double> pbObs(3);
-    std::vector<double> pcObs(3);
-
-    vtkCellArray* polys = pdata->GetPolys();
-    vtkPoints* points = pdata->GetPoints();
-    size_t numTriangles = polys->GetNumberOfCells();
-    polys->InitTraversal();
-
-    // Build the connectivity array, all triangles
-    vtkIdList* ptIds = vtkIdList::New();
-    std::vector<int> cells(numTriangles*3);
-    for (size_t i = 0; i < numTriangles; ++i) {
-        polys->GetNextCell(ptIds);
-        size_t ia = ptIds->GetId(0);
-        size_t ib = ptIds->GetId(1);
-        size_t ic = ptIds->GetId(2);
-        cells[3*i + 0] = ia;
-        cells[3*i + 1] = ib;
-        cells[3*i + 2] = ic; 
-    }
-    ptIds->Delete();
-
-    // Iterate over the source triangles
-    #pragma omp parallel for
-    for (size_t jSrc = 0; jSrc < numTriangles; ++jSrc) {
-
-        size_t ia = cells[3*jSrc + 0];
-        size_t ib = cells[3*jSrc + 1];
-        size_t ic = cells[3*jSrc + 2];
-
-        points->GetPoint(ia, &paSrc[0]);
-        points->GetPoint(ib, &pbSrc[0]);
-        points->GetPoint(ic, &pcSrc[0]);
-        double areaSrc = getArea(paSrc, pbSrc, pcSrc);
-
-        // Iterate over the observer triangles
-        for (size_t iObs = jSrc + 1; iObs < numTriangles; ++iObs) {
-
-            points->GetPoint(cells[3*iObs + 0], &paObs[0]);
-            points->GetPoint(cells[3*iObs + 1], &pbObs[0]);
-            points->GetPoint(cells[3*iObs + 2], &pcObs[0]);
-            double areaObs = getArea(paObs, pbObs, pcObs);
-
-            double g = icqQuadratureEvaluateDouble(&self,  maxOrder,
-                                                   &paObs[0], &pbObs[0], &pcObs[0],
-                                                   &paSrc[0], &pbSrc[0], &pcSrc[0]);
+void computeGreenLowerRows(const double* points, const int* cells,
+                           long rowStart, long rowEnd, double* strip,
+                           int numThreads, double quadTol) {
+    // the rows only couple to the triangles 0...rowEnd - 1
+    icqTriangleGeometry* geom = createGeometry(points, cells, rowEnd, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    // the number of elements increases with the row index
+    #pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+    for (long iObs = rowStart; iObs < rowEnd; ++iObs) {
+
+        double* row = &strip[(iObs - rowStart)*rowEnd];
+
+        for (long jSrc = 0; jSrc < iObs; ++jSrc) {
+            row[jSrc] = evaluateGreen(*geom, iObs, *geom, jSrc, 0, quadTol);
+        }
+        for (long jSrc = iObs; jSrc < rowEnd; ++jSrc) {
+            row[jSrc] = 0;
+        }
+    }
+
+    delete geom;
+}
+
+/**
+ * Compute the off diagonal elements of the single layer (influence) and
+ * of the double layer matrices in a single pass. Element (i, j) of the 
+ * double layer matrix is the integral over triangles i and j of the 
+ * derivative of -1/(4 pi r) along the normal of triangle j, divided by 
+ * the area of triangle i. The normals follow the vertex orientation
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param gMat single layer matrix (output), row major, the diagonal 
+ *             elements are not set
+ * @param kMat double layer matrix (output), row major, the diagonal 
+ *             elements are set to zero (flat triangles)
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computeGreenAndDoubleLayerTerms(const double* points, const int* cells,
+                                     long numTriangles, double* gMat, double* kMat,
+                                     int numThreads, double quadTol) {
+
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    // The number of observer triangles decreases with jSrc, hence the 
+    // dynamic schedule
+    #pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+    for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+
+        double areaSrc = geom->getArea(jSrc);
+        kMat[numTriangles*jSrc + jSrc] = 0;
+
+        for (long iObs = jSrc + 1; iObs < numTriangles; ++iObs) {
+            double g, k, kT;
+            if (geom->isNearField(iObs, *geom, jSrc)) {
+                // semi-analytic, the same single layer elements as the 
+                // other assembly functions
+                g = geom->evaluateNearField(iObs, *geom, jSrc);
+                geom->evaluateDoubleLayerNearField(iObs, *geom, jSrc, k, kT);
+            }
+            else {
+                int order = geom->getQuadratureOrder(iObs, *geom, jSrc, quadTol);
+                geom->evaluateWithDoubleLayer(iObs, *geom, jSrc, order, g, k, kT);
+            }
             gMat[numTriangles*iObs + jSrc] = g;
-            gMat[numTriangles*jSrc + iObs] = g * areaObs / areaSrc;
+            gMat[numTriangles*jSrc + iObs] = g * geom->getArea(iObs) / areaSrc;
+            kMat[numTriangles*iObs + jSrc] = k;
+            kMat[numTriangles*jSrc + iObs] = kT;
+        }
+    }
+
+    delete geom;
+}
+
+/**
+ * Compute the off diagonal elements of the collocation influence matrix.
+ * Element (i, j) is the integral of the kernel over triangle j seen from
+ * the centroid of triangle i. The matrix is not symmetric (after scaling
+ * by the areas), all the elements are computed
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param gMat influence matrix (output), row major, the diagonal elements
+ *             are not set
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computeCollocationTerms(const double* points, const int* cells,
+                             long numTriangles, double* gMat,
+                             int numThreads, double quadTol) {
+
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (long iObs = 0; iObs < numTriangles; ++iObs) {
+        double* row = &gMat[numTriangles*iObs];
+        for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+            if (jSrc != iObs) {
+                row[jSrc] = evaluateGreen(*geom, iObs, *geom, jSrc, 1, quadTol);
+            }
         }
+    }
+
+    delete geom;
+}
 
+/**
+ * Apply the collocation influence matrix to vectors without storing the
+ * matrix, the elements are computed on the fly and discarded
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param x input vectors, row major array of shape (numTriangles, nrhs)
+ * @param y output vectors, row major array of shape (numTriangles, nrhs),
+ *          the diagonal elements of the matrix are not included
+ * @param nrhs number of vectors
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                pair (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computeCollocationMatVec(const double* points, const int* cells,
+                              long numTriangles, const double* x, double* y,
+                              long nrhs, int numThreads, double quadTol) {
+
+    icqTriangleGeometry* geom = createGeometry(points, cells, numTriangles, NULL, quadTol);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
     }
+#endif
 
-    icqQuadratureDel(&self);
+    // each thread owns its rows, no reduction is needed
+    #pragma omp parallel for schedule(static) num_threads(numThreads)
+    for (long iObs = 0; iObs < numTriangles; ++iObs) {
+        double* yi = &y[iObs*nrhs];
+        for (long m = 0; m < nrhs; ++m) {
+            yi[m] = 0;
+        }
+        for (long jSrc = 0; jSrc < numTriangles; ++jSrc) {
+            if (jSrc == iObs) {
+                continue;
+            }
+            double g = evaluateGreen(*geom, iObs, *geom, jSrc, 1, quadTol);
+            const double* xj = &x[jSrc*nrhs];
+            for (long m = 0; m < nrhs; ++m) {
+                yi[m] += g * xj[m];
+            }
+        }
+    }
 
+    delete geom;
 }
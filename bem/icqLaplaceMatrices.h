@@ -1,9 +1,52 @@
 #ifndef ICQ_LAPLACE_MATRICES
 #define ICQ_LAPLACE_MATRICES
 
-#include <vtkPolyData.h>
+extern "C"
+void computeOffDiagonalTerms(const double* points, const int* cells,
+                             long numTriangles, double* gMat,
+                             int numThreads, double quadTol);
+
+extern "C"
+void computeGreenPairs(const double* points, const int* cells,
+                       long numPairs, const int* obsIds, const int* srcIds,
+                       double* vals, int numThreads, double quadTol,
+                       int collocation);
+
+extern "C"
+void computeGreenBlock(const double* points, const int* cells,
+                       long numRows, const int* obsIds,
+                       long numCols, const int* srcIds,
+                       double* block, int numThreads, double quadTol,
+                       int collocation);
+
+extern "C"
+void computePackedTerms(const double* points, const int* cells,
+                        long numTriangles, double* sPacked,
+                        int numThreads, double quadTol);
+
+extern "C"
+void computeGreenMatVec(const double* points, const int* cells,
+                        long numTriangles, const double* x, double* y,
+                        long nrhs, int numThreads, double quadTol);
+
+extern "C"
+void computeGreenLowerRows(const double* points, const int* cells,
+                           long rowStart, long rowEnd, double* strip,
+                           int numThreads, double quadTol);
+
+extern "C"
+void computeGreenAndDoubleLayerTerms(const double* points, const int* cells,
+                                     long numTriangles, double* gMat, double* kMat,
+                                     int numThreads, double quadTol);
+
+extern "C"
+void computeCollocationTerms(const double* points, const int* cells,
+                             long numTriangles, double* gMat,
+                             int numThreads, double quadTol);
 
 extern "C"
-void computeOffDiagonalTerms(vtkPolyData* pdata, double* gMat);
+void computeCollocationMatVec(const double* points, const int* cells,
+                              long numTriangles, const double* x, double* y,
+                              long nrhs, int numThreads, double quadTol);
 
 #endif // ICQ_LAPLACE_MATRICES
\ No newline at end of file
@@ -3,43 +3,339 @@
 from __future__ import print_function
 import vtk
 import numpy
-from icqsol.bem.icqBaseLaplaceSolver import BaseLaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import BaseLaplaceSolver, DENSE, PACKED, STREAM, \
+    CIRCULANT, MIRROR, COLLOCATION
+from icqsol.bem.icqBemMesh import BemMesh
+from icqsol.bem.icqTwoLevelPreconditioner import TwoLevelPreconditioner, getAggregates
+from icqsol.solvers.icqConjugateGradient import ConjugateGradient
+from icqsol.solvers.icqCholeskySolver import CholeskySolver
+from icqsol.solvers.icqLuSolver import LuSolver
+from icqsol.solvers.icqGmres import Gmres
+from icqsol.solvers.icqBiCGStab import BiCGStab
+from icqsol.util.icqDataFetcher import getArrayIndexFromName
+
+# linear solvers
+DIRECT = 'direct'
+CG = 'cg'
+GMRES = 'gmres'
+BICGSTAB = 'bicgstab'
+SOLVER_TYPES = [DIRECT, CG, GMRES, BICGSTAB]
+
+# preconditioners of the iterative solvers
+DIAGONAL = 'diagonal'
+TWO_LEVEL = 'twolevel'
+PRECONDITIONER_TYPES = [DIAGONAL, TWO_LEVEL]
+
+# ratio of the edge lengths of the coarse and fine meshes of the TWO_LEVEL
+# preconditioner
+COARSENING_FACTOR = 4.
+# largest ratio of the numbers of coarse and fine triangles of the TWO_LEVEL
+# preconditioner, the coarse Green matrix is inverted
+MAX_COARSE_RATIO = 0.5
+
+
+class SymmetricGreenOperator:
+
+    def __init__(self, gOp, areas):
+        """
+        Constructor
+        @param gOp Green function operator G
+        @param areas triangle areas
+        @note G is the product of the inverse of the diagonal area matrix A
+              and a symmetric matrix. -A.G is symmetric positive definite.
+        """
+        self.gOp = gOp
+        self.areas = areas
+        self.shape = gOp.shape
+
+    def dot(self, vec):
+        """
+        Apply the operator to a vector
+        @param vec vector
+        @return -A.G.vec
+        """
+        return -self.areas * self.gOp.dot(vec)
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        return -self.areas * self.gOp.diagonal()
+
 
 class LaplaceSolver(BaseLaplaceSolver):
 
-    def __init__(self, pdata, max_edge_length, order=5):
+    def __init__(self, pdata, max_edge_length, order=5, solver=None,
+                 tol=1.e-10, max_iter=None, preconditioner=DIAGONAL,
+                 coarse_mesh=None, coarse_max_edge_length=None, **kwargs):
         """
         Constructor
-        @param pdata instance of vtkPolyData
+        @param pdata instance of vtkPolyData or BemMesh
         @param max_edge_length maximum edge length, used to turn
                                polygons into triangles
+        @param order order of the Gauss quadrature scheme
+        @param solver DIRECT (Cholesky factorization, DENSE and PACKED 
+                      storage only, LU factorization if the DENSE matrix is
+                      not definite or with the COLLOCATION
+                      method, FFT block diagonalization with the CIRCULANT
+                      storage, one block per parity with the MIRROR
+                      storage), CG (conjugate gradient on the symmetric
+                      system -A.G.x = -A.src, GALERKIN method only), GMRES
+                      or BICGSTAB (applied to the non-symmetric matrix G).
+                      Defaults to DIRECT if the storage allows it (unless a
+                      TWO_LEVEL preconditioner is requested), CG (GMRES
+                      with the COLLOCATION method) otherwise
+        @param tol relative tolerance of the iterative solvers
+        @param max_iter maximum number of iterations of the iterative 
+                        solvers (None for the number of triangles)
+        @param preconditioner preconditioner of the iterative solvers,
+                              DIAGONAL (Jacobi) or TWO_LEVEL (direct solves
+                              on a coarse mesh and block-Jacobi smoothing
+                              over the fine triangles lying on each coarse
+                              triangle, see TwoLevelPreconditioner). The
+                              iteration counts of TWO_LEVEL stay about flat
+                              as the meshes are refined, each iteration
+                              costs three operator products
+        @param coarse_mesh coarse mesh of the TWO_LEVEL preconditioner, 
+                           vtkPolyData (e.g. from CoarsenSurface) or BemMesh
+                           instance, with at most MAX_COARSE_RATIO times
+                           the number of fine triangles. Defaults to pdata 
+                           refined with coarse_max_edge_length, which must
+                           then be finite
+        @param coarse_max_edge_length maximum edge length of the coarse
+                                      mesh (None for COARSENING_FACTOR*
+                                      max_edge_length if coarse_mesh is 
+                                      None, no refinement otherwise)
+        @param kwargs assembly options (num_threads, storage, method, ...), see
+                      BaseLaplaceSolver
         """
         #super(BaseLaplaceSolver, self).__init__(pdata, max_edge_length, order)
-        BaseLaplaceSolver.__init__(self, pdata, max_edge_length, order)
+        BaseLaplaceSolver.__init__(self, pdata, max_edge_length, order, **kwargs)
+
+        if solver is None:
+            solver = CG
+            if self.method == COLLOCATION:
+                solver = GMRES
+            if self.storage in (DENSE, PACKED, CIRCULANT, MIRROR) and preconditioner == DIAGONAL:
+                solver = DIRECT
+        if solver not in SOLVER_TYPES:
+            msg = 'ERROR: unknown solver {0}, must be one of {1}!'.format(solver, SOLVER_TYPES)
+            raise RuntimeError(msg)
+        if solver == DIRECT and self.storage not in (DENSE, PACKED, CIRCULANT, MIRROR):
+            msg = 'ERROR: solver {0} requires storage {1}, {2}, {3} or {4}!'.format(solver, DENSE,
+                                                                                  PACKED, CIRCULANT,
+                                                                                  MIRROR)
+            raise RuntimeError(msg)
+        if solver == CG and self.method == COLLOCATION:
+            msg = 'ERROR: solver {0} requires a symmetric operator, not method {1}!'.format(solver,
+                                                                                           COLLOCATION)
+            raise RuntimeError(msg)
+
+        if preconditioner not in PRECONDITIONER_TYPES:
+            msg = 'ERROR: unknown preconditioner {0}, must be one of {1}!'.format(preconditioner,
+                                                                                PRECONDITIONER_TYPES)
+            raise RuntimeError(msg)
+        if preconditioner == TWO_LEVEL and solver == DIRECT:
+            msg = 'ERROR: preconditioner {0} requires an iterative solver!'.format(preconditioner)
+            raise RuntimeError(msg)
+        if preconditioner == TWO_LEVEL and coarse_mesh is None:
+            if isinstance(pdata, BemMesh):
+                msg = 'ERROR: preconditioner {0} requires a coarse mesh when pdata ' \
+                      'is a BemMesh!'.format(preconditioner)
+                raise RuntimeError(msg)
+            # refined when first needed
+            coarse_mesh = pdata
+            if coarse_max_edge_length is None:
+                coarse_max_edge_length = COARSENING_FACTOR * max_edge_length
+            if numpy.isinf(coarse_max_edge_length):
+                # refinement only splits edges, the coarse mesh would be
+                # the fine mesh
+                msg = 'ERROR: preconditioner {0} requires a coarse mesh or a finite ' \
+                      'coarse_max_edge_length!'.format(preconditioner)
+                raise RuntimeError(msg)
+        if coarse_max_edge_length is None:
+            # the coarse mesh is given, only triangulated
+            coarse_max_edge_length = float('inf')
+
+        self.solver = solver
+        # relative tolerance of the iterative solver
+        self.tol = tol
+        self.maxNumIters = max_iter
+        # number of iterations and residual of the last iterative solve
+        self.numIterations = 0
+        self.residual = 0.
+        # Cholesky (or LU) factorization of the dense matrix, computed on
+        # the first solve
+        self.denseSolver = None
+        # LU factorization of the collocation matrix, computed on the first
+        # solve
+        self.luSolver = None
+        self.preconditioner = preconditioner
+        self.coarseMesh = coarse_mesh
+        self.coarseMaxEdgeLength = coarse_max_edge_length
+        # the TWO_LEVEL preconditioner, built on the first iterative solve
+        self.twoLevelPrecond = None
         self.responseName = 'normal_electric_field_jump'
         self.sourceName = 'v'
 
-    def computeResponseField(self):
+    def computeResponseField(self, src=None, x0=None):
         """
         Compute the response field, in this case the jump of the normal electric field
         due to a potential source
-        @return response
+        @param src source array of shape (n,) or (n, numComps), several
+                   sources (e.g. time points) are solved at once. By 
+                   default the source field is taken from the polydata
+        @param x0 initial guess of the response for the iterative solvers,
+                  same shape as the source (None for zero)
+        @return response, same shape as the source
         """
         
-        srcIndex = self.getSourceArrayIndex()
-        src = self.getSourceArray(srcIndex)
-
-        # Get the response matrix.
-        gMat = self.getGreenMatrix()
-
-        # Compute the response.
-        rsp = - numpy.linalg.solve(gMat, src)
+        if src is None:
+            srcIndex = self.getSourceArrayIndex()
+            src = self.getSourceArray(srcIndex)
+        src = numpy.asarray(src, numpy.float64)
+
+        # area weights, broadcast over the source components
+        areas = self.areas
+        if src.ndim == 2:
+            areas = self.areas[:, numpy.newaxis]
+
+        if self.solver == DIRECT and self.storage in (CIRCULANT, MIRROR):
+            # one small dense system per Fourier mode or parity. Solve 
+            # G.x = src, the response is -x
+            rsp = - self.getGreenOperator().solve(src)
+        elif self.solver == DIRECT and self.method == COLLOCATION:
+            if self.luSolver is None:
+                # the collocation matrix is not symmetric, its LU 
+                # factorization is shared by the solvers built on the 
+                # same mesh
+                gMat = self.getGreenMatrix()
+                self.luSolver = self.assembly.get('lu')
+                if self.luSolver is None:
+                    self.luSolver = LuSolver(gMat)
+                    self.assembly['lu'] = self.luSolver
+
+            # Solve G.x = src, the response is -x
+            rsp = - self.luSolver.solve(src)
+        elif self.solver == DIRECT and self.storage == DENSE:
+            if self.denseSolver is None:
+                # assembled on demand, the factorization is shared by the
+                # solvers built on the same mesh
+                gMat = self.getGreenMatrix()
+                self.denseSolver = self.assembly.get('factorization')
+                if self.denseSolver is None:
+                    # -A.G is symmetric positive definite, factor it once.
+                    # Quadrature errors (e.g. a low order on a fine mesh)
+                    # can make it indefinite, fall back to LU
+                    sMat = -self.areas[:, numpy.newaxis] * gMat
+                    try:
+                        self.denseSolver = CholeskySolver(sMat)
+                    except RuntimeError:
+                        self.denseSolver = LuSolver(sMat)
+                    self.assembly['factorization'] = self.denseSolver
+
+            # Solve -A.G.x = -A.src, the response is -x
+            rsp = self.denseSolver.solve(areas * src)
+        elif self.solver == DIRECT:
+            # Cholesky factorization of the packed symmetric matrix
+            rsp = - self.getGreenOperator().solve(src)
+        elif self.solver == CG:
+            # Solve the symmetric system -A.G.x = -A.src
+            op = SymmetricGreenOperator(self.getGreenOperator(), self.areas)
+            rsp = self.__solveIteratively(ConjugateGradient, op, -areas * src, x0, -1.)
+        else:
+            # Solve G.x = src
+            linSolverType = Gmres
+            if self.solver == BICGSTAB:
+                linSolverType = BiCGStab
+            rsp = self.__solveIteratively(linSolverType, self.getGreenOperator(), src, x0,
+                                          self.areas)
 
         self.addResponseField(rsp)
 
         return rsp
 
 
+    def getSurfaceDensity(self):
+        """
+        Get the charge density that produces the Dirichlet potential, 
+        minus the jump of the normal electric field
+        @return array of shape (n,) or (n, numComps)
+        """
+        rspIndex = getArrayIndexFromName(self.pdata.GetCellData(), self.responseName)
+        if rspIndex < 0:
+            msg = 'ERROR: no response field {0}, call computeResponseField first!'.format(self.responseName)
+            raise RuntimeError(msg)
+        return - self.getSourceArray(rspIndex)
+
+    def __getTwoLevelPreconditioner(self, op, scale):
+        """
+        Get the TWO_LEVEL preconditioner, built when first needed
+        @param op operator of the iterative solver, D^-1.A.G
+        @param scale diagonal of D
+        @return TwoLevelPreconditioner instance
+        """
+        if self.twoLevelPrecond is None:
+            coarseMesh = self.coarseMesh
+            if not isinstance(coarseMesh, BemMesh):
+                coarseMesh = BemMesh(coarseMesh, self.coarseMaxEdgeLength)
+            if coarseMesh.numTriangles > MAX_COARSE_RATIO * self.numTriangles:
+                msg = 'ERROR: the coarse mesh of preconditioner {0} has {1} triangles, ' \
+                      'the fine mesh {2}, the coarse mesh must have at most {3} ' \
+                      'triangles!'.format(self.preconditioner, coarseMesh.numTriangles,
+                                          self.numTriangles,
+                                          int(MAX_COARSE_RATIO * self.numTriangles))
+                raise RuntimeError(msg)
+            coarseSolver = BaseLaplaceSolver(coarseMesh, None, self.order,
+                                             num_threads=self.numThreads,
+                                             quadrature_tol=self.quadTol,
+                                             storage=STREAM, method=self.method)
+            ids = numpy.arange(coarseMesh.numTriangles)
+            aggregates = getAggregates(self.centers, coarseMesh.getPoints(),
+                                       coarseMesh.getCells())
+            self.twoLevelPrecond = TwoLevelPreconditioner(op, scale, self.areas, aggregates,
+                                                          self.getGreenMatrixBlock,
+                                                          coarseMesh.getAreas(),
+                                                          coarseSolver.getGreenMatrixBlock(ids, ids))
+        return self.twoLevelPrecond
+
+    def __solveIteratively(self, linSolverType, op, b, x0, scale):
+        """
+        Solve op.x = b for each column of b
+        @param linSolverType iterative solver class
+        @param op operator
+        @param b right hand side, array of shape (n,) or (n, numComps)
+        @param x0 initial guess of the response (-x) or None
+        @param scale diagonal of D, op being D^-1.A.G (used by the TWO_LEVEL
+                     preconditioner)
+        @return response -x, same shape as b
+        """
+        # one column per source component
+        bs = b.reshape((b.shape[0], -1))
+        xs = numpy.zeros(bs.shape, numpy.float64)
+        if x0 is not None:
+            xs[...] = - numpy.asarray(x0, numpy.float64).reshape(bs.shape)
+
+        precond = None
+        if self.preconditioner == TWO_LEVEL:
+            precond = self.__getTwoLevelPreconditioner(op, scale)
+
+        self.numIterations = 0
+        self.residual = 0.
+        for j in range(bs.shape[1]):
+            linSolver = linSolverType(op, bs[:, j].copy())
+            linSolver.setTolerance(self.tol * numpy.linalg.norm(bs[:, j]))
+            if precond is not None:
+                linSolver.setPreconditioner(precond)
+            if self.maxNumIters is not None:
+                linSolver.setMaxNumberOfIterations(self.maxNumIters)
+            xs[:, j], err, numIters = linSolver.solve(xs[:, j].copy())
+            self.numIterations = max(self.numIterations, numIters)
+            self.residual = max(self.residual, err)
+
+        return - xs.reshape(b.shape)
+
 ###############################################################################
 
 
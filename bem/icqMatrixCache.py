@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+On-disk cache of assembled matrices, keyed by a hash of the mesh and of
+the assembly parameters. Matrices are stored in numpy's .npy format and
+memory-mapped when loaded.
+"""
+
+from __future__ import print_function
+import os
+import hashlib
+import tempfile
+import numpy
+
+# bump to invalidate the cached files when the assembly changes
+CACHE_VERSION = 2
+
+
+class MatrixCache:
+
+    def __init__(self, cache_dir):
+        """
+        Constructor
+        @param cache_dir directory where the matrices are stored, will be
+                         created if it does not exist
+        """
+        self.cacheDir = cache_dir
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def getKey(self, arrays, **params):
+        """
+        Compute the cache key
+        @param arrays list of arrays (e.g. the points and the connectivity)
+        @param params assembly parameters (e.g. order, kernel, ...)
+        @return hexadecimal string
+        """
+        sha = hashlib.sha1()
+        sha.update('version={0}'.format(CACHE_VERSION).encode('utf-8'))
+        for arr in arrays:
+            arr = numpy.ascontiguousarray(arr)
+            sha.update('{0}{1}'.format(arr.dtype.str, arr.shape).encode('utf-8'))
+            sha.update(arr.tobytes())
+        for name in sorted(params):
+            sha.update('{0}={1!r}'.format(name, params[name]).encode('utf-8'))
+        return sha.hexdigest()
+
+    def getFileName(self, key):
+        """
+        Get the file name associated with a key
+        @param key cache key
+        @return file name
+        """
+        return os.path.join(self.cacheDir, key + '.npy')
+
+    def load(self, key, mmap_mode='r'):
+        """
+        Load a matrix
+        @param key cache key
+        @param mmap_mode memory map mode, 'r' (read only) or 'c' (copy on write)
+        @return memory mapped array or None if the key is not in the cache
+        """
+        fileName = self.getFileName(key)
+        if not os.path.exists(fileName):
+            return None
+        return numpy.load(fileName, mmap_mode=mmap_mode)
+
+    def save(self, key, mat):
+        """
+        Save a matrix
+        @param key cache key
+        @param mat array
+        """
+        # write to a temporary file first so that concurrent jobs never
+        # see a partially written matrix
+        fd, tmpName = tempfile.mkstemp(suffix='.npy', dir=self.cacheDir)
+        with os.fdopen(fd, 'wb') as f:
+            numpy.save(f, mat)
+        os.rename(tmpName, self.getFileName(key))
+
+###############################################################################
+
+
+def testCache():
+
+    import shutil
+    cacheDir = tempfile.mkdtemp()
+    try:
+        cache = MatrixCache(cacheDir)
+        points = numpy.random.rand(10, 3)
+        cells = numpy.array([[0, 1, 2], [2, 3, 4]], numpy.int32)
+        key = cache.getKey([points, cells], order=5, kernel='laplace')
+        assert(key != cache.getKey([points, cells], order=4, kernel='laplace'))
+        assert(cache.load(key) is None)
+
+        mat = numpy.random.rand(2, 2)
+        cache.save(key, mat)
+        res = cache.load(key)
+        print('cached matrix: {0}'.format(res))
+        assert(isinstance(res, numpy.memmap))
+        assert(numpy.all(res == mat))
+    finally:
+        shutil.rmtree(cacheDir)
+
+if __name__ == '__main__':
+    testCache()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+Green function matrix of a surface symmetric about one to three coordinate
+planes. The mesh is made of the images of a fundamental domain (see
+BemMesh), the matrix couples the fundamental domain with its images only
+through the reflections relating them. Combining the images with the
+symmetric and antisymmetric parities of each plane splits the matrix into
+independent blocks of the size of the fundamental domain
+"""
+
+from __future__ import print_function
+import numpy
+
+
+def getParitySigns(numImages):
+    """
+    Get the signs of the images for each combination of parities
+    @param numImages number of images, 2**number of mirror planes
+    @return array of shape (numImages, numImages), element (p, k) is -1 if
+            image k is reflected an odd number of times about the planes
+            that are antisymmetric in parity p, +1 otherwise
+    """
+    signs = numpy.ones((numImages, numImages), numpy.float64)
+    for p in range(numImages):
+        for k in range(numImages):
+            if bin(p & k).count('1') % 2:
+                signs[p, k] = -1.
+    return signs
+
+
+class MirrorSymmetricMatrix:
+
+    def __init__(self, numTriangles, numImages, computeBlock):
+        """
+        Constructor
+        @param numTriangles number of triangles
+        @param numImages number of images of the fundamental domain (2, 4
+                         or 8), the triangles of image k being the triangles
+                         k*m ... (k + 1)*m - 1
+        @param computeBlock function (obsIds, srcIds) -> exact matrix block
+                            of shape (len(obsIds), len(srcIds))
+        @note the rows of the fundamental domain are assembled,
+              numTriangles**2/numImages elements, and folded into one block
+              of size m x m per parity
+        """
+        self.numImages = numImages
+        self.signs = getParitySigns(numImages)
+        n = numTriangles
+        m = n // numImages
+        self.shape = (n, n)
+
+        # element (i, j) of image (k, l) only depends on the reflection k^l
+        # relating the images, blocks[k] couples the fundamental domain
+        # with image k
+        row = computeBlock(numpy.arange(m), numpy.arange(n))
+        blocks = row.reshape((m, numImages, m)).transpose((1, 0, 2))
+
+        # parity blocks, sum of the images weighted by their signs
+        self.parityBlocks = numpy.einsum('pk,kij->pij', self.signs, blocks)
+
+        # inverses of the parity blocks, computed when first needed
+        self.inverseBlocks = [None] * numImages
+
+    def __toParities(self, vec):
+        """
+        Combine the images of a vector
+        @param vec vector or array of shape (n, nrhs)
+        @return array of shape (numImages, m) or (numImages, m, nrhs)
+        """
+        x = numpy.asarray(vec, numpy.float64)
+        x = x.reshape((self.numImages, -1) + x.shape[1:])
+        return numpy.tensordot(self.signs, x, axes=(1, 0))
+
+    def __fromParities(self, arr):
+        """
+        Inverse of __toParities
+        @param arr array of shape (numImages, m) or (numImages, m, nrhs)
+        @return vector or array of shape (n, nrhs)
+        """
+        # the sign matrix is symmetric and its square is numImages*I
+        res = numpy.tensordot(self.signs, arr, axes=(1, 0)) / self.numImages
+        return res.reshape((self.shape[0],) + arr.shape[2:])
+
+    def dot(self, vec):
+        """
+        Apply the matrix to a vector
+        @param vec vector or array of shape (n, nrhs)
+        @return result, same shape as vec
+        """
+        x = self.__toParities(vec)
+        y = numpy.einsum('pij,pj...->pi...', self.parityBlocks, x)
+        return self.__fromParities(y)
+
+    def solve(self, vec):
+        """
+        Solve the linear system. Only the parities present in the right hand
+        side are solved for, a source with the symmetry of the surface
+        needs a single m x m inverse
+        @param vec right hand side, vector or array of shape (n, nrhs)
+        @return solution, same shape as vec
+        """
+        y = self.__toParities(vec)
+        x = numpy.zeros(y.shape, numpy.float64)
+        scale = numpy.abs(y).max()
+        for p in range(self.numImages):
+            if numpy.abs(y[p]).max() <= 1.e-14 * scale:
+                continue
+            if self.inverseBlocks[p] is None:
+                self.inverseBlocks[p] = numpy.linalg.inv(self.parityBlocks[p])
+            x[p] = self.inverseBlocks[p].dot(y[p])
+        return self.__fromParities(x)
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        # the diagonal of blocks[0], the mean of the parity blocks
+        diag = numpy.diagonal(self.parityBlocks.sum(axis=0)) / self.numImages
+        return numpy.tile(diag, self.numImages)
+
+###############################################################################
+
+
+def testRandom():
+
+    numImages, m = 4, 3
+    n = numImages * m
+
+    # matrix invariant under the reflections
+    blocks = numpy.random.rand(numImages, m, m)
+    mat = numpy.zeros((n, n))
+    for k in range(numImages):
+        for l in range(numImages):
+            mat[k*m:(k + 1)*m, l*m:(l + 1)*m] = blocks[k ^ l]
+    mat += n * numpy.eye(n)
+
+    def computeBlock(obsIds, srcIds):
+        return mat[numpy.ix_(obsIds, srcIds)]
+
+    mm = MirrorSymmetricMatrix(n, numImages, computeBlock)
+    x = numpy.random.rand(n, 2)
+    assert(numpy.allclose(mm.dot(x), mat.dot(x)))
+    assert(numpy.allclose(mm.dot(x[:, 0]), mat.dot(x[:, 0])))
+    assert(numpy.allclose(mm.solve(x), numpy.linalg.solve(mat, x)))
+    assert(numpy.allclose(mm.diagonal(), mat.diagonal()))
+
+    # a symmetric source only involves the symmetric parity
+    mm = MirrorSymmetricMatrix(n, numImages, computeBlock)
+    x = numpy.tile(numpy.random.rand(m), numImages)
+    assert(numpy.allclose(mm.solve(x), numpy.linalg.solve(mat, x)))
+    assert(mm.inverseBlocks[0] is not None)
+    assert(all([inv is None for inv in mm.inverseBlocks[1:]]))
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+"""
+Dense Green function matrix stored in a memory-mapped file, assembled and
+applied tile by tile so that matrices larger than the memory can be used
+"""
+
+from __future__ import print_function
+import os
+import tempfile
+import numpy
+
+
+class OutOfCoreMatrix:
+
+    def __init__(self, diag, areas, computeBlock, tile_size=512, scratch_dir=None):
+        """
+        Constructor
+        @param diag diagonal elements of the matrix
+        @param areas triangle areas, A.G is symmetric
+        @param computeBlock function (obsIds, srcIds) -> exact matrix block
+                            of shape (len(obsIds), len(srcIds))
+        @param tile_size number of rows and columns of a tile, the default
+                         tile (2 MB) fits in the L2/L3 cache
+        @param scratch_dir directory of the memory-mapped file (None for
+                           the default temporary directory)
+        """
+        n = len(diag)
+        self.shape = (n, n)
+        self.diag = numpy.array(diag, numpy.float64)
+        self.tileSize = tile_size
+
+        fd, self.fileName = tempfile.mkstemp(suffix='.gmat', dir=scratch_dir)
+        os.close(fd)
+        self.mat = numpy.memmap(self.fileName, dtype=numpy.float64,
+                                mode='w+', shape=self.shape)
+
+        self.__assemble(numpy.asarray(areas, numpy.float64), computeBlock)
+
+    def __del__(self):
+        self.close()
+
+    def __assemble(self, areas, computeBlock):
+        """
+        Compute the lower triangle of tiles, the upper tiles follow from
+        the symmetry of A.G
+        @param areas triangle areas
+        @param computeBlock function (obsIds, srcIds) -> matrix block
+        """
+        n = self.shape[0]
+        ts = self.tileSize
+        for i0 in range(0, n, ts):
+            i1 = min(i0 + ts, n)
+            rows = numpy.arange(i0, i1)
+            for j0 in range(0, i0 + 1, ts):
+                j1 = min(j0 + ts, n)
+                cols = numpy.arange(j0, j1)
+                block = computeBlock(rows, cols)
+                self.mat[i0:i1, j0:j1] = block
+                if j0 < i0:
+                    # G_ji = G_ij * A_i / A_j
+                    self.mat[j0:j1, i0:i1] = (block * areas[i0:i1, numpy.newaxis] /
+                                              areas[numpy.newaxis, j0:j1]).T
+        self.mat.flush()
+
+    def close(self):
+        """
+        Release the memory-mapped file
+        """
+        if getattr(self, 'mat', None) is not None:
+            del self.mat
+            self.mat = None
+            if os.path.exists(self.fileName):
+                os.remove(self.fileName)
+
+    def dot(self, vec):
+        """
+        Apply the matrix to a vector, streaming row stripes of tiles
+        @param vec vector or array of shape (n, nrhs)
+        @return result, same shape as vec
+        """
+        vec = numpy.asarray(vec, numpy.float64)
+        n = self.shape[0]
+        res = numpy.zeros(vec.shape, numpy.float64)
+        for i0 in range(0, n, self.tileSize):
+            i1 = min(i0 + self.tileSize, n)
+            res[i0:i1, ...] = self.mat[i0:i1, :].dot(vec)
+        return res
+
+    def diagonal(self):
+        """
+        Get the diagonal elements
+        @return array
+        """
+        return self.diag.copy()
+
+    def getFileName(self):
+        """
+        Get the name of the memory-mapped file
+        @return file name
+        """
+        return self.fileName
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 1000
+    areas = numpy.random.rand(n) + 0.5
+    x = numpy.random.rand(n, 3)
+    d = x[:, numpy.newaxis, :] - x[numpy.newaxis, :, :]
+    r = numpy.sqrt((d**2).sum(axis=2)) + numpy.eye(n)
+    # A.G is symmetric
+    gMat = -areas[numpy.newaxis, :] / r
+
+    def computeBlock(obsIds, srcIds):
+        return gMat[obsIds, :][:, srcIds]
+
+    mat = OutOfCoreMatrix(gMat.diagonal(), areas, computeBlock, tile_size=128)
+    fileName = mat.getFileName()
+    vec = numpy.random.rand(n, 2)
+    error = numpy.linalg.norm(mat.dot(vec) - gMat.dot(vec))
+    print('matvec error: {0}'.format(error))
+    assert(error < 1.e-10)
+    mat.close()
+    assert(not os.path.exists(fileName))
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,223 @@
+/**
+ * Linear algebra on symmetric matrices in packed storage. Only the upper 
+ * triangle is stored, column by column: element (i, j), i <= j, is at 
+ * position i + j*(j + 1)/2 (LAPACK's 'U' packed format).
+ */
+
+#include <vector>
+#include <cmath>
+#include <icqPackedMatrices.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+/**
+ * Compute y = S.x for a symmetric matrix S
+ * @param n matrix size
+ * @param ap upper triangle of S in packed storage
+ * @param x input vector
+ * @param y output vector
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ */
+extern "C"
+void packedSymmetricMatVec(long n, const double* ap, const double* x, double* y,
+                           int numThreads) {
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    for (long i = 0; i < n; ++i) {
+        y[i] = 0;
+    }
+
+    #pragma omp parallel num_threads(numThreads)
+    {
+        // Each column contributes to all the rows up to the diagonal,
+        // accumulate in a thread private vector
+        std::vector<double> yLocal(n, 0.0);
+
+        #pragma omp for schedule(dynamic, 64)
+        for (long j = 0; j < n; ++j) {
+            const double* col = &ap[j*(j + 1)/2];
+            const double xj = x[j];
+            double yj = 0;
+            for (long i = 0; i < j; ++i) {
+                yLocal[i] += col[i] * xj;
+                yj += col[i] * x[i];
+            }
+            yLocal[j] += yj + col[j] * xj;
+        }
+
+        #pragma omp critical
+        {
+            for (long i = 0; i < n; ++i) {
+                y[i] += yLocal[i];
+            }
+        }
+    }
+}
+
+/**
+ * Compute y = U.x or y = U^T.x for an upper triangular matrix U
+ * @param n matrix size
+ * @param ap U in packed storage
+ * @param x input vector
+ * @param y output vector
+ * @param transpose apply U^T if != 0
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ */
+extern "C"
+void packedUpperMatVec(long n, const double* ap, const double* x, double* y,
+                       int transpose, int numThreads) {
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    if (transpose) {
+        // y_j = sum_{i <= j} U_ij x_i, the dot product of column j with x
+        #pragma omp parallel for num_threads(numThreads) schedule(dynamic, 64)
+        for (long j = 0; j < n; ++j) {
+            const double* col = &ap[j*(j + 1)/2];
+            double yj = 0;
+            for (long i = 0; i <= j; ++i) {
+                yj += col[i] * x[i];
+            }
+            y[j] = yj;
+        }
+        return;
+    }
+
+    for (long i = 0; i < n; ++i) {
+        y[i] = 0;
+    }
+
+    #pragma omp parallel num_threads(numThreads)
+    {
+        std::vector<double> yLocal(n, 0.0);
+
+        #pragma omp for schedule(dynamic, 64)
+        for (long j = 0; j < n; ++j) {
+            const double* col = &ap[j*(j + 1)/2];
+            const double xj = x[j];
+            for (long i = 0; i <= j; ++i) {
+                yLocal[i] += col[i] * xj;
+            }
+        }
+
+        #pragma omp critical
+        {
+            for (long i = 0; i < n; ++i) {
+                y[i] += yLocal[i];
+            }
+        }
+    }
+}
+
+/**
+ * Cholesky factorization S = U^T.U of a symmetric positive definite 
+ * matrix, in place
+ * @param n matrix size
+ * @param ap upper triangle of S in packed storage (input), U (output)
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @return 0 if successful, k > 0 if the leading minor of order k is not 
+ *         positive definite
+ */
+extern "C"
+long packedCholeskyFactor(long n, double* ap, int numThreads) {
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    // row k of U, gathered from the packed columns
+    std::vector<double> row(n);
+    long info = 0;
+
+    #pragma omp parallel num_threads(numThreads)
+    {
+        for (long k = 0; k < n; ++k) {
+
+            #pragma omp single
+            {
+                double akk = ap[k + k*(k + 1)/2];
+                if (akk <= 0) {
+                    info = k + 1;
+                }
+                else {
+                    akk = sqrt(akk);
+                    ap[k + k*(k + 1)/2] = akk;
+                    for (long j = k + 1; j < n; ++j) {
+                        ap[k + j*(j + 1)/2] /= akk;
+                        row[j] = ap[k + j*(j + 1)/2];
+                    }
+                }
+            }
+            // implicit barrier
+
+            if (info != 0) break;
+
+            // update the trailing matrix, column by column
+            #pragma omp for schedule(dynamic, 64)
+            for (long j = k + 1; j < n; ++j) {
+                double* col = &ap[j*(j + 1)/2];
+                const double rj = row[j];
+                for (long i = k + 1; i <= j; ++i) {
+                    col[i] -= row[i] * rj;
+                }
+            }
+        }
+    }
+
+    return info;
+}
+
+/**
+ * Solve U^T.U.x = b given the Cholesky factor U, for several right hand 
+ * sides at once
+ * @param n matrix size
+ * @param ap U in packed storage
+ * @param b right hand sides (input), solutions (output), row major array 
+ *          of shape (n, nrhs)
+ * @param nrhs number of right hand sides
+ */
+extern "C"
+void packedCholeskySolve(long n, const double* ap, double* b, long nrhs) {
+
+    // forward substitution, U^T.y = b
+    for (long i = 0; i < n; ++i) {
+        const double* col = &ap[i*(i + 1)/2];
+        double* bi = &b[i*nrhs];
+        for (long k = 0; k < i; ++k) {
+            const double* bk = &b[k*nrhs];
+            for (long m = 0; m < nrhs; ++m) {
+                bi[m] -= col[k] * bk[m];
+            }
+        }
+        for (long m = 0; m < nrhs; ++m) {
+            bi[m] /= col[i];
+        }
+    }
+
+    // backward substitution, U.x = y
+    for (long i = n - 1; i >= 0; --i) {
+        const double* col = &ap[i*(i + 1)/2];
+        double* bi = &b[i*nrhs];
+        for (long m = 0; m < nrhs; ++m) {
+            bi[m] /= col[i];
+        }
+        for (long k = 0; k < i; ++k) {
+            double* bk = &b[k*nrhs];
+            for (long m = 0; m < nrhs; ++m) {
+                bk[m] -= col[k] * bi[m];
+            }
+        }
+    }
+}
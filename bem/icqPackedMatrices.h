@@ -0,0 +1,22 @@
+/**
+ * Linear algebra on symmetric matrices in packed storage
+ */
+
+#ifndef ICQ_PACKED_MATRICES
+#define ICQ_PACKED_MATRICES
+
+extern "C"
+void packedSymmetricMatVec(long n, const double* ap, const double* x, double* y,
+                           int numThreads);
+
+extern "C"
+void packedUpperMatVec(long n, const double* ap, const double* x, double* y,
+                       int transpose, int numThreads);
+
+extern "C"
+long packedCholeskyFactor(long n, double* ap, int numThreads);
+
+extern "C"
+void packedCholeskySolve(long n, const double* ap, double* b, long nrhs);
+
+#endif // ICQ_PACKED_MATRICES
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+Green function matrix stored as the upper triangle of the symmetric
+Galerkin matrix in packed format, plus the triangle areas
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.util.icqSharedLibraryUtils import getSharedLibraryName
+from ctypes import cdll, POINTER, c_double, c_long, c_int
+
+
+class PackedSymmetricMatrix:
+
+    def __init__(self, sPacked, areas, num_threads=0):
+        """
+        Constructor
+        @param sPacked upper triangle of the symmetric matrix S = A.G in
+                       column major packed storage, element (i, j), i <= j,
+                       is at i + j*(j + 1)/2
+        @param areas triangle areas (the diagonal of A)
+        @param num_threads number of OpenMP threads (0 to use the OpenMP default)
+        @note S is negative definite, -S is factored in place by the
+              first call to solve
+        """
+        n = len(areas)
+        if len(sPacked) != n*(n + 1)//2:
+            msg = 'ERROR: packed matrix has size {0} but {1} is expected!'.format(len(sPacked), n*(n + 1)//2)
+            raise RuntimeError(msg)
+
+        self.shape = (n, n)
+        self.sPacked = numpy.ascontiguousarray(sPacked, numpy.float64)
+        self.areas = numpy.array(areas, numpy.float64)
+        self.numThreads = num_threads
+
+        # the diagonal indices in packed storage
+        idx = numpy.arange(n)
+        self.diagIndices = idx + idx*(idx + 1)//2
+        self.diag = self.sPacked[self.diagIndices] / self.areas
+
+        # set to True once sPacked holds the Cholesky factor U of -S
+        self.factored = False
+
+        libName = getSharedLibraryName('icqLaplaceMatricesCpp')
+        self.lib = cdll.LoadLibrary(libName)
+        self.lib.packedCholeskyFactor.restype = c_long
+
+    def __symmetricDot(self, vec):
+        """
+        Apply the symmetric matrix S to a vector
+        @param vec vector
+        @return S.vec
+        """
+        x = numpy.ascontiguousarray(vec, numpy.float64)
+        n = self.shape[0]
+        res = numpy.empty((n,), numpy.float64)
+        if not self.factored:
+            self.lib.packedSymmetricMatVec(c_long(n),
+                                           self.sPacked.ctypes.data_as(POINTER(c_double)),
+                                           x.ctypes.data_as(POINTER(c_double)),
+                                           res.ctypes.data_as(POINTER(c_double)),
+                                           c_int(self.numThreads))
+            return res
+        # S = - U^T.U
+        tmp = numpy.empty((n,), numpy.float64)
+        self.lib.packedUpperMatVec(c_long(n),
+                                   self.sPacked.ctypes.data_as(POINTER(c_double)),
+                                   x.ctypes.data_as(POINTER(c_double)),
+                                   tmp.ctypes.data_as(POINTER(c_double)),
+                                   c_int(0), c_int(self.numThreads))
+        self.lib.packedUpperMatVec(c_long(n),
+                                   self.sPacked.ctypes.data_as(POINTER(c_double)),
+                                   tmp.ctypes.data_as(POINTER(c_double)),
+                                   res.ctypes.data_as(POINTER(c_double)),
+                                   c_int(1), c_int(self.numThreads))
+        return -res
+
+    def factor(self):
+        """
+        Compute the Cholesky factorization -S = U^T.U in place
+        """
+        if self.factored:
+            return
+        self.sPacked *= -1
+        n = self.shape[0]
+        info = self.lib.packedCholeskyFactor(c_long(n),
+                                             self.sPacked.ctypes.data_as(POINTER(c_double)),
+                                             c_int(self.numThreads))
+        if info != 0:
+            msg = 'ERROR: Cholesky factorization failed at row {0}, the matrix is not definite!'.format(info)
+            raise RuntimeError(msg)
+        self.factored = True
+
+    def dot(self, vec):
+        """
+        Apply the Green function matrix G = A^-1.S to a vector
+        @param vec vector
+        @return result vector
+        """
+        return self.__symmetricDot(vec) / self.areas
+
+    def solve(self, b):
+        """
+        Solve G.x = b
+        @param b right hand side vector or array of shape (n, nrhs)
+        @return solution, same shape as b
+        """
+        self.factor()
+        b = numpy.asarray(b, numpy.float64)
+        nrhs = 1
+        if b.ndim == 2:
+            nrhs = b.shape[1]
+        # -S.x = -A.b
+        x = numpy.ascontiguousarray((-self.areas * b.T).T)
+        self.lib.packedCholeskySolve(c_long(self.shape[0]),
+                                     self.sPacked.ctypes.data_as(POINTER(c_double)),
+                                     x.ctypes.data_as(POINTER(c_double)),
+                                     c_long(nrhs))
+        return x
+
+    def diagonal(self):
+        """
+        Get the diagonal elements of G
+        @return array
+        """
+        return self.diag.copy()
+
+    def getMemoryFootprint(self):
+        """
+        Get the number of bytes used to store the matrix
+        @return number of bytes
+        """
+        return self.sPacked.nbytes + self.areas.nbytes
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(4321)
+    n = 300
+    areas = numpy.random.rand(n) + 0.5
+    x = numpy.random.rand(n, 3)
+    d = x[:, numpy.newaxis, :] - x[numpy.newaxis, :, :]
+    r = numpy.sqrt((d**2).sum(axis=2))
+    # negative definite, symmetric
+    sMat = -numpy.outer(areas, areas) * numpy.exp(-r)
+    gMat = sMat / areas[:, numpy.newaxis]
+
+    # the lower triangle in row major order is the packed upper triangle
+    ju, iu = numpy.tril_indices(n)
+    sPacked = sMat[iu, ju]
+
+    pmat = PackedSymmetricMatrix(sPacked, areas)
+    vec = numpy.random.rand(n) - 0.5
+    error = numpy.linalg.norm(pmat.dot(vec) - gMat.dot(vec))
+    print('matvec error: {0}'.format(error))
+    assert(error < 1.e-10)
+
+    sol = pmat.solve(vec)
+    error = numpy.linalg.norm(sol - numpy.linalg.solve(gMat, vec))
+    print('solve error: {0}'.format(error))
+    assert(error < 1.e-8)
+
+    vecs = numpy.random.rand(n, 4) - 0.5
+    error = numpy.linalg.norm(pmat.solve(vecs) - numpy.linalg.solve(gMat, vecs))
+    print('multiple right hand side solve error: {0}'.format(error))
+    assert(error < 1.e-8)
+
+    # the factored matrix can still be applied
+    error = numpy.linalg.norm(pmat.dot(sol) - vec)
+    print('matvec error after factorization: {0}'.format(error))
+    assert(error < 1.e-8)
+
+if __name__ == '__main__':
+    testRandom()
@@ -3,42 +3,62 @@
 from __future__ import print_function
 import vtk
 import numpy
-from icqsol.bem.icqBaseLaplaceSolver import BaseLaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import BaseLaplaceSolver, DENSE, STREAM, OUT_OF_CORE
 
 
 class PoissonSolver(BaseLaplaceSolver):
 
-    def __init__(self, pdata, max_edge_length, order=5):
+    def __init__(self, pdata, max_edge_length, order=5, **kwargs):
         """
         Constructor
-        @param pdata instance of vtkPolyData
+        @param pdata instance of vtkPolyData or BemMesh
         @param max_edge_length maximum edge length, used to turn
                                polygons into triangles
+        @param order order of the Gauss quadrature scheme
+        @param kwargs assembly options (num_threads, storage, method, ...), see
+                      BaseLaplaceSolver. STREAM storage computes the 
+                      potential with O(n) memory, OUT_OF_CORE storage keeps
+                      the matrix on disk
         """
         #super(BaseLaplaceSolver, self).__init__(pdata, max_edge_length, order)
-        BaseLaplaceSolver.__init__(self, pdata, max_edge_length, order)
+        BaseLaplaceSolver.__init__(self, pdata, max_edge_length, order, **kwargs)
         self.responseName = 'v'
         self.sourceName = 'charge'
 
-    def computeResponseField(self):
+    def computeResponseField(self, src=None):
         """
         Compute the response field, in this case the potential due to a charge source
-        @return response
+        @param src source array of shape (n,) or (n, numComps). By default
+                   the source field is taken from the polydata
+        @return response, same shape as the source
         """
         
-        srcIndex = self.getSourceArrayIndex()
-        src = self.getSourceArray(srcIndex)
+        if src is None:
+            srcIndex = self.getSourceArrayIndex()
+            src = self.getSourceArray(srcIndex)
+        src = numpy.asarray(src, numpy.float64)
 
-        # Get the response matrix.
-        gMat = self.getGreenMatrix()
+        # Get the response operator, dense matrix or matrix-free.
+        gOp = self.getGreenOperator()
 
         # Compute the response.
-        rsp = numpy.dot(gMat, src)
+        if src.ndim == 1 or self.storage in (DENSE, STREAM, OUT_OF_CORE):
+            rsp = gOp.dot(src)
+        else:
+            # the matrix-free operators act on vectors
+            rsp = numpy.array([gOp.dot(src[:, j]) for j in range(src.shape[1])]).T
 
         self.addResponseField(rsp)
 
         return rsp
 
+    def getSurfaceDensity(self):
+        """
+        Get the charge density, the source field
+        @return array of shape (n,) or (n, numComps)
+        """
+        return self.getSourceArray(self.getSourceArrayIndex())
+
 ###############################################################################
 
 
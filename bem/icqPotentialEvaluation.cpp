@@ -0,0 +1,341 @@
+/**
+ * Potential and gradient of a surface charge density at arbitrary points
+ */
+
+#include <vector>
+#include <cmath>
+#include <icqPotentialEvaluation.h>
+#include <icqTriangleGeometry.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+// number of multipole moments of a box per density component: charge,
+// dipole (x, y, z) and quadrupole (xx, yy, zz, xy, xz, yz)
+#define ICQ_NUM_MOMENTS 10
+
+/**
+ * Octree box, the far field of its triangles is approximated by the
+ * charge, dipole and quadrupole moments about the box center, stored
+ * separately for each density component
+ */
+struct icqTreeNode {
+    double center[3];
+    // radius of the sphere enclosing the triangles of the box
+    double radius;
+    // range of the box in the permuted triangle array
+    long start;
+    long end;
+    // children are stored contiguously, numChildren == 0 for leaves
+    long firstChild;
+    int numChildren;
+};
+
+/**
+ * Build the octree, recursively splitting the boxes into octants
+ * @param geom triangle geometry
+ * @param perm triangle permutation, reordered in place
+ * @param nodes tree nodes, node index must be allocated
+ * @param index index of the node to build
+ * @param start first triangle of the node
+ * @param end one past the last triangle of the node
+ * @param leafSize maximum number of triangles in a leaf
+ * @param level depth of the node
+ */
+void buildTree(const icqTriangleGeometry& geom, std::vector<long>& perm,
+               std::vector<icqTreeNode>& nodes, long index,
+               long start, long end, int leafSize, int level) {
+
+    const std::vector<double>& c = geom.centroids;
+
+    // center of the bounding box of the centroids
+    double lo[] = {c[3*perm[start]], c[3*perm[start] + 1], c[3*perm[start] + 2]};
+    double hi[] = {lo[0], lo[1], lo[2]};
+    for (long k = start; k < end; ++k) {
+        for (size_t j = 0; j < 3; ++j) {
+            double x = c[3*perm[k] + j];
+            lo[j] = (x < lo[j]? x: lo[j]);
+            hi[j] = (x > hi[j]? x: hi[j]);
+        }
+    }
+    icqTreeNode node;
+    node.start = start;
+    node.end = end;
+    node.firstChild = -1;
+    node.numChildren = 0;
+    node.radius = 0;
+    for (size_t j = 0; j < 3; ++j) {
+        node.center[j] = 0.5 * (lo[j] + hi[j]);
+    }
+    // the vertices lie within the largest edge length of the centroid
+    for (long k = start; k < end; ++k) {
+        double d2 = 0;
+        for (size_t j = 0; j < 3; ++j) {
+            double x = c[3*perm[k] + j] - node.center[j];
+            d2 += x * x;
+        }
+        double r = sqrt(d2) + sqrt(geom.maxEdge2[perm[k]]);
+        node.radius = (r > node.radius? r: node.radius);
+    }
+    nodes[index] = node;
+
+    // stop when the box is small enough or the triangles can no longer
+    // be separated
+    if (end - start <= leafSize || level >= 30 ||
+        (hi[0] == lo[0] && hi[1] == lo[1] && hi[2] == lo[2])) {
+        return;
+    }
+
+    // sort the triangles by octant
+    std::vector<long> counts(8, 0);
+    std::vector<int> octants(end - start);
+    for (long k = start; k < end; ++k) {
+        int oct = 0;
+        for (size_t j = 0; j < 3; ++j) {
+            if (c[3*perm[k] + j] > node.center[j]) {
+                oct += (1 << j);
+            }
+        }
+        octants[k - start] = oct;
+        counts[oct]++;
+    }
+    std::vector<long> offsets(9, start);
+    for (int oct = 0; oct < 8; ++oct) {
+        offsets[oct + 1] = offsets[oct] + counts[oct];
+    }
+    std::vector<long> sorted(end - start);
+    std::vector<long> pos(offsets.begin(), offsets.end() - 1);
+    for (long k = start; k < end; ++k) {
+        sorted[pos[octants[k - start]]++ - start] = perm[k];
+    }
+    for (long k = start; k < end; ++k) {
+        perm[k] = sorted[k - start];
+    }
+
+    // allocate the children contiguously, then build them
+    int numChildren = 0;
+    for (int oct = 0; oct < 8; ++oct) {
+        numChildren += (counts[oct] > 0? 1: 0);
+    }
+    long firstChild = (long) nodes.size();
+    nodes.resize(nodes.size() + numChildren);
+    nodes[index].firstChild = firstChild;
+    nodes[index].numChildren = numChildren;
+    long child = firstChild;
+    for (int oct = 0; oct < 8; ++oct) {
+        if (counts[oct] > 0) {
+            buildTree(geom, perm, nodes, child, offsets[oct], offsets[oct + 1],
+                      leafSize, level + 1);
+            child++;
+        }
+    }
+}
+
+/**
+ * Compute the multipole moments of all boxes. The order 2 rule integrates
+ * the moments of a uniformly charged triangle exactly
+ * @param geom triangle geometry
+ * @param perm triangle permutation
+ * @param density charge density of each triangle, array of size
+ *                numTriangles*numComps
+ * @param numComps number of density components
+ * @param nodes tree nodes
+ * @param moments moments of the boxes (output), array of size
+ *                nodes.size()*numComps*ICQ_NUM_MOMENTS
+ * @param numThreads number of OpenMP threads
+ */
+void computeMoments(const icqTriangleGeometry& geom, const std::vector<long>& perm,
+                    const double* density, int numComps,
+                    const std::vector<icqTreeNode>& nodes,
+                    std::vector<double>& moments, int numThreads) {
+
+    const icqGaussRule* rule = icqQuadratureGetRule(2);
+
+    #pragma omp parallel for schedule(dynamic) num_threads(numThreads)
+    for (long b = 0; b < (long) nodes.size(); ++b) {
+        const icqTreeNode& node = nodes[b];
+        double* mom = &moments[b*numComps*ICQ_NUM_MOMENTS];
+        for (int j = 0; j < numComps*ICQ_NUM_MOMENTS; ++j) {
+            mom[j] = 0;
+        }
+        for (long k = node.start; k < node.end; ++k) {
+            long i = perm[k];
+            const double* pa = &geom.pa[3*i];
+            const double* db = &geom.db[3*i];
+            const double* dc = &geom.dc[3*i];
+            double area = geom.getArea(i);
+            for (int m = 0; m < rule->numPoints; ++m) {
+                double s[3];
+                for (size_t j = 0; j < 3; ++j) {
+                    s[j] = pa[j] + rule->xsi[m]*db[j] + rule->eta[m]*dc[j] - node.center[j];
+                }
+                const double terms[] = {1., s[0], s[1], s[2],
+                                        s[0]*s[0], s[1]*s[1], s[2]*s[2],
+                                        s[0]*s[1], s[0]*s[2], s[1]*s[2]};
+                for (int n = 0; n < numComps; ++n) {
+                    double qm = density[numComps*i + n] * area * rule->wgh[m];
+                    for (int j = 0; j < ICQ_NUM_MOMENTS; ++j) {
+                        mom[n*ICQ_NUM_MOMENTS + j] += qm * terms[j];
+                    }
+                }
+            }
+        }
+    }
+}
+
+/**
+ * Add the far field of a box to the potential and gradient at a point
+ * @param node box
+ * @param mom moments of the box for one density component
+ * @param p point
+ * @param pot potential (updated)
+ * @param grad gradient (updated)
+ */
+void addFarField(const icqTreeNode& node, const double* mom, const double* p,
+                 double& pot, double* grad) {
+
+    const double d[] = {p[0] - node.center[0], p[1] - node.center[1], p[2] - node.center[2]};
+    const double r2 = d[0]*d[0] + d[1]*d[1] + d[2]*d[2];
+    const double r = sqrt(r2);
+    const double r3 = r2 * r;
+    const double r5 = r3 * r2;
+    const double r7 = r5 * r2;
+
+    const double charge = mom[0];
+    const double* dip = &mom[1];
+    const double* qd = &mom[4];
+    // Q.d
+    const double qdv[] = {qd[0]*d[0] + qd[3]*d[1] + qd[4]*d[2],
+                          qd[3]*d[0] + qd[1]*d[1] + qd[5]*d[2],
+                          qd[4]*d[0] + qd[5]*d[1] + qd[2]*d[2]};
+    const double dQd = d[0]*qdv[0] + d[1]*qdv[1] + d[2]*qdv[2];
+    const double trace = qd[0] + qd[1] + qd[2];
+    const double dDip = d[0]*dip[0] + d[1]*dip[1] + d[2]*dip[2];
+    const double numer = 3.*dQd - r2*trace;
+
+    // 1/|d - s| ~ 1/r + d.s/r^3 + (3 (d.s)^2 - r^2 s^2)/(2 r^5)
+    const double c = -1.0 / (4. * M_PI);
+    pot += c * (charge/r + dDip/r3 + numer/(2.*r5));
+    for (size_t j = 0; j < 3; ++j) {
+        grad[j] += c * (-charge*d[j]/r3 +
+                        dip[j]/r3 - 3.*dDip*d[j]/r5 +
+                        (3.*qdv[j] - trace*d[j])/r5 - 2.5*numer*d[j]/r7);
+    }
+}
+
+/**
+ * Compute the potential and its gradient at arbitrary points due to a
+ * piecewise constant charge density on the triangles. The kernel is
+ * -1/(4 pi r), as in the influence matrix. All the density components
+ * are evaluated against the same geometry and tree
+ * @param points point coordinates, array of size 3*numPoints
+ * @param cells triangle connectivity, array of size 3*numTriangles
+ * @param numTriangles number of triangles
+ * @param density charge density of each triangle, array of size
+ *                numTriangles*numComps with the components varying fastest
+ * @param numComps number of density components
+ * @param numTargets number of evaluation points
+ * @param targets evaluation point coordinates, array of size 3*numTargets,
+ *                the points should not lie on the surface
+ * @param potential potential at the targets (output), array of size
+ *                  numTargets*numComps
+ * @param gradient gradient of the potential at the targets (output),
+ *                 array of size numTargets*numComps*3
+ * @param theta opening parameter, a box of radius R at distance d from
+ *              the target is approximated by its multipole expansion
+ *              if R < theta*d (<= 0 to integrate all the triangles)
+ * @param leafSize maximum number of triangles in a leaf box
+ * @param numThreads number of OpenMP threads (<= 0 to use the OpenMP default)
+ * @param quadTol tolerance used to select the quadrature order of each
+ *                triangle (<= 0 to always use the maximum order)
+ */
+extern "C"
+void computePotentialAtPoints(const double* points, const int* cells,
+                              long numTriangles, const double* density,
+                              int numComps,
+                              long numTargets, const double* targets,
+                              double* potential, double* gradient,
+                              double theta, int leafSize,
+                              int numThreads, double quadTol) {
+
+    int minOrder = (quadTol > 0? 1: ICQ_QUADRATURE_MAX_ORDER);
+    icqTriangleGeometry geom(points, cells, numTriangles, NULL, minOrder);
+
+#ifdef _OPENMP
+    if (numThreads <= 0) {
+        numThreads = omp_get_max_threads();
+    }
+#endif
+
+    // a single leaf without the tree code
+    std::vector<long> perm(numTriangles);
+    for (long i = 0; i < numTriangles; ++i) {
+        perm[i] = i;
+    }
+    std::vector<icqTreeNode> nodes(1);
+    std::vector<double> moments;
+    if (numTriangles > 0) {
+        buildTree(geom, perm, nodes, 0, 0, numTriangles,
+                  (theta > 0? leafSize: numTriangles), 0);
+        if (theta > 0) {
+            moments.resize(nodes.size()*numComps*ICQ_NUM_MOMENTS);
+            computeMoments(geom, perm, density, numComps, nodes, moments,
+                           numThreads);
+        }
+    }
+
+    #pragma omp parallel for schedule(dynamic, 16) num_threads(numThreads)
+    for (long t = 0; t < numTargets; ++t) {
+
+        const double* p = &targets[3*t];
+        double* pot = &potential[numComps*t];
+        double* grad = &gradient[3*numComps*t];
+        double g[3];
+        for (int n = 0; n < numComps; ++n) {
+            pot[n] = 0;
+            grad[3*n + 0] = 0;
+            grad[3*n + 1] = 0;
+            grad[3*n + 2] = 0;
+        }
+
+        std::vector<long> stack;
+        if (numTriangles > 0) {
+            stack.push_back(0);
+        }
+        while (!stack.empty()) {
+            long b = stack.back();
+            const icqTreeNode& node = nodes[b];
+            stack.pop_back();
+
+            double d2 = 0;
+            for (size_t j = 0; j < 3; ++j) {
+                d2 += (p[j] - node.center[j]) * (p[j] - node.center[j]);
+            }
+            if (node.radius*node.radius < theta*theta*d2) {
+                for (int n = 0; n < numComps; ++n) {
+                    addFarField(node, &moments[(b*numComps + n)*ICQ_NUM_MOMENTS], p,
+                                pot[n], &grad[3*n]);
+                }
+            }
+            else if (node.numChildren == 0) {
+                for (long k = node.start; k < node.end; ++k) {
+                    long j = perm[k];
+                    int order = geom.getPointQuadratureOrder(p, j, quadTol);
+                    double v = geom.evaluatePoint(p, j, order, g);
+                    for (int n = 0; n < numComps; ++n) {
+                        double dens = density[numComps*j + n];
+                        pot[n] += dens * v;
+                        grad[3*n + 0] += dens * g[0];
+                        grad[3*n + 1] += dens * g[1];
+                        grad[3*n + 2] += dens * g[2];
+                    }
+                }
+            }
+            else {
+                for (int k = 0; k < node.numChildren; ++k) {
+                    stack.push_back(node.firstChild + k);
+                }
+            }
+        }
+    }
+}
@@ -0,0 +1,13 @@
+#ifndef ICQ_POTENTIAL_EVALUATION
+#define ICQ_POTENTIAL_EVALUATION
+
+extern "C"
+void computePotentialAtPoints(const double* points, const int* cells,
+                              long numTriangles, const double* density,
+                              int numComps,
+                              long numTargets, const double* targets,
+                              double* potential, double* gradient,
+                              double theta, int leafSize,
+                              int numThreads, double quadTol);
+
+#endif // ICQ_POTENTIAL_EVALUATION
@@ -6,8 +6,9 @@ http://arxiv.org/pdf/1201.4938.pdf
 
 from __future__ import print_function
 from math import cos, sin
+import numpy
 from icqsol.bem.icqReferenceTriangle import ReferenceTriangle
-from icqsol.bem.icqQuadrature1D import lineQuadrature
+from icqsol.bem.icqQuadrature1D import lineQuadrature, gaussPtsAndWeights
 
 
 class PotentialIntegrals:
@@ -39,6 +40,33 @@ class PotentialIntegrals:
             return self.bigR(t)
         return lineQuadrature(self.order, 0.0, self.bigTheta, integrand)
 
+
+def getIntegralsOneOverR(xa, xb, xc, order=5):
+    """
+    Compute the integrals of 1/R for many triangles at once, the observer
+    being at the first vertex. This is the vectorized counterpart of
+    PotentialIntegrals(xa, xb, xc, order).getIntegralOneOverR()
+    @param xa first triangle vertices, array of shape (..., 3)
+    @param xb second triangle vertices, array of shape (..., 3)
+    @param xc third triangle vertices, array of shape (..., 3)
+    @param order Gauss integration order
+    @return array of integrals, shape (...)
+    """
+    xbdiff = numpy.asarray(xb) - numpy.asarray(xa)
+    xcdiff = numpy.asarray(xc) - numpy.asarray(xa)
+    crossNorm = numpy.sqrt((numpy.cross(xbdiff, xcdiff)**2).sum(axis=-1))
+    r1 = numpy.sqrt((xbdiff**2).sum(axis=-1))
+    r2 = numpy.sqrt((xcdiff**2).sum(axis=-1))
+    bigTheta = numpy.arctan2(crossNorm, (xbdiff*xcdiff).sum(axis=-1))
+    a = (r2*numpy.cos(bigTheta) - r1) / r2/numpy.sin(bigTheta)
+
+    # line quadrature along theta, see lineQuadrature
+    res = numpy.zeros(bigTheta.shape, numpy.float64)
+    for u, weight in gaussPtsAndWeights[order]:
+        t = u*bigTheta
+        res += weight * r1/(numpy.cos(t) - a*numpy.sin(t))
+    return bigTheta * res
+
 ##########################################################################
 
 
@@ -6,6 +6,115 @@
 #include <icqLaplaceFunctor.h>
 #include <iostream>
 
+// Gauss points and weights, the rule of order k integrates polynomials
+// of degree k exactly
+
+// order 1, 1 points
+static const double icqXsi1[] = {
+    0.33333333333333};
+static const double icqEta1[] = {
+    0.33333333333333};
+static const double icqWgh1[] = {
+    1.00000000000000};
+
+// order 2, 3 points
+static const double icqXsi2[] = {
+    0.16666666666667, 0.16666666666667, 0.66666666666667};
+static const double icqEta2[] = {
+    0.16666666666667, 0.66666666666667, 0.16666666666667};
+static const double icqWgh2[] = {
+    0.33333333333333, 0.33333333333333, 0.33333333333333};
+
+// order 3, 4 points
+static const double icqXsi3[] = {
+    0.33333333333333, 0.20000000000000, 0.20000000000000, 0.60000000000000};
+static const double icqEta3[] = {
+    0.33333333333333, 0.20000000000000, 0.60000000000000, 0.20000000000000};
+static const double icqWgh3[] = {
+    -0.56250000000000, 0.52083333333333, 0.52083333333333, 0.52083333333333};
+
+// order 4, 6 points
+static const double icqXsi4[] = {
+    0.44594849091597, 0.44594849091597, 0.10810301816807, 0.09157621350977,
+    0.09157621350977, 0.81684757298046};
+static const double icqEta4[] = {
+    0.44594849091597, 0.10810301816807, 0.44594849091597, 0.09157621350977,
+    0.81684757298046, 0.09157621350977};
+static const double icqWgh4[] = {
+    0.22338158967801, 0.22338158967801, 0.22338158967801, 0.10995174365532,
+    0.10995174365532, 0.10995174365532};
+
+// order 5, 7 points
+static const double icqXsi5[] = {
+    0.33333333333333, 0.47014206410511, 0.47014206410511, 0.05971587178977,
+    0.10128650732346, 0.10128650732346, 0.79742698535309};
+static const double icqEta5[] = {
+    0.33333333333333, 0.47014206410511, 0.05971587178977, 0.47014206410511,
+    0.10128650732346, 0.79742698535309, 0.10128650732346};
+static const double icqWgh5[] = {
+    0.22500000000000, 0.13239415278851, 0.13239415278851, 0.13239415278851,
+    0.12593918054483, 0.12593918054483, 0.12593918054483};
+
+// order 6, 12 points
+static const double icqXsi6[] = {
+    0.24928674517091, 0.24928674517091, 0.50142650965818, 0.06308901449150,
+    0.06308901449150, 0.87382197101700, 0.31035245103378, 0.63650249912140,
+    0.05314504984482, 0.63650249912140, 0.31035245103378, 0.05314504984482};
+static const double icqEta6[] = {
+    0.24928674517091, 0.50142650965818, 0.24928674517091, 0.06308901449150,
+    0.87382197101700, 0.06308901449150, 0.63650249912140, 0.05314504984482,
+    0.31035245103378, 0.31035245103378, 0.05314504984482, 0.63650249912140};
+static const double icqWgh6[] = {
+    0.11678627572638, 0.11678627572638, 0.11678627572638, 0.05084490637021,
+    0.05084490637021, 0.05084490637021, 0.08285107561837, 0.08285107561837,
+    0.08285107561837, 0.08285107561837, 0.08285107561837, 0.08285107561837};
+
+// order 7, 13 points
+static const double icqXsi7[] = {
+    0.33333333333333, 0.26034596607904, 0.26034596607904, 0.47930806784192,
+    0.06513010290222, 0.06513010290222, 0.86973979419557, 0.31286549600487,
+    0.63844418856981, 0.04869031542532, 0.63844418856981, 0.31286549600487,
+    0.04869031542532};
+static const double icqEta7[] = {
+    0.33333333333333, 0.26034596607904, 0.47930806784192, 0.26034596607904,
+    0.06513010290222, 0.86973979419557, 0.06513010290222, 0.63844418856981,
+    0.04869031542532, 0.31286549600487, 0.31286549600487, 0.04869031542532,
+    0.63844418856981};
+static const double icqWgh7[] = {
+    -0.14957004446768, 0.17561525743321, 0.17561525743321, 0.17561525743321,
+    0.05334723560884, 0.05334723560884, 0.05334723560884, 0.07711376089026,
+    0.07711376089026, 0.07711376089026, 0.07711376089026, 0.07711376089026,
+    0.07711376089026};
+
+// order 8, 16 points
+static const double icqXsi8[] = {
+    0.33333333333333, 0.45929258829272, 0.45929258829272, 0.08141482341455,
+    0.17056930775176, 0.17056930775176, 0.65886138449648, 0.05054722831703,
+    0.05054722831703, 0.89890554336594, 0.26311282963464, 0.72849239295540,
+    0.00839477740996, 0.72849239295540, 0.26311282963464, 0.00839477740996};
+static const double icqEta8[] = {
+    0.33333333333333, 0.45929258829272, 0.08141482341455, 0.45929258829272,
+    0.17056930775176, 0.65886138449648, 0.17056930775176, 0.05054722831703,
+    0.89890554336594, 0.05054722831703, 0.72849239295540, 0.00839477740996,
+    0.26311282963464, 0.26311282963464, 0.00839477740996, 0.72849239295540};
+static const double icqWgh8[] = {
+    0.14431560767779, 0.09509163426728, 0.09509163426728, 0.09509163426728,
+    0.10321737053472, 0.10321737053472, 0.10321737053472, 0.03245849762320,
+    0.03245849762320, 0.03245849762320, 0.02723031417443, 0.02723031417443,
+    0.02723031417443, 0.02723031417443, 0.02723031417443, 0.02723031417443};
+
+static const icqGaussRule icqGaussRules[ICQ_QUADRATURE_MAX_ORDER + 1] = {
+    {0, NULL, NULL, NULL},
+    {1, icqXsi1, icqEta1, icqWgh1},
+    {3, icqXsi2, icqEta2, icqWgh2},
+    {4, icqXsi3, icqEta3, icqWgh3},
+    {6, icqXsi4, icqEta4, icqWgh4},
+    {7, icqXsi5, icqEta5, icqWgh5},
+    {12, icqXsi6, icqEta6, icqWgh6},
+    {13, icqXsi7, icqEta7, icqWgh7},
+    {16, icqXsi8, icqEta8, icqWgh8}
+};
+
 extern "C" 
 void icqQuadratureInit(icqQuadratureType **self) {
 
@@ -13,136 +122,7 @@ void icqQuadratureInit(icqQuadratureType **self) {
     *self = new icqQuadratureType();
 
     (*self)->func = new icqLaplaceFunctor();
-
-    // Fill in the gauss points and weights
-    int order;
-
-    {
-        order = 1;
-        std::vector<double> xsi(1), eta(1), wgh(1);
-        xsi[0] = 0.33333333333333; eta[0] = 0.33333333333333; wgh[0] = 1.00000000000000;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 2;
-        std::vector<double> xsi(3), eta(3), wgh(3);
-        xsi[0] = 0.16666666666667; eta[0] = 0.16666666666667; wgh[0] = 0.33333333333333;
-        xsi[1] = 0.16666666666667; eta[1] = 0.66666666666667; wgh[1] = 0.33333333333333;
-        xsi[2] = 0.66666666666667; eta[2] = 0.16666666666667; wgh[2] = 0.33333333333333;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 3;
-        std::vector<double> xsi(4), eta(4), wgh(4);
-        xsi[0] = 0.33333333333333; eta[0] = 0.33333333333333; wgh[0] = -0.56250000000000;
-        xsi[1] = 0.20000000000000; eta[1] = 0.20000000000000; wgh[1] = 0.52083333333333;
-        xsi[2] = 0.20000000000000; eta[2] = 0.60000000000000; wgh[2] = 0.52083333333333;
-        xsi[3] = 0.60000000000000; eta[3] = 0.20000000000000; wgh[3] = 0.52083333333333;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 4;
-        std::vector<double> xsi(6), eta(6), wgh(6);
-        xsi[0] = 0.44594849091597; eta[0] = 0.44594849091597; wgh[0] = 0.22338158967801;
-        xsi[1] = 0.44594849091597; eta[1] = 0.10810301816807; wgh[1] = 0.22338158967801;
-        xsi[2] = 0.10810301816807; eta[2] = 0.44594849091597; wgh[2] = 0.22338158967801;
-        xsi[3] = 0.09157621350977; eta[3] = 0.09157621350977; wgh[3] = 0.10995174365532;
-        xsi[4] = 0.09157621350977; eta[4] = 0.81684757298046; wgh[4] = 0.10995174365532;
-        xsi[5] = 0.81684757298046; eta[5] = 0.09157621350977; wgh[5] = 0.10995174365532;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 5;
-        std::vector<double> xsi(7), eta(7), wgh(7);
-        xsi[0] = 0.33333333333333; eta[0] = 0.33333333333333; wgh[0] = 0.22500000000000;
-        xsi[1] = 0.47014206410511; eta[1] = 0.47014206410511; wgh[1] = 0.13239415278851;
-        xsi[2] = 0.47014206410511; eta[2] = 0.05971587178977; wgh[2] = 0.13239415278851;
-        xsi[3] = 0.05971587178977; eta[3] = 0.47014206410511; wgh[3] = 0.13239415278851;
-        xsi[4] = 0.10128650732346; eta[4] = 0.10128650732346; wgh[4] = 0.12593918054483;
-        xsi[5] = 0.10128650732346; eta[5] = 0.79742698535309; wgh[5] = 0.12593918054483;
-        xsi[6] = 0.79742698535309; eta[6] = 0.10128650732346; wgh[6] = 0.12593918054483;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 6;
-        std::vector<double> xsi(12), eta(12), wgh(12);
-        xsi[0] = 0.24928674517091; eta[0] = 0.24928674517091; wgh[0] = 0.11678627572638;
-        xsi[1] = 0.24928674517091; eta[1] = 0.50142650965818; wgh[1] = 0.11678627572638;
-        xsi[2] = 0.50142650965818; eta[2] = 0.24928674517091; wgh[2] = 0.11678627572638;
-        xsi[3] = 0.06308901449150; eta[3] = 0.06308901449150; wgh[3] = 0.05084490637021;
-        xsi[4] = 0.06308901449150; eta[4] = 0.87382197101700; wgh[4] = 0.05084490637021;
-        xsi[5] = 0.87382197101700; eta[5] = 0.06308901449150; wgh[5] = 0.05084490637021;
-        xsi[6] = 0.31035245103378; eta[6] = 0.63650249912140; wgh[6] = 0.08285107561837;
-        xsi[7] = 0.63650249912140; eta[7] = 0.05314504984482; wgh[7] = 0.08285107561837;
-        xsi[8] = 0.05314504984482; eta[8] = 0.31035245103378; wgh[8] = 0.08285107561837;
-        xsi[9] = 0.63650249912140; eta[9] = 0.31035245103378; wgh[9] = 0.08285107561837;
-        xsi[10] = 0.31035245103378; eta[10] = 0.05314504984482; wgh[10] = 0.08285107561837;
-        xsi[11] = 0.05314504984482; eta[11] = 0.63650249912140; wgh[11] = 0.08285107561837;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 7;
-        std::vector<double> xsi(13), eta(13), wgh(13);
-        xsi[0] = 0.33333333333333; eta[0] = 0.33333333333333; wgh[0] = -0.14957004446768;
-        xsi[1] = 0.26034596607904; eta[1] = 0.26034596607904; wgh[1] = 0.17561525743321;
-        xsi[2] = 0.26034596607904; eta[2] = 0.47930806784192; wgh[2] = 0.17561525743321;
-        xsi[3] = 0.47930806784192; eta[3] = 0.26034596607904; wgh[3] = 0.17561525743321;
-        xsi[4] = 0.06513010290222; eta[4] = 0.06513010290222; wgh[4] = 0.05334723560884;
-        xsi[5] = 0.06513010290222; eta[5] = 0.86973979419557; wgh[5] = 0.05334723560884;
-        xsi[6] = 0.86973979419557; eta[6] = 0.06513010290222; wgh[6] = 0.05334723560884;
-        xsi[7] = 0.31286549600487; eta[7] = 0.63844418856981; wgh[7] = 0.07711376089026;
-        xsi[8] = 0.63844418856981; eta[8] = 0.04869031542532; wgh[8] = 0.07711376089026;
-        xsi[9] = 0.04869031542532; eta[9] = 0.31286549600487; wgh[9] = 0.07711376089026;
-        xsi[10] = 0.63844418856981; eta[10] = 0.31286549600487; wgh[10] = 0.07711376089026;
-        xsi[11] = 0.31286549600487; eta[11] = 0.04869031542532; wgh[11] = 0.07711376089026;
-        xsi[12] = 0.04869031542532; eta[12] = 0.63844418856981; wgh[12] = 0.07711376089026;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
-    {
-        order = 8;
-        std::vector<double> xsi(16), eta(16), wgh(16);
-        xsi[0] = 0.33333333333333; eta[0] = 0.33333333333333; wgh[0] = 0.14431560767779;
-        xsi[1] = 0.45929258829272; eta[1] = 0.45929258829272; wgh[1] = 0.09509163426728;
-        xsi[2] = 0.45929258829272; eta[2] = 0.08141482341455; wgh[2] = 0.09509163426728;
-        xsi[3] = 0.08141482341455; eta[3] = 0.45929258829272; wgh[3] = 0.09509163426728;
-        xsi[4] = 0.17056930775176; eta[4] = 0.17056930775176; wgh[4] = 0.10321737053472;
-        xsi[5] = 0.17056930775176; eta[5] = 0.65886138449648; wgh[5] = 0.10321737053472;
-        xsi[6] = 0.65886138449648; eta[6] = 0.17056930775176; wgh[6] = 0.10321737053472;
-        xsi[7] = 0.05054722831703; eta[7] = 0.05054722831703; wgh[7] = 0.03245849762320;
-        xsi[8] = 0.05054722831703; eta[8] = 0.89890554336594; wgh[8] = 0.03245849762320;
-        xsi[9] = 0.89890554336594; eta[9] = 0.05054722831703; wgh[9] = 0.03245849762320;
-        xsi[10] = 0.26311282963464; eta[10] = 0.72849239295540; wgh[10] = 0.02723031417443;
-        xsi[11] = 0.72849239295540; eta[11] = 0.00839477740996; wgh[11] = 0.02723031417443;
-        xsi[12] = 0.00839477740996; eta[12] = 0.26311282963464; wgh[12] = 0.02723031417443;
-        xsi[13] = 0.72849239295540; eta[13] = 0.26311282963464; wgh[13] = 0.02723031417443;
-        xsi[14] = 0.26311282963464; eta[14] = 0.00839477740996; wgh[14] = 0.02723031417443;
-        xsi[15] = 0.00839477740996; eta[15] = 0.72849239295540; wgh[15] = 0.02723031417443;
-        std::vector<std::vector<double> > gw(3); 
-        gw[0] = xsi; gw[1] = eta; gw[2] = wgh;
-        (*self)->gaussPtsAndWeights.insert(std::pair<int, std::vector< std::vector<double> > >(order, gw));
-    }
-
+    (*self)->laplaceKernel = true;
 }
 
 extern "C"
@@ -153,11 +133,21 @@ void icqQuadratureSetObserver(icqQuadratureType **self, const double* pObs) {
 extern "C"
 void icqQuadratureSetFunctor(icqQuadratureType **self, icqFunctor* func) {
     (*self)->func = func;
+    // custom kernel, evaluated through the functor
+    (*self)->laplaceKernel = false;
 }
 
 extern "C"
 int icqQuadratureGetMaxOrder(icqQuadratureType **self) {
-    return (int) (*self)->gaussPtsAndWeights.size();
+    return ICQ_QUADRATURE_MAX_ORDER;
+}
+
+extern "C"
+const icqGaussRule* icqQuadratureGetRule(int order) {
+    if (order < 1 || order > ICQ_QUADRATURE_MAX_ORDER) {
+        return NULL;
+    }
+    return &icqGaussRules[order];
 }
 
 double icqQuadratureArea(const double* db, const double* dc) {
@@ -186,19 +176,13 @@ double icqQuadratureEvaluate(icqQuadratureType **self, int order,
 
     double p[] = {0., 0., 0.};
 
-    std::map<int, std::vector< std::vector<double> > >::const_iterator 
-        it = (*self)->gaussPtsAndWeights.find(order);
-
-    if (it != (*self)->gaussPtsAndWeights.end()) {
-
-        const std::vector<double>& xsi = it->second[0];
-        const std::vector<double>& eta = it->second[1];
-        const std::vector<double>& wgh = it->second[2];
-        for (size_t i = 0; i < xsi.size(); ++i) {
+    const icqGaussRule* rule = icqQuadratureGetRule(order);
+    if (rule) {
+        for (int i = 0; i < rule->numPoints; ++i) {
             for (size_t j = 0; j < 3; ++j) {
-                p[j] = pa[j] + xsi[i]*pb2[j] + eta[i]*pc2[j];
+                p[j] = pa[j] + rule->xsi[i]*pb2[j] + rule->eta[i]*pc2[j];
             }
-            res += (*self)->func->operator()(p) * wgh[i];
+            res += (*self)->func->operator()(p) * rule->wgh[i];
         }
     }
 
@@ -210,39 +194,93 @@ double icqQuadratureEvaluateDouble(icqQuadratureType **self, int order,
                              const double* pa0, const double* pb0, const double* pc0,
                              const double* pa1, const double* pb1, const double* pc1) {
     double res = 0;
+    const icqGaussRule* rule = icqQuadratureGetRule(order);
+    if (!rule) {
+        return res;
+    }
+
     const double db0[] = {pb0[0] - pa0[0], pb0[1] - pa0[1], pb0[2] - pa0[2]};
     const double dc0[] = {pc0[0] - pa0[0], pc0[1] - pa0[1], pc0[2] - pa0[2]};
 
     const double db1[] = {pb1[0] - pa1[0], pb1[1] - pa1[1], pb1[2] - pa1[2]};
     const double dc1[] = {pc1[0] - pa1[0], pc1[1] - pa1[1], pc1[2] - pa1[2]};
 
-    //const double area0 = icqQuadratureArea(db0, dc0);
     const double area1 = icqQuadratureArea(db1, dc1);
 
-    double p0[] = {0., 0., 0.};
-    double p1[] = {0., 0., 0.};
-
-    std::map<int, std::vector< std::vector<double> > >::const_iterator
-        it = (*self)->gaussPtsAndWeights.find(order);
-    if (it != (*self)->gaussPtsAndWeights.end()) {
-        const std::vector<double>& xsi = it->second[0];
-        const std::vector<double>& eta = it->second[1];
-        const std::vector<double>& wgh = it->second[2];
-        size_t n = xsi.size();
-        for (size_t i0 = 0; i0 < n; ++i0) {
+    // Gauss points of both triangles in physical space
+    const int n = rule->numPoints;
+    double p0[3][ICQ_QUADRATURE_MAX_POINTS];
+    double p1[3][ICQ_QUADRATURE_MAX_POINTS];
+    for (int i = 0; i < n; ++i) {
+        for (size_t j = 0; j < 3; ++j) {
+            p0[j][i] = pa0[j] + rule->xsi[i]*db0[j] + rule->eta[i]*dc0[j];
+            p1[j][i] = pa1[j] + rule->xsi[i]*db1[j] + rule->eta[i]*dc1[j];
+        }
+    }
+
+    if ((*self)->laplaceKernel) {
+        res = icqLaplaceWeightedSum(n, p0[0], p0[1], p0[2], rule->wgh,
+                                    n, p1[0], p1[1], p1[2], rule->wgh);
+    }
+    else {
+        // custom kernel
+        double pObs[3];
+        double pSrc[3];
+        for (int i0 = 0; i0 < n; ++i0) {
+            pObs[0] = p0[0][i0]; pObs[1] = p0[1][i0]; pObs[2] = p0[2][i0];
+            icqQuadratureSetObserver(self, pObs);
+            for (int i1 = 0; i1 < n; ++i1) {
+                pSrc[0] = p1[0][i1]; pSrc[1] = p1[1][i1]; pSrc[2] = p1[2][i1];
+                res += rule->wgh[i0] * (*self)->func->operator()(pSrc) * rule->wgh[i1];
+            }
+        }
+    }
+    return 0.5 * area1 * res;
+}
+
+/**
+ * Evaluate the kernel for a block of observer points against a block of
+ * source points
+ * @param self quadrature object
+ * @param numObs number of observer points
+ * @param pObs observer points, array of size 3*numObs
+ * @param numSrc number of source points
+ * @param pSrc source points, array of size 3*numSrc
+ * @param vals kernel values (output), row major array of shape (numObs, numSrc)
+ * @note this resets the observer of the functor
+ */
+extern "C"
+void icqQuadratureEvaluateKernelBlock(icqQuadratureType **self,
+                                      long numObs, const double* pObs,
+                                      long numSrc, const double* pSrc,
+                                      double* vals) {
+
+    if ((*self)->laplaceKernel) {
+        std::vector<double> xyzObs(3*numObs);
+        std::vector<double> xyzSrc(3*numSrc);
+        for (long i = 0; i < numObs; ++i) {
             for (size_t j = 0; j < 3; ++j) {
-                p0[j] = pa0[j] + xsi[i0]*db0[j] + eta[i0]*dc0[j];
+                xyzObs[j*numObs + i] = pObs[3*i + j];
             }
-            icqQuadratureSetObserver(self, p0);
-            for (size_t i1 = 0; i1 < n; ++i1) {
-                for (size_t j = 0; j < 3; ++j) {
-                    p1[j] = pa1[j] + xsi[i1]*db1[j] + eta[i1]*dc1[j];
-                }
-                res += wgh[i0] * (*self)->func->operator()(p1) * wgh[i1];
+        }
+        for (long i = 0; i < numSrc; ++i) {
+            for (size_t j = 0; j < 3; ++j) {
+                xyzSrc[j*numSrc + i] = pSrc[3*i + j];
             }
         }
+        icqLaplaceKernelBlock(numObs, &xyzObs[0], &xyzObs[numObs], &xyzObs[2*numObs],
+                              numSrc, &xyzSrc[0], &xyzSrc[numSrc], &xyzSrc[2*numSrc],
+                              vals);
+        return;
+    }
+
+    // custom kernel
+    for (long i = 0; i < numObs; ++i) {
+        icqQuadratureSetObserver(self, &pObs[3*i]);
+        for (long j = 0; j < numSrc; ++j) {
+            vals[i*numSrc + j] = (*self)->func->operator()(&pSrc[3*j]);
+        }
     }
-    return 0.5 * area1 * res;
 }
 
 extern "C"
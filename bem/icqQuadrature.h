@@ -7,13 +7,26 @@
 
 #include <icqFunctor.h>
  
-#include <map>
 #include <vector>
 #include <cmath>
 
+// highest order and largest number of points of the Gauss rules
+#define ICQ_QUADRATURE_MAX_ORDER 8
+#define ICQ_QUADRATURE_MAX_POINTS 16
+
+// Gauss points (xsi, eta) and weights of a rule, stored in static tables
+struct icqGaussRule {
+    int numPoints;
+    const double* xsi;
+    const double* eta;
+    const double* wgh;
+};
+
 struct icqQuadratureType {
     icqFunctor* func;
-    std::map<int, std::vector<std::vector<double> > > gaussPtsAndWeights;
+    // true while func is the built-in Laplace kernel, which is then
+    // evaluated inline rather than through virtual calls
+    bool laplaceKernel;
 };
 
 extern "C" 
@@ -28,6 +41,9 @@ void icqQuadratureSetFunctor(icqQuadratureType **self, icqFunctor* func);
 extern "C"
 int icqQuadratureGetMaxOrder(icqQuadratureType **self);
 
+extern "C"
+const icqGaussRule* icqQuadratureGetRule(int order);
+
 extern "C"
 double icqQuadratureEvaluate(icqQuadratureType **self, int order,
                              const double* pa, const double* pb, const double* pc);
@@ -36,6 +52,13 @@ extern "C"
 double icqQuadratureEvaluateDouble(icqQuadratureType **self, int order,
                                    const double* pa0, const double* pb0, const double* pc0,
                                    const double* pa1, const double* pb1, const double* pc1);
+
+extern "C"
+void icqQuadratureEvaluateKernelBlock(icqQuadratureType **self,
+                                      long numObs, const double* pObs,
+                                      long numSrc, const double* pSrc,
+                                      double* vals);
+
 extern "C"
 void icqQuadratureDel(icqQuadratureType **self);
 
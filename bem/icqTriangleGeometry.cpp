@@ -0,0 +1,664 @@
+/**
+ * Triangle geometry precomputed once per assembly
+ */
+
+#include <icqTriangleGeometry.h>
+#include <icqLaplaceFunctor.h>
+#include <cmath>
+
+// largest number of points of the rules over the near field triangles
+#define ICQ_NEAR_FIELD_MAX_POINTS \
+    (ICQ_NEAR_FIELD_NUM_POINTS*ICQ_NEAR_FIELD_NUM_POINTS > ICQ_QUADRATURE_MAX_POINTS? \
+     ICQ_NEAR_FIELD_NUM_POINTS*ICQ_NEAR_FIELD_NUM_POINTS: ICQ_QUADRATURE_MAX_POINTS)
+
+/**
+ * Gauss-Legendre points and weights over [0, 1], Newton iterations on the
+ * roots of the Legendre polynomial
+ * @param n number of points
+ * @param t points (output)
+ * @param w weights (output)
+ */
+static void getGaussLegendre(int n, double* t, double* w) {
+
+    for (int i = 0; i < n; ++i) {
+        double x = cos(M_PI * (i + 0.75) / (n + 0.5));
+        double dp = 0;
+        for (int iter = 0; iter < 100; ++iter) {
+            // P_n(x) and its derivative by the three term recurrence
+            double p0 = 1;
+            double p1 = x;
+            for (int k = 2; k <= n; ++k) {
+                double p2 = ((2*k - 1)*x*p1 - (k - 1)*p0) / k;
+                p0 = p1;
+                p1 = p2;
+            }
+            dp = n * (x*p1 - p0) / (x*x - 1);
+            double dx = p1 / dp;
+            x -= dx;
+            if (fabs(dx) < 1.e-15) {
+                break;
+            }
+        }
+        t[i] = 0.5 * (1 - x);
+        w[i] = 1.0 / ((1 - x*x) * dp * dp);
+    }
+}
+
+icqTriangleGeometry::icqTriangleGeometry(const double* points, const int* cells,
+                                         long numIds, const int* ids, int minOrder) {
+
+    this->numTriangles = numIds;
+    this->maxOrder = ICQ_QUADRATURE_MAX_ORDER;
+    this->minOrder = (minOrder < 1? 1: minOrder);
+    this->minOrder = (this->minOrder > this->maxOrder? this->maxOrder: this->minOrder);
+
+    this->pa.resize(3*numIds);
+    this->db.resize(3*numIds);
+    this->dc.resize(3*numIds);
+    this->areas.resize(numIds);
+    this->centroids.resize(3*numIds);
+    this->normals.resize(3*numIds);
+    this->maxEdge2.resize(numIds);
+
+    for (long i = 0; i < numIds; ++i) {
+
+        const int* tri = &cells[3*(ids? ids[i]: i)];
+        const double* a = &points[3*tri[0]];
+        const double* b = &points[3*tri[1]];
+        const double* c = &points[3*tri[2]];
+
+        double eb = 0;
+        double ec = 0;
+        double ebc = 0;
+        for (size_t j = 0; j < 3; ++j) {
+            this->pa[3*i + j] = a[j];
+            this->db[3*i + j] = b[j] - a[j];
+            this->dc[3*i + j] = c[j] - a[j];
+            this->centroids[3*i + j] = (a[j] + b[j] + c[j]) / 3.0;
+            eb += (b[j] - a[j]) * (b[j] - a[j]);
+            ec += (c[j] - a[j]) * (c[j] - a[j]);
+            ebc += (c[j] - b[j]) * (c[j] - b[j]);
+        }
+        double h2 = (eb > ec? eb: ec);
+        this->maxEdge2[i] = (ebc > h2? ebc: h2);
+
+        const double* u = &this->db[3*i];
+        const double* v = &this->dc[3*i];
+        const double n0 = u[1]*v[2] - u[2]*v[1];
+        const double n1 = u[2]*v[0] - u[0]*v[2];
+        const double n2 = u[0]*v[1] - u[1]*v[0];
+        const double nNorm = sqrt(n0*n0 + n1*n1 + n2*n2);
+        this->areas[i] = 0.5 * nNorm;
+        if (nNorm > 0) {
+            this->normals[3*i + 0] = n0 / nNorm;
+            this->normals[3*i + 1] = n1 / nNorm;
+            this->normals[3*i + 2] = n2 / nNorm;
+        }
+    }
+
+    // Gauss points in physical space, only the orders that may be used
+    this->numGaussPts.assign(this->maxOrder + 1, 0);
+    this->gaussX.resize(this->maxOrder + 1);
+    this->gaussY.resize(this->maxOrder + 1);
+    this->gaussZ.resize(this->maxOrder + 1);
+    for (int order = this->minOrder; order <= this->maxOrder; ++order) {
+
+        const icqGaussRule* rule = icqQuadratureGetRule(order);
+        const double* xsi = rule->xsi;
+        const double* eta = rule->eta;
+        int n = rule->numPoints;
+
+        this->numGaussPts[order] = n;
+        std::vector<double>& x = this->gaussX[order];
+        std::vector<double>& y = this->gaussY[order];
+        std::vector<double>& z = this->gaussZ[order];
+        x.resize(numIds*n);
+        y.resize(numIds*n);
+        z.resize(numIds*n);
+
+        for (long i = 0; i < numIds; ++i) {
+            const double* p = &this->pa[3*i];
+            const double* u = &this->db[3*i];
+            const double* v = &this->dc[3*i];
+            for (int k = 0; k < n; ++k) {
+                x[i*n + k] = p[0] + xsi[k]*u[0] + eta[k]*v[0];
+                y[i*n + k] = p[1] + xsi[k]*u[1] + eta[k]*v[1];
+                z[i*n + k] = p[2] + xsi[k]*u[2] + eta[k]*v[2];
+            }
+        }
+    }
+
+    // tensor product rule graded toward v = 0
+    const int m = ICQ_NEAR_FIELD_NUM_POINTS;
+    const int q = ICQ_NEAR_FIELD_GRADING;
+    double t[ICQ_NEAR_FIELD_NUM_POINTS];
+    double wt[ICQ_NEAR_FIELD_NUM_POINTS];
+    getGaussLegendre(m, t, wt);
+    this->gradedU.resize(m*m);
+    this->gradedV.resize(m*m);
+    this->gradedW.resize(m*m);
+    for (int i = 0; i < m; ++i) {
+        for (int j = 0; j < m; ++j) {
+            this->gradedU[i*m + j] = t[j];
+            this->gradedV[i*m + j] = pow(t[i], q);
+            this->gradedW[i*m + j] = wt[i] * wt[j] * q * pow(t[i], q - 1);
+        }
+    }
+}
+
+double icqTriangleGeometry::getDistance2(long iObs, const icqTriangleGeometry& src,
+                                         long jSrc, double& h2) const {
+
+    const double* c0 = &this->centroids[3*iObs];
+    const double* c1 = &src.centroids[3*jSrc];
+    double d2 = 0;
+    for (size_t j = 0; j < 3; ++j) {
+        d2 += (c0[j] - c1[j]) * (c0[j] - c1[j]);
+    }
+    h2 = this->maxEdge2[iObs];
+    h2 = (src.maxEdge2[jSrc] > h2? src.maxEdge2[jSrc]: h2);
+    return d2;
+}
+
+int icqTriangleGeometry::getQuadratureOrder(long iObs, const icqTriangleGeometry& src,
+                                            long jSrc, double quadTol) const {
+
+    if (quadTol <= 0) {
+        return this->maxOrder;
+    }
+
+    double h2;
+    double d2 = this->getDistance2(iObs, src, jSrc, h2);
+    int minOrder = (this->minOrder > src.minOrder? this->minOrder: src.minOrder);
+    return this->selectOrder(h2, d2, minOrder, quadTol);
+}
+
+int icqTriangleGeometry::getPointQuadratureOrder(const double* p, long jSrc,
+                                                 double quadTol) const {
+
+    if (quadTol <= 0) {
+        return this->maxOrder;
+    }
+
+    const double* c = &this->centroids[3*jSrc];
+    double d2 = 0;
+    for (size_t j = 0; j < 3; ++j) {
+        d2 += (p[j] - c[j]) * (p[j] - c[j]);
+    }
+    return this->selectOrder(this->maxEdge2[jSrc], d2, this->minOrder, quadTol);
+}
+
+int icqTriangleGeometry::selectOrder(double h2, double d2, int minOrder,
+                                     double quadTol) const {
+
+    if (h2 >= d2) {
+        // near field
+        return this->maxOrder;
+    }
+
+    const double ratio = 0.5 * sqrt(h2 / d2);
+    double err = ratio;
+    for (int order = 1; order < this->maxOrder; ++order) {
+        err *= ratio;
+        if (err < quadTol) {
+            return (order < minOrder? minOrder: order);
+        }
+    }
+    return this->maxOrder;
+}
+
+bool icqTriangleGeometry::isNearField(long iObs, const icqTriangleGeometry& src,
+                                      long jSrc) const {
+    double h2;
+    double d2 = this->getDistance2(iObs, src, jSrc, h2);
+    if (h2 >= d2) {
+        return true;
+    }
+    // the centroids of triangles sharing a vertex are at most 2h apart
+    int shared[3];
+    return (d2 <= 4*h2 && this->findSharedVertices(iObs, src, jSrc, shared) > 0);
+}
+
+int icqTriangleGeometry::findSharedVertices(long iObs, const icqTriangleGeometry& src,
+                                            long jSrc, int* shared) const {
+
+    const double* a0 = &this->pa[3*iObs];
+    const double* u0 = &this->db[3*iObs];
+    const double* v0 = &this->dc[3*iObs];
+    const double* a1 = &src.pa[3*jSrc];
+    const double* u1 = &src.db[3*jSrc];
+    const double* v1 = &src.dc[3*jSrc];
+    double verts0[3][3];
+    double verts1[3][3];
+    for (size_t j = 0; j < 3; ++j) {
+        verts0[0][j] = a0[j];
+        verts0[1][j] = a0[j] + u0[j];
+        verts0[2][j] = a0[j] + v0[j];
+        verts1[0][j] = a1[j];
+        verts1[1][j] = a1[j] + u1[j];
+        verts1[2][j] = a1[j] + v1[j];
+    }
+
+    // coincident up to round off, relative to the largest edge length
+    double eps2 = this->maxEdge2[iObs];
+    eps2 = (src.maxEdge2[jSrc] > eps2? src.maxEdge2[jSrc]: eps2);
+    eps2 *= 1.e-20;
+    int numShared = 0;
+    for (int k0 = 0; k0 < 3; ++k0) {
+        for (int k1 = 0; k1 < 3; ++k1) {
+            double d2 = 0;
+            for (size_t j = 0; j < 3; ++j) {
+                d2 += (verts0[k0][j] - verts1[k1][j]) * (verts0[k0][j] - verts1[k1][j]);
+            }
+            if (d2 <= eps2) {
+                shared[numShared++] = k0;
+                break;
+            }
+        }
+    }
+    return numShared;
+}
+
+int icqTriangleGeometry::getNearFieldRule(long iObs, const icqTriangleGeometry& src,
+                                          long jSrc, double* x, double* y, double* z,
+                                          double* w) const {
+
+    int shared[3];
+    int numShared = this->findSharedVertices(iObs, src, jSrc, shared);
+
+    if (numShared == 0) {
+        // the integrand is smooth over the observer triangle
+        const int order = this->maxOrder;
+        const int n = this->numGaussPts[order];
+        const double* wgh = icqQuadratureGetRule(order)->wgh;
+        for (int k = 0; k < n; ++k) {
+            x[k] = this->gaussX[order][iObs*n + k];
+            y[k] = this->gaussY[order][iObs*n + k];
+            z[k] = this->gaussZ[order][iObs*n + k];
+            w[k] = wgh[k];
+        }
+        return n;
+    }
+
+    const double* a = &this->pa[3*iObs];
+    const double* u = &this->db[3*iObs];
+    const double* v = &this->dc[3*iObs];
+    double verts[3][3];
+    for (size_t j = 0; j < 3; ++j) {
+        verts[0][j] = a[j];
+        verts[1][j] = a[j] + u[j];
+        verts[2][j] = a[j] + v[j];
+    }
+
+    // the unit square is mapped onto the triangle, v = 0 being the shared
+    // edge or vertex. The weights are normalized as those of the Gauss rules
+    const int n = (int) this->gradedW.size();
+    if (numShared >= 2) {
+        // p = (1 - v)*(e0 + u*(e1 - e0)) + v*apex
+        const double* e0 = verts[shared[0]];
+        const double* e1 = verts[shared[1]];
+        const double* apex = verts[3 - shared[0] - shared[1]];
+        for (int k = 0; k < n; ++k) {
+            const double uk = this->gradedU[k];
+            const double vk = this->gradedV[k];
+            x[k] = (1 - vk)*(e0[0] + uk*(e1[0] - e0[0])) + vk*apex[0];
+            y[k] = (1 - vk)*(e0[1] + uk*(e1[1] - e0[1])) + vk*apex[1];
+            z[k] = (1 - vk)*(e0[2] + uk*(e1[2] - e0[2])) + vk*apex[2];
+            w[k] = 2 * (1 - vk) * this->gradedW[k];
+        }
+    }
+    else {
+        // p = s + v*(b - s + u*(c - b))
+        const double* s = verts[shared[0]];
+        const double* b = verts[(shared[0] + 1) % 3];
+        const double* c = verts[(shared[0] + 2) % 3];
+        for (int k = 0; k < n; ++k) {
+            const double uk = this->gradedU[k];
+            const double vk = this->gradedV[k];
+            x[k] = s[0] + vk*(b[0] - s[0] + uk*(c[0] - b[0]));
+            y[k] = s[1] + vk*(b[1] - s[1] + uk*(c[1] - b[1]));
+            z[k] = s[2] + vk*(b[2] - s[2] + uk*(c[2] - b[2]));
+            w[k] = 2 * vk * this->gradedW[k];
+        }
+    }
+    return n;
+}
+
+bool icqTriangleGeometry::isPointNearField(const double* p, long jSrc) const {
+
+    const double* c = &this->centroids[3*jSrc];
+    double d2 = 0;
+    for (size_t j = 0; j < 3; ++j) {
+        d2 += (p[j] - c[j]) * (p[j] - c[j]);
+    }
+    return (this->maxEdge2[jSrc] >= d2);
+}
+
+double icqTriangleGeometry::integrateOneOverR(const double* p, long jSrc) const {
+
+    const double* n = &this->normals[3*jSrc];
+    const double* a = &this->pa[3*jSrc];
+    const double* u = &this->db[3*jSrc];
+    const double* v = &this->dc[3*jSrc];
+    if (this->areas[jSrc] <= 0) {
+        return 0;
+    }
+
+    // vertices, counterclockwise about the normal
+    double verts[3][3];
+    for (size_t j = 0; j < 3; ++j) {
+        verts[0][j] = a[j];
+        verts[1][j] = a[j] + u[j];
+        verts[2][j] = a[j] + v[j];
+    }
+
+    // signed height of the point above the plane of the triangle and its
+    // projection onto that plane
+    const double d = (p[0] - a[0])*n[0] + (p[1] - a[1])*n[1] + (p[2] - a[2])*n[2];
+    const double absD = fabs(d);
+    double rho[3];
+    for (size_t j = 0; j < 3; ++j) {
+        rho[j] = p[j] - d*n[j];
+    }
+
+    double res = 0;
+    for (int e = 0; e < 3; ++e) {
+        const double* p0 = verts[e];
+        const double* p1 = verts[(e + 1) % 3];
+
+        // unit edge vector s and outward unit normal m = s x n of the edge
+        double s[3];
+        double len = 0;
+        for (size_t j = 0; j < 3; ++j) {
+            s[j] = p1[j] - p0[j];
+            len += s[j] * s[j];
+        }
+        len = sqrt(len);
+        for (size_t j = 0; j < 3; ++j) {
+            s[j] /= len;
+        }
+        const double m[] = {s[1]*n[2] - s[2]*n[1],
+                            s[2]*n[0] - s[0]*n[2],
+                            s[0]*n[1] - s[1]*n[0]};
+
+        // edge end points relative to the projected point, along the edge
+        // (sMinus, sPlus) and across the edge (t0)
+        double sMinus = 0;
+        double sPlus = 0;
+        double t0 = 0;
+        double rMinus = 0;
+        double rPlus = 0;
+        for (size_t j = 0; j < 3; ++j) {
+            sMinus += (p0[j] - rho[j]) * s[j];
+            sPlus += (p1[j] - rho[j]) * s[j];
+            t0 += (p0[j] - rho[j]) * m[j];
+            rMinus += (p[j] - p0[j]) * (p[j] - p0[j]);
+            rPlus += (p[j] - p1[j]) * (p[j] - p1[j]);
+        }
+        rMinus = sqrt(rMinus);
+        rPlus = sqrt(rPlus);
+        const double r02 = t0*t0 + d*d;
+
+        // the log term vanishes when the projected point lies on the line
+        // of the edge, where it would otherwise be singular
+        if (fabs(t0) > 1.e-12 * len) {
+            double f;
+            if (sPlus + sMinus >= 0) {
+                f = log((rPlus + sPlus) / (rMinus + sMinus));
+            }
+            else {
+                // same value, without cancellation when s < 0
+                f = log((rMinus - sMinus) / (rPlus - sPlus));
+            }
+            res += t0 * f;
+        }
+        if (absD > 0) {
+            res -= absD * (atan(t0*sPlus / (r02 + absD*rPlus)) -
+                           atan(t0*sMinus / (r02 + absD*rMinus)));
+        }
+    }
+    return res;
+}
+
+double icqTriangleGeometry::computeSolidAngle(const double* p, long jSrc) const {
+
+    const double* a = &this->pa[3*jSrc];
+    const double* u = &this->db[3*jSrc];
+    const double* v = &this->dc[3*jSrc];
+
+    // vertices relative to the point
+    const double r1[] = {a[0] - p[0], a[1] - p[1], a[2] - p[2]};
+    const double r2[] = {r1[0] + u[0], r1[1] + u[1], r1[2] + u[2]};
+    const double r3[] = {r1[0] + v[0], r1[1] + v[1], r1[2] + v[2]};
+    const double n1 = sqrt(r1[0]*r1[0] + r1[1]*r1[1] + r1[2]*r1[2]);
+    const double n2 = sqrt(r2[0]*r2[0] + r2[1]*r2[1] + r2[2]*r2[2]);
+    const double n3 = sqrt(r3[0]*r3[0] + r3[1]*r3[1] + r3[2]*r3[2]);
+
+    // r1.(r2 x r3) = -2 area (p - a).n, negative on the side of the normal
+    const double triple = r1[0]*(r2[1]*r3[2] - r2[2]*r3[1]) +
+                          r1[1]*(r2[2]*r3[0] - r2[0]*r3[2]) +
+                          r1[2]*(r2[0]*r3[1] - r2[1]*r3[0]);
+    const double denom = n1*n2*n3 +
+                         (r1[0]*r2[0] + r1[1]*r2[1] + r1[2]*r2[2]) * n3 +
+                         (r1[0]*r3[0] + r1[1]*r3[1] + r1[2]*r3[2]) * n2 +
+                         (r2[0]*r3[0] + r2[1]*r3[1] + r2[2]*r3[2]) * n1;
+    if (triple == 0) {
+        // in the plane of the triangle
+        return 0;
+    }
+    return -2. * atan2(triple, denom);
+}
+
+double icqTriangleGeometry::integrateNearField(long iObs, const icqTriangleGeometry& src,
+                                               long jSrc) const {
+
+    double x[ICQ_NEAR_FIELD_MAX_POINTS];
+    double y[ICQ_NEAR_FIELD_MAX_POINTS];
+    double z[ICQ_NEAR_FIELD_MAX_POINTS];
+    double w[ICQ_NEAR_FIELD_MAX_POINTS];
+    const int n = this->getNearFieldRule(iObs, src, jSrc, x, y, z, w);
+
+    // quadrature over the observer triangle, the integrand being smooth
+    // away from the edges of the source triangle
+    double res = 0;
+    for (int k = 0; k < n; ++k) {
+        const double p[] = {x[k], y[k], z[k]};
+        res += w[k] * src.integrateOneOverR(p, jSrc);
+    }
+    return res;
+}
+
+double icqTriangleGeometry::integrateSolidAngle(long iObs, const icqTriangleGeometry& src,
+                                                long jSrc) const {
+
+    double x[ICQ_NEAR_FIELD_MAX_POINTS];
+    double y[ICQ_NEAR_FIELD_MAX_POINTS];
+    double z[ICQ_NEAR_FIELD_MAX_POINTS];
+    double w[ICQ_NEAR_FIELD_MAX_POINTS];
+    const int n = this->getNearFieldRule(iObs, src, jSrc, x, y, z, w);
+
+    // quadrature over the observer triangle, the solid angle being
+    // bounded and smooth away from the edges of the source triangle
+    double res = 0;
+    for (int k = 0; k < n; ++k) {
+        const double p[] = {x[k], y[k], z[k]};
+        res += w[k] * src.computeSolidAngle(p, jSrc);
+    }
+    return res;
+}
+
+double icqTriangleGeometry::evaluateNearField(long iObs, const icqTriangleGeometry& src,
+                                              long jSrc) const {
+
+    // The closed form integral is over the larger triangle, the Gauss points
+    // are on the smaller one. The choice does not depend on which triangle
+    // is the observer, hence elements (i, j) and (j, i) computed separately
+    // keep the symmetry of the Galerkin matrix
+    const double areaObs = this->areas[iObs];
+    const double areaSrc = src.areas[jSrc];
+    bool srcIsInner = (areaSrc > areaObs);
+    if (areaSrc == areaObs) {
+        // tie break on the centroids
+        const double* c0 = &this->centroids[3*iObs];
+        const double* c1 = &src.centroids[3*jSrc];
+        int j = 0;
+        while (j < 2 && c0[j] == c1[j]) {
+            ++j;
+        }
+        srcIsInner = (c1[j] > c0[j]);
+    }
+
+    double res;
+    if (srcIsInner) {
+        res = this->integrateNearField(iObs, src, jSrc);
+    }
+    else {
+        res = areaSrc * src.integrateNearField(jSrc, *this, iObs) / areaObs;
+    }
+
+    // same normalization as evaluate
+    return res / (-4. * M_PI);
+}
+
+double icqTriangleGeometry::evaluateCollocationNearField(long iObs,
+                                                         const icqTriangleGeometry& src,
+                                                         long jSrc) const {
+
+    return src.integrateOneOverR(&this->centroids[3*iObs], jSrc) / (-4. * M_PI);
+}
+
+void icqTriangleGeometry::evaluateDoubleLayerNearField(long iObs,
+                                                       const icqTriangleGeometry& src,
+                                                       long jSrc, double& k, double& kT) const {
+
+    // the derivative of -1/(4 pi r) along n_y is -(x - y).n_y/(4 pi r^3),
+    // whose integral over y is the solid angle of the source triangle
+    const double c = -1.0 / (4. * M_PI);
+    k = c * this->integrateSolidAngle(iObs, src, jSrc);
+    kT = c * src.integrateSolidAngle(jSrc, *this, iObs);
+}
+
+double icqTriangleGeometry::evaluate(long iObs, const icqTriangleGeometry& src, long jSrc,
+                                     int order) const {
+
+    const int n = this->numGaussPts[order];
+    const double* x0 = &this->gaussX[order][iObs*n];
+    const double* y0 = &this->gaussY[order][iObs*n];
+    const double* z0 = &this->gaussZ[order][iObs*n];
+    const double* x1 = &src.gaussX[order][jSrc*n];
+    const double* y1 = &src.gaussY[order][jSrc*n];
+    const double* z1 = &src.gaussZ[order][jSrc*n];
+    const double* w = icqQuadratureGetRule(order)->wgh;
+
+    double res = icqLaplaceWeightedSum(n, x0, y0, z0, w, n, x1, y1, z1, w);
+
+    // same normalization as icqQuadratureEvaluateDouble
+    return src.areas[jSrc] * res;
+}
+
+double icqTriangleGeometry::evaluateCollocation(long iObs, const icqTriangleGeometry& src,
+                                                long jSrc, int order) const {
+
+    const int n = src.numGaussPts[order];
+    const double* x1 = &src.gaussX[order][jSrc*n];
+    const double* y1 = &src.gaussY[order][jSrc*n];
+    const double* z1 = &src.gaussZ[order][jSrc*n];
+    const double* w = icqQuadratureGetRule(order)->wgh;
+    const double* c = &this->centroids[3*iObs];
+    const double one = 1.0;
+
+    double res = icqLaplaceWeightedSum(1, &c[0], &c[1], &c[2], &one, n, x1, y1, z1, w);
+
+    return src.areas[jSrc] * res;
+}
+
+void icqTriangleGeometry::evaluateWithDoubleLayer(long iObs, const icqTriangleGeometry& src,
+                                                  long jSrc, int order,
+                                                  double& g, double& k, double& kT) const {
+
+    const int n = this->numGaussPts[order];
+    const double* x0 = &this->gaussX[order][iObs*n];
+    const double* y0 = &this->gaussY[order][iObs*n];
+    const double* z0 = &this->gaussZ[order][iObs*n];
+    const double* x1 = &src.gaussX[order][jSrc*n];
+    const double* y1 = &src.gaussY[order][jSrc*n];
+    const double* z1 = &src.gaussZ[order][jSrc*n];
+    const double* w = icqQuadratureGetRule(order)->wgh;
+
+    // The triangles are flat, (x - y).n_src depends only on the observer 
+    // point x and (y - x).n_obs only on the source point y. The double 
+    // layer integrals then only add a sum of w/r^3 to the single layer
+    // loop
+    const double* n0 = &this->normals[3*iObs];
+    const double* n1 = &src.normals[3*jSrc];
+    const double* pa0 = &this->pa[3*iObs];
+    const double* pa1 = &src.pa[3*jSrc];
+    const double c0 = pa0[0]*n0[0] + pa0[1]*n0[1] + pa0[2]*n0[2];
+    const double c1 = pa1[0]*n1[0] + pa1[1]*n1[1] + pa1[2]*n1[2];
+    double t[ICQ_QUADRATURE_MAX_POINTS];
+    for (int i1 = 0; i1 < n; ++i1) {
+        t[i1] = w[i1] * (x1[i1]*n0[0] + y1[i1]*n0[1] + z1[i1]*n0[2] - c0);
+    }
+
+    double resG = 0;
+    double resK = 0;
+    double resKT = 0;
+    for (int i0 = 0; i0 < n; ++i0) {
+        double accG = 0;
+        double accK = 0;
+        double accKT = 0;
+        for (int i1 = 0; i1 < n; ++i1) {
+            const double dx = x1[i1] - x0[i0];
+            const double dy = y1[i1] - y0[i0];
+            const double dz = z1[i1] - z0[i0];
+            const double rInv = 1.0 / sqrt(dx*dx + dy*dy + dz*dz);
+            const double rInv3 = rInv * rInv * rInv;
+            accG += w[i1] * rInv;
+            accK += w[i1] * rInv3;
+            accKT += t[i1] * rInv3;
+        }
+        const double s = x0[i0]*n1[0] + y0[i0]*n1[1] + z0[i0]*n1[2] - c1;
+        resG += w[i0] * accG;
+        resK += w[i0] * s * accK;
+        resKT += w[i0] * accKT;
+    }
+
+    // kernel -1/(4 pi r), its derivative along n_y is -(x - y).n_y/(4 pi r^3)
+    const double c = -1.0 / (4. * M_PI);
+    g = c * src.areas[jSrc] * resG;
+    k = c * src.areas[jSrc] * resK;
+    kT = c * this->areas[iObs] * resKT;
+}
+
+double icqTriangleGeometry::evaluatePoint(const double* p, long jSrc, int order,
+                                          double* grad) const {
+
+    const int n = this->numGaussPts[order];
+    const double* x = &this->gaussX[order][jSrc*n];
+    const double* y = &this->gaussY[order][jSrc*n];
+    const double* z = &this->gaussZ[order][jSrc*n];
+    const double* w = icqQuadratureGetRule(order)->wgh;
+
+    double res = 0;
+    double gx = 0;
+    double gy = 0;
+    double gz = 0;
+    for (int k = 0; k < n; ++k) {
+        const double dx = p[0] - x[k];
+        const double dy = p[1] - y[k];
+        const double dz = p[2] - z[k];
+        const double rInv = 1.0 / sqrt(dx*dx + dy*dy + dz*dz);
+        const double wr3 = w[k] * rInv * rInv * rInv;
+        res += w[k] * rInv;
+        gx += wr3 * dx;
+        gy += wr3 * dy;
+        gz += wr3 * dz;
+    }
+
+    // kernel -1/(4 pi r), its gradient is (p - y)/(4 pi r^3)
+    const double c = this->areas[jSrc] / (4. * M_PI);
+    grad[0] = c * gx;
+    grad[1] = c * gy;
+    grad[2] = c * gz;
+    return -c * res;
+}
@@ -0,0 +1,253 @@
+/**
+ * Triangle geometry precomputed once per assembly: vertices, edge vectors,
+ * areas and the Gauss points mapped into physical space, stored in
+ * contiguous arrays
+ */
+
+#ifndef ICQ_TRIANGLE_GEOMETRY
+#define ICQ_TRIANGLE_GEOMETRY
+
+#include <icqQuadrature.h>
+#include <vector>
+
+// number of Gauss-Legendre points along each direction of the rule graded
+// toward the shared edge or vertex of near field triangles
+#define ICQ_NEAR_FIELD_NUM_POINTS 10
+// the points are graded as t^ICQ_NEAR_FIELD_GRADING toward the shared edge
+// or vertex, where the integrand has a logarithmic derivative
+#define ICQ_NEAR_FIELD_GRADING 3
+
+class icqTriangleGeometry {
+public:
+
+    /**
+     * Constructor
+     * @param points point coordinates, array of size 3*numPoints
+     * @param cells triangle connectivity, array of size 3*numTriangles
+     * @param numIds number of triangles in the geometry
+     * @param ids triangle indices (NULL for triangles 0...numIds - 1),
+     *            triangle k of the geometry is triangle ids[k] of the mesh
+     * @param minOrder lowest quadrature order for which the Gauss points
+     *                 are stored, orders minOrder...maxOrder are available
+     */
+    icqTriangleGeometry(const double* points, const int* cells,
+                        long numIds, const int* ids, int minOrder);
+
+    /**
+     * Select the quadrature order of a pair of triangles. The error of a
+     * degree k rule applied to 1/r decays like (h/2d)^(k+1), h being the
+     * largest edge length and d the distance between the centroids
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @param quadTol relative tolerance (<= 0 to always use the maximum order)
+     * @return order
+     */
+    int getQuadratureOrder(long iObs, const icqTriangleGeometry& src, long jSrc,
+                           double quadTol) const;
+
+    /**
+     * Select the quadrature order of a triangle seen from a point, same
+     * criterion as for a pair of triangles
+     * @param p point
+     * @param jSrc triangle
+     * @param quadTol relative tolerance (<= 0 to always use the maximum order)
+     * @return order
+     */
+    int getPointQuadratureOrder(const double* p, long jSrc, double quadTol) const;
+
+    /**
+     * Whether a pair of triangles is in the near field, the distance
+     * between the centroids not exceeding the largest edge length or the
+     * triangles sharing a vertex. This includes the triangles sharing an 
+     * edge, over which the kernel is nearly singular
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @return true if near
+     */
+    bool isNearField(long iObs, const icqTriangleGeometry& src, long jSrc) const;
+
+    /**
+     * Whether a point is in the near field of a triangle, same criterion
+     * as for a pair of triangles
+     * @param p point
+     * @param jSrc triangle
+     * @return true if near
+     */
+    bool isPointNearField(const double* p, long jSrc) const;
+
+    /**
+     * Integrate 1/|p - y| over a triangle in closed form (sum of edge 
+     * contributions of the flat triangle, see Wilton et al., IEEE Trans.
+     * Antennas Propag. 32, 1984)
+     * @param p point, may lie in the plane or on the boundary of the triangle
+     * @param jSrc triangle
+     * @return integral
+     */
+    double integrateOneOverR(const double* p, long jSrc) const;
+
+    /**
+     * Signed solid angle subtended by a triangle at a point, in closed form
+     * (Van Oosterom and Strackee, IEEE Trans. Biomed. Eng. 30, 1983). This
+     * is the integral of (p - y).n/|p - y|^3 over the triangle, positive
+     * on the side the normal points to
+     * @param p point, zero if it lies in the plane of the triangle
+     * @param jSrc triangle
+     * @return solid angle
+     */
+    double computeSolidAngle(const double* p, long jSrc) const;
+
+    /**
+     * Integrate the Laplace kernel over a pair of near field triangles. 
+     * The integral over the larger triangle is computed in closed form and
+     * the smaller one is integrated with the maximum quadrature order, or
+     * with a rule graded toward the shared edge or vertex
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @return integral divided by the observer triangle area
+     */
+    double evaluateNearField(long iObs, const icqTriangleGeometry& src, long jSrc) const;
+
+    /**
+     * Integrate the Laplace kernel over a source triangle in closed form,
+     * the observer point being the centroid of a triangle (collocation)
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @return integral
+     */
+    double evaluateCollocationNearField(long iObs, const icqTriangleGeometry& src,
+                                        long jSrc) const;
+
+    /**
+     * Integrate the Laplace kernel over a pair of triangles
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @param order quadrature order, between minOrder and maxOrder
+     * @return integral divided by the observer triangle area
+     */
+    double evaluate(long iObs, const icqTriangleGeometry& src, long jSrc,
+                    int order) const;
+
+    /**
+     * Integrate the Laplace kernel over a source triangle, the observer
+     * point being the centroid of a triangle (collocation)
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @param order quadrature order of the source triangle, between 
+     *              minOrder and maxOrder
+     * @return integral
+     */
+    double evaluateCollocation(long iObs, const icqTriangleGeometry& src, long jSrc,
+                               int order) const;
+
+    /**
+     * Integrate the Laplace kernel and its normal derivatives over a pair 
+     * of triangles in a single pass over the Gauss point pairs. The double
+     * layer kernel is the derivative of -1/(4 pi r) along the normal of 
+     * the source triangle
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @param order quadrature order, between minOrder and maxOrder
+     * @param g single layer integral divided by the observer triangle area
+     *          (output)
+     * @param k double layer integral, normal of jSrc, divided by the 
+     *          observer triangle area (output)
+     * @param kT double layer integral with the roles of the triangles
+     *           swapped, normal of iObs, divided by the area of jSrc (output)
+     */
+    void evaluateWithDoubleLayer(long iObs, const icqTriangleGeometry& src, long jSrc,
+                                 int order, double& g, double& k, double& kT) const;
+
+    /**
+     * Integrate the normal derivatives of the Laplace kernel over a pair of
+     * near field triangles. The inner integral is the solid angle of one
+     * triangle, computed in closed form, and the outer integral uses the
+     * same rule as for the single layer
+     * @param iObs observer triangle in this geometry
+     * @param src source geometry
+     * @param jSrc source triangle in src
+     * @param k double layer integral, normal of jSrc, divided by the 
+     *          observer triangle area (output)
+     * @param kT double layer integral with the roles of the triangles
+     *           swapped, normal of iObs, divided by the area of jSrc (output)
+     */
+    void evaluateDoubleLayerNearField(long iObs, const icqTriangleGeometry& src, long jSrc,
+                                      double& k, double& kT) const;
+
+    /**
+     * Integrate the Laplace kernel and its gradient with respect to the
+     * point over a triangle
+     * @param p point
+     * @param jSrc triangle
+     * @param order quadrature order, between minOrder and maxOrder
+     * @param grad gradient of the integral (output), array of size 3
+     * @return integral
+     */
+    double evaluatePoint(const double* p, long jSrc, int order, double* grad) const;
+
+    long getNumberOfTriangles() const { return this->numTriangles; }
+    int getMaxOrder() const { return this->maxOrder; }
+    double getArea(long i) const { return this->areas[i]; }
+
+    // first vertex and edge vectors, arrays of size 3*numTriangles
+    std::vector<double> pa;
+    std::vector<double> db;
+    std::vector<double> dc;
+
+    // triangle areas
+    std::vector<double> areas;
+
+    // centroids, array of size 3*numTriangles
+    std::vector<double> centroids;
+
+    // unit normals, from the orientation of the vertices, array of size
+    // 3*numTriangles
+    std::vector<double> normals;
+
+    // square of the largest edge length
+    std::vector<double> maxEdge2;
+
+private:
+
+    int selectOrder(double h2, double d2, int minOrder, double quadTol) const;
+
+    double getDistance2(long iObs, const icqTriangleGeometry& src, long jSrc,
+                        double& h2) const;
+
+    double integrateNearField(long iObs, const icqTriangleGeometry& src, long jSrc) const;
+
+    double integrateSolidAngle(long iObs, const icqTriangleGeometry& src, long jSrc) const;
+
+    int findSharedVertices(long iObs, const icqTriangleGeometry& src, long jSrc,
+                           int* shared) const;
+
+    int getNearFieldRule(long iObs, const icqTriangleGeometry& src, long jSrc,
+                         double* x, double* y, double* z, double* w) const;
+
+    long numTriangles;
+    int minOrder;
+    int maxOrder;
+
+    // Gauss points of each order in physical space, the x, y and z
+    // coordinates are stored in separate arrays of size
+    // numTriangles*numGaussPts[order], the points of a triangle being
+    // contiguous
+    std::vector<int> numGaussPts;
+    std::vector<std::vector<double> > gaussX;
+    std::vector<std::vector<double> > gaussY;
+    std::vector<std::vector<double> > gaussZ;
+
+    // graded rule over the unit square, the coordinate v being graded
+    // toward v = 0, arrays of size ICQ_NEAR_FIELD_NUM_POINTS^2
+    std::vector<double> gradedU;
+    std::vector<double> gradedV;
+    std::vector<double> gradedW;
+};
+
+#endif // ICQ_TRIANGLE_GEOMETRY
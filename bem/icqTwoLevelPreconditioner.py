@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""
+Two-level preconditioner of the Green operator. The fine triangles are
+grouped by the triangle of a coarse mesh of the same surface they lie on
+(the aggregates). Each application is a symmetric cycle: a correction from
+the coarse mesh, solved directly, a block-Jacobi smoothing with the exact
+inverses of the near field blocks of the aggregates, and a second coarse
+correction. The operator being of negative order, the local blocks 
+over-correct the smooth components of the residual, which the coarse 
+corrections then remove, and the number of iterations stays about flat
+as the meshes are refined
+"""
+
+from __future__ import print_function
+import numpy
+
+# number of fine triangles processed at once when searching the coarse
+# triangles, bounds the memory of the search
+CHUNK_SIZE = 256
+
+
+def getAggregates(centers, coarsePoints, coarseCells):
+    """
+    Find the coarse triangle each fine triangle lies on
+    @param centers fine triangle centroids, array of shape (n, 3)
+    @param coarsePoints coarse mesh point coordinates
+    @param coarseCells point indices of the coarse triangles
+    @return array of n coarse triangle indices
+    """
+    pa = coarsePoints[coarseCells[:, 0], :]
+    e1 = coarsePoints[coarseCells[:, 1], :] - pa
+    e2 = coarsePoints[coarseCells[:, 2], :] - pa
+    normals = numpy.cross(e1, e2)
+    norms = numpy.sqrt((normals**2).sum(axis=1))
+    normals /= numpy.where(norms > 0., norms, 1.)[:, numpy.newaxis]
+    sizes = numpy.sqrt(0.5*norms)
+
+    # dual basis of (e1, e2), the barycentric coordinates of the projection
+    # of d onto the plane of the triangle are d.w1 and d.w2
+    e11 = (e1*e1).sum(axis=1)
+    e12 = (e1*e2).sum(axis=1)
+    e22 = (e2*e2).sum(axis=1)
+    det = e11*e22 - e12*e12
+    det = numpy.where(det > 0., det, 1.)[:, numpy.newaxis]
+    w1 = (e22[:, numpy.newaxis]*e1 - e12[:, numpy.newaxis]*e2) / det
+    w2 = (e11[:, numpy.newaxis]*e2 - e12[:, numpy.newaxis]*e1) / det
+
+    n = centers.shape[0]
+    res = numpy.empty((n,), numpy.int64)
+    for beg in range(0, n, CHUNK_SIZE):
+        end = min(beg + CHUNK_SIZE, n)
+        # shape (chunk, numCoarseTriangles, 3)
+        d = centers[beg:end, numpy.newaxis, :] - pa
+        u = (d*w1).sum(axis=2)
+        v = (d*w2).sum(axis=2)
+        # distance to the plane plus a penalty for falling outside
+        outside = numpy.maximum(0., numpy.maximum(-u, numpy.maximum(-v, u + v - 1.)))
+        dist = numpy.abs((d*normals).sum(axis=2)) + outside*sizes
+        res[beg:end] = numpy.argmin(dist, axis=1)
+    return res
+
+
+class TwoLevelPreconditioner:
+
+    def __init__(self, op, scale, areas, aggregates, computeBlock, coarseAreas,
+                 coarseGreenMatrix):
+        """
+        Constructor
+        @param op operator to precondition, D^-1.A.G where A is the diagonal
+                  matrix of the areas and G the fine Green matrix
+        @param scale diagonal of D, vector or scalar (e.g. the areas for G,
+                     -1 for the symmetric matrix -A.G)
+        @param areas fine triangle areas
+        @param aggregates coarse triangle of each fine triangle, see
+                          getAggregates
+        @param computeBlock function (obsIds, srcIds) -> exact block of the
+                            fine Green matrix G, of shape
+                            (len(obsIds), len(srcIds))
+        @param coarseAreas coarse triangle areas
+        @param coarseGreenMatrix Green matrix of the coarse mesh
+        @note the blocks of the aggregates, numTriangles*maxAggregateSize
+              elements, are computed and inverted by the constructor. Each
+              application of the preconditioner applies op twice
+        """
+        self.op = op
+        self.scale = scale
+        self.areas = numpy.asarray(areas, numpy.float64)
+        self.aggregates = numpy.asarray(aggregates, numpy.int64)
+        n = len(self.areas)
+        self.shape = (n, n)
+        numAggregates = len(coarseAreas)
+
+        # the fine triangles of each aggregate, padded with n. The padding
+        # points to a zero appended to the vectors
+        order = numpy.argsort(self.aggregates, kind='mergesort')
+        counts = numpy.bincount(self.aggregates, minlength=numAggregates)
+        offsets = numpy.concatenate(([0], numpy.cumsum(counts)))
+        maxSize = max(counts.max(), 1)
+        self.members = numpy.empty((numAggregates, maxSize), numpy.int64)
+        self.members[...] = n
+        self.inverseBlocks = numpy.zeros((numAggregates, maxSize, maxSize), numpy.float64)
+        for c in range(numAggregates):
+            ids = order[offsets[c]:offsets[c + 1]]
+            if len(ids) == 0:
+                continue
+            self.members[c, :len(ids)] = ids
+            block = self.areas[ids, numpy.newaxis] * computeBlock(ids, ids)
+            self.inverseBlocks[c, :len(ids), :len(ids)] = numpy.linalg.inv(block)
+
+        # A.G of the coarse mesh approximates the Galerkin projection of
+        # the fine A.G onto the aggregates
+        coarseAreas = numpy.asarray(coarseAreas, numpy.float64)
+        self.coarseInverse = numpy.linalg.inv(coarseAreas[:, numpy.newaxis] * coarseGreenMatrix)
+
+    def __correct(self, vec):
+        """
+        Coarse correction, restriction by summation over the aggregates and
+        piecewise constant prolongation
+        @param vec residual of A.G
+        @return correction
+        """
+        coarseVec = numpy.bincount(self.aggregates, weights=vec,
+                                   minlength=self.coarseInverse.shape[0])
+        return self.coarseInverse.dot(coarseVec)[self.aggregates]
+
+    def __smooth(self, vec):
+        """
+        Block-Jacobi smoothing
+        @param vec residual of A.G
+        @return correction
+        """
+        n = self.shape[0]
+        padded = numpy.append(vec, 0.)
+        x = numpy.einsum('cij,cj->ci', self.inverseBlocks, padded[self.members])
+        res = numpy.zeros((n,), numpy.float64)
+        valid = self.members < n
+        res[self.members[valid]] = x[valid]
+        return res
+
+    def solve(self, vec):
+        """
+        Apply the preconditioner
+        @param vec vector
+        @return approximate solution of op.x = vec
+        """
+        vec = numpy.asarray(vec, numpy.float64)
+        x = self.__correct(self.scale * vec)
+        x += self.__smooth(self.scale * (vec - self.op.dot(x)))
+        x += self.__correct(self.scale * (vec - self.op.dot(x)))
+        return x
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    numAggregates, m = 4, 3
+    n = numAggregates * m
+    aggregates = numpy.random.permutation(numpy.repeat(numpy.arange(numAggregates), m))
+    areas = numpy.random.rand(n) + 1.
+
+    # symmetric A.G
+    mat = numpy.random.rand(n, n)
+    mat = mat + mat.T + 2*n*numpy.eye(n)
+    gMat = mat / areas[:, numpy.newaxis]
+
+    def computeBlock(obsIds, srcIds):
+        return gMat[numpy.ix_(obsIds, srcIds)]
+
+    coarseAreas = numpy.ones((numAggregates,))
+    prolongation = numpy.zeros((n, numAggregates))
+    prolongation[numpy.arange(n), aggregates] = 1.
+    coarseMat = prolongation.T.dot(mat).dot(prolongation)
+
+    # the cycle is the balancing preconditioner C + (I - C.M).B.(I - M.C)
+    coarse = prolongation.dot(numpy.linalg.solve(coarseMat, prolongation.T))
+    smooth = numpy.zeros((n, n))
+    for c in range(numAggregates):
+        ids = numpy.nonzero(aggregates == c)[0]
+        smooth[numpy.ix_(ids, ids)] = numpy.linalg.inv(mat[numpy.ix_(ids, ids)])
+    proj = numpy.eye(n) - coarse.dot(mat)
+    exact = coarse + proj.dot(smooth).dot(proj.T)
+
+    x = numpy.random.rand(n)
+    prec = TwoLevelPreconditioner(-mat, -1., areas, aggregates, computeBlock, coarseAreas,
+                                  coarseMat)
+    assert(numpy.allclose(prec.solve(x), -exact.dot(x)))
+    prec = TwoLevelPreconditioner(gMat, areas, areas, aggregates, computeBlock, coarseAreas,
+                                  coarseMat)
+    assert(numpy.allclose(prec.solve(x), exact.dot(areas * x)))
+
+    # points on the triangles of a coarse square
+    coarsePoints = numpy.array([[0., 0., 0.], [1., 0., 0.], [1., 1., 0.], [0., 1., 0.]])
+    coarseCells = numpy.array([[0, 1, 2], [0, 2, 3]])
+    centers = numpy.array([[0.7, 0.2, 0.01], [0.2, 0.7, -0.01], [0.9, 0.1, 0.]])
+    assert((getAggregates(centers, coarsePoints, coarseCells) == [0, 1, 0]).all())
+
+if __name__ == '__main__':
+    testRandom()
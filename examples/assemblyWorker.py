@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+"""
+Process the Green matrix assembly tasks of a job directory. Start any
+number of workers, on any host sharing the job directory, while a
+solver constructed with job_dir=<directory> gathers the results.
+"""
+
+from __future__ import print_function
+import argparse
+from icqsol.bem.icqDistributedAssembly import runWorker
+
+parser = argparse.ArgumentParser(description='Green matrix assembly worker')
+
+parser.add_argument('--job_dir', dest='job_dir', required=True,
+                    help='Job directory written by the coordinator.')
+
+parser.add_argument('--num_threads', dest='num_threads', default=0, type=int,
+                    help='Number of OpenMP threads (0 for the OpenMP default).')
+
+args = parser.parse_args()
+
+numTasks = runWorker(args.job_dir, num_threads=args.num_threads)
+print('processed {0} tasks'.format(numTasks))
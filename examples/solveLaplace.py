@@ -29,6 +29,48 @@ parser.add_argument('--dirichlet', dest='dirichlet', default='sin(pi*x)*cos(pi*y
 parser.add_argument('--refine', dest='refine', default=0.0, type=float,
                     help='Maximum edge length (use 0 if no refinement).')
                     
+parser.add_argument('--num_threads', dest='num_threads', default=0, type=int,
+                    help='Number of threads used in the matrix assembly (0 for the OpenMP default).')
+
+parser.add_argument('--num_procs', dest='num_procs', default=1, type=int,
+                    help='Number of processes used in the dense matrix assembly.')
+
+parser.add_argument('--job_dir', dest='job_dir', default=None,
+                    help='Shared job directory, workers on other hosts may join the dense matrix assembly (see assemblyWorker.py).')
+
+parser.add_argument('--job_timeout', dest='job_timeout', default=None, type=float,
+                    help='Maximum time in seconds to wait for the workers of the job directory.')
+
+parser.add_argument('--quadrature_tol', dest='quadrature_tol', default=0.0, type=float,
+                    help='Tolerance used to lower the quadrature order of distant triangles (0 for the maximum order).')
+
+parser.add_argument('--storage', dest='storage', default='dense',
+                    help='Green matrix storage, "dense", "fmm" (matrix-free), "hmatrix" (compressed), "packed" (symmetric half), "stream" (recomputed), "outofcore" (on disk), "circulant" (rotationally symmetric surface, see --num_sectors) or "mirror" (surface symmetric about coordinate planes, see --mirror_planes).')
+
+parser.add_argument('--num_sectors', dest='num_sectors', default=None, type=int,
+                    help='Number of identical sectors of a rotationally symmetric surface (e.g. n_theta of a sphere), used by the "circulant" storage.')
+
+parser.add_argument('--mirror_planes', dest='mirror_planes', default='',
+                    help='Comma separated coordinate planes of mirror symmetry of the surface (e.g. "x,z"), used by the "mirror" storage.')
+
+parser.add_argument('--method', dest='method', default='galerkin',
+                    help='Discretization, "galerkin" or "collocation" (faster assembly, less accurate).')
+
+parser.add_argument('--solver', dest='solver', default=None,
+                    help='Linear solver, "direct", "cg", "gmres" or "bicgstab" (default depends on the storage).')
+
+parser.add_argument('--preconditioner', dest='preconditioner', default='diagonal',
+                    help='Preconditioner of the iterative solvers, "diagonal" or "twolevel" (coarse mesh with 4 times longer edges, see --refine).')
+
+parser.add_argument('--tol', dest='tol', default=1.e-10, type=float,
+                    help='Relative tolerance of the iterative solvers.')
+
+parser.add_argument('--max_iter', dest='max_iter', default=None, type=int,
+                    help='Maximum number of iterations of the iterative solvers.')
+
+parser.add_argument('--cache_dir', dest='cache_dir', default=None,
+                    help='Directory where the assembled matrices are cached (no caching by default).')
+
 parser.add_argument('--input_name', dest='input_name', default='voltage',
                     help='Set the name of the input field.')
 
@@ -72,7 +114,20 @@ maxEdgeLength = float('inf')
 if args.refine > 0:
     maxEdgeLength = args.refine
 
-solver = LaplaceSolver(pdata, maxEdgeLength)
+solver = LaplaceSolver(pdata, maxEdgeLength, num_threads=args.num_threads,
+                       quadrature_tol=args.quadrature_tol,
+                       storage=args.storage,
+                       method=args.method,
+                       num_sectors=args.num_sectors,
+                       mirror_planes=[p for p in args.mirror_planes.split(',') if p],
+                       cache_dir=args.cache_dir,
+                       num_procs=args.num_procs,
+                       job_dir=args.job_dir,
+                       job_timeout=args.job_timeout,
+                       solver=args.solver,
+                       preconditioner=args.preconditioner,
+                       tol=args.tol,
+                       max_iter=args.max_iter)
 
 # Set the input field.
 solver.setSourceFieldName(args.input_name)
@@ -89,20 +144,18 @@ if args.verbose:
     print('normal electric field jump min/avg/max: {0}/{1}/{2}'.format(minJump,
                                                                        avgJump,
                                                                        maxJump))
-    # Compute the response matrix
-    gMat = solver.getGreenMatrix()
+    if solver.solver != 'direct':
+        print('{0} iterations, residual {1}'.format(solver.numIterations, solver.residual))
+    # Get the response operator
+    gMat = solver.getGreenOperator()
 
     # Compute the potential
-    import numpy
-    from math import pi, sin, cos, log, exp, sqrt
-    potential = numpy.zeros(gMat.shape[0], numpy.float64)
+    from icqsol.util.icqExpression import Expression
     pointArray = solver.getPoints()
-    cellArray = solver.getCells()
-    numCells = cellArray.shape[0]
-    for i in range(numCells):
-        ia, ib, ic = cellArray[i, :]
-        x, y, z = (pointArray[ia, :] + pointArray[ib, :] + pointArray[ic, :]) / 3.
-        potential[i] = eval(args.dirichlet)
+    midPoints = pointArray[solver.getCells(), :].mean(axis=1)
+    potential = Expression(args.dirichlet).evaluate(x=midPoints[:, 0],
+                                                    y=midPoints[:, 1],
+                                                    z=midPoints[:, 2])
     error = gMat.dot(-normalEJump) - potential
     print('total error: ', error.sum())
 
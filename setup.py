@@ -73,9 +73,18 @@ indicesToDelete.reverse()
 for i in indicesToDelete:
   del VTK_LIBRARIES[i]
 
+# OpenMP is used to parallelize the BEM matrix assembly. Apple's clang does
+# not support -fopenmp out of the box, set OPENMP_FLAGS to override.
+OPENMP_FLAGS = ['-fopenmp']
+if os.uname()[0] == 'Darwin':
+    OPENMP_FLAGS = []
+if 'OPENMP_FLAGS' in os.environ:
+    OPENMP_FLAGS = os.environ['OPENMP_FLAGS'].split()
+
 print('VTK_INCLUDE_DIRS         = {0}\n'.format(VTK_INCLUDE_DIRS))
 print('VTK_LIBRARIES            = {0}\n'.format(VTK_LIBRARIES))
 print('VTK_RUNTIME_LIBRARY_DIRS = {0}\n'.format(VTK_RUNTIME_LIBRARY_DIRS))
+print('OPENMP_FLAGS             = {0}\n'.format(OPENMP_FLAGS))
 
 setup(name='icqsol',
       version=__init__.__version__, 
@@ -100,10 +109,15 @@ setup(name='icqsol',
                                ['bem/icqFunctor.cpp',
                                 'bem/icqLaplaceFunctor.cpp',
                                 'bem/icqQuadrature.cpp',
-                                'bem/icqLaplaceMatrices.cpp'],
+                                'bem/icqTriangleGeometry.cpp',
+                                'bem/icqLaplaceMatrices.cpp',
+                                'bem/icqPotentialEvaluation.cpp',
+                                'bem/icqPackedMatrices.cpp'],
                                include_dirs=['bem'] + VTK_INCLUDE_DIRS,
                                library_dirs=VTK_RUNTIME_LIBRARY_DIRS,
                                libraries=VTK_LIBRARIES,
+                               extra_compile_args=OPENMP_FLAGS,
+                               extra_link_args=OPENMP_FLAGS,
                                ),
                       Extension('icqsol.icqInsideLocatorCpp', 
                                 ['csg/icqInsideLocator.cpp'],
@@ -4,12 +4,9 @@
 """
 from __future__ import print_function
 import os
-import re
 import vtk
+from vtk.util import numpy_support
 import numpy
-# We need the following to handle expressions received from callers.
-from numpy import linspace
-from math import sqrt, sin, cos, tan, log, exp, pi, asin, acos, atan, atan2, e
 
 from csg.geom import Vector, Vertex, Polygon, BSPNode
 from csg.core import CSG
@@ -18,6 +15,7 @@ from icqsol.shapes.icqShape import DEFAULTS, CompositeShape
 from icqsol.color.icqColorMap import ColorMap
 from icqsol.shapes.icqRefineSurface import RefineSurface
 from icqsol.shapes.icqCoarsenSurface import CoarsenSurface
+from icqsol.util.icqExpression import Expression
 
 LOCATIONS = ['POINT', 'CELL']
 VTK_DATASET_TYPES = ['STRUCTURED_GRID', 'POLYDATA', 'UNSTRUCTURED_GRID']
@@ -387,57 +385,49 @@ class ShapeManager(object):
         @param location location of field within cell, either 'POINT' or 'CELL'
         @return vtkPolyData instance
         """
-        # Sometimes the received expression has been mangled.
-        for op in [('__gt__', '>'), ('__lt__', '<'),
-                   ('__ge__', '>='), ('__le__', '<='),
-                   ('__eq__', '=='), ('__ne__', '!=')]:
-            expression = re.sub(op[0], op[1], expression)
-        
+        # Parse and validate the expression once, the mangled comparison
+        # operators are restored by Expression.
+        expr = Expression(expression)
+
         # Refine if need be.
         pdata = self.refineVtkPolyData(vtk_poly_data,
                                        max_edge_length=max_edge_length)
         # The field name cannot have spaces.
         valid_field_name = field_name.replace(' ', '_')
         # Get the points from the shape.
-        points = pdata.GetPoints()
-        num_points = points.GetNumberOfPoints()
-        # Define the data.
-        data = vtk.vtkDoubleArray()
-        data.SetName(valid_field_name)
-        # Handle time points.
-        num_time_points = len(time_points)
-        # Update the data.
-        data.SetNumberOfComponents(num_time_points)
+        points = numpy.asarray(numpy_support.vtk_to_numpy(pdata.GetPoints().GetData()),
+                               numpy.float64)
+        # Handle time points, one component per time point.
+        t = numpy.array(time_points, numpy.float64).reshape((1, -1))
         if location.upper() == 'POINT':
-            data.SetNumberOfTuples(num_points)
-            # Set the surface field values.
-            for i in range(num_points):
-                x, y, z = points.GetPoint(i)
-                for j in range(num_time_points):
-                    t = time_points[j]
-                    field_value = eval(expression)
-                    data.SetComponent(i, j, field_value)
-            # Add the field.
-            pdata.GetPointData().AddArray(data)
+            positions = points
         elif location.upper() == 'CELL':
+            # Vertex average of each cell.
             num_cells = pdata.GetNumberOfCells()
-            data.SetNumberOfTuples(num_cells)
-            # Set the surface field values.
-            ptIds = vtk.vtkIdList()
-            for i in range(num_cells):
-                pdata.GetCellPoints(i, ptIds)
-                avrgPosition = numpy.zeros((3,), numpy.float64)
-                num_pts = ptIds.GetNumberOfIds()
-                for k in range(num_pts):
-                    avrgPosition += numpy.array(
-                        points.GetPoint(ptIds.GetId(k)))
-                avrgPosition /= num_pts
-                x, y, z = avrgPosition
-                for j in range(num_time_points):
-                    t = time_points[j]
-                    field_value = eval(expression)
-                    data.SetComponent(i, j, field_value)
-            # Add the field.
+            conn = numpy_support.vtk_to_numpy(pdata.GetPolys().GetData())
+            if num_cells == pdata.GetNumberOfPolys() and \
+               conn.shape[0] == 4*num_cells and (conn[::4] == 3).all():
+                # triangles, the cell array stores (3, ia, ib, ic)
+                positions = points[conn.reshape((-1, 4))[:, 1:], :].mean(axis=1)
+            else:
+                positions = numpy.zeros((num_cells, 3), numpy.float64)
+                ptIds = vtk.vtkIdList()
+                for i in range(num_cells):
+                    pdata.GetCellPoints(i, ptIds)
+                    ids = [ptIds.GetId(k) for k in range(ptIds.GetNumberOfIds())]
+                    positions[i, :] = points[ids, :].mean(axis=0)
+        else:
+            return pdata
+        # Set the surface field values, all positions and time points at once.
+        values = expr.evaluate(x=positions[:, 0:1],
+                               y=positions[:, 1:2],
+                               z=positions[:, 2:3], t=t)
+        data = numpy_support.numpy_to_vtk(values, deep=1)
+        data.SetName(valid_field_name)
+        # Add the field.
+        if location.upper() == 'POINT':
+            pdata.GetPointData().AddArray(data)
+        else:
             pdata.GetCellData().AddArray(data)
 
         return pdata
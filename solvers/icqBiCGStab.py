@@ -0,0 +1,114 @@
+from __future__ import print_function
+import numpy
+from icqsol.solvers.icqPreconditionedSolver import PreconditionedSolver
+
+
+class BiCGStab(PreconditionedSolver):
+
+    def __init__(self, mat, b):
+        """
+        Constructor
+        @param mat dense, square matrix or any object with dot and
+                   diagonal methods, need not be symmetric
+        @param b right hand side vector
+        """
+        PreconditionedSolver.__init__(self, mat)
+        self.mat = mat
+        self.b = b
+        n = len(b)
+        self.maxNumIters = n
+        self.tol = 1.e-10
+        self.verbose = False
+
+    def setTolerance(self, tol):
+        """
+        Set tolerance
+        @param tol tolerance
+        """
+        self.tol = tol
+
+    def setMaxNumberOfIterations(self, maxNumIters):
+        """
+        Set maximum number of iterations
+        @param maxNumIters  number of iterations
+        """
+        self.maxNumIters = maxNumIters
+
+    def setVerbosity(self, verbose):
+        """
+        Set verbosity
+        @param verbose True will print(out messages)
+        """
+        self.verbose = verbose
+
+    def solve(self, x0):
+        """
+        Solve linear system, preconditioned biconjugate gradient stabilized
+        @param x0 initial guess for solution
+        @return solution, error, and number of iterations
+        """
+
+        x = x0.copy()
+        r = self.b - self.mat.dot(x)
+        rHat = r.copy()
+        p = numpy.zeros(x0.shape, numpy.float64)
+        v = numpy.zeros(x0.shape, numpy.float64)
+        rho = 1.0
+        alpha = 1.0
+        omega = 1.0
+        err = numpy.linalg.norm(r)
+        k = 0
+        while abs(err) > self.tol and k < self.maxNumIters:
+            rhoNew = rHat.dot(r)
+            if rhoNew == 0:
+                # breakdown
+                break
+            beta = (rhoNew/rho) * (alpha/omega)
+            p = r + beta*(p - omega*v)
+            pHat = self.applyPreconditioner(p)
+            v = self.mat.dot(pHat)
+            alpha = rhoNew / rHat.dot(v)
+            s = r - alpha*v
+            sHat = self.applyPreconditioner(s)
+            t = self.mat.dot(sHat)
+            tt = t.dot(t)
+            omega = 0.0
+            if tt > 0:
+                omega = t.dot(s) / tt
+            x += alpha*pHat + omega*sHat
+            r = s - omega*t
+            rho = rhoNew
+            err = numpy.linalg.norm(r)
+            if self.verbose:
+                print('iteration {0} error = {1}'.format(k, err))
+            k += 1
+            if omega == 0:
+                break
+
+        return x, err, k
+
+    def getSolutionError(self, vec):
+        """
+        Get the solution error
+        @param vec solution
+        @return error
+        """
+        return numpy.linalg.norm(self.b - self.mat.dot(vec))
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 200
+    mat = numpy.random.rand(n, n) + n*numpy.eye(n)
+    b = numpy.random.rand(n)
+    bicgstab = BiCGStab(mat, b)
+    x, err, numIters = bicgstab.solve(numpy.zeros((n,), numpy.float64))
+    error = numpy.linalg.norm(x - numpy.linalg.solve(mat, b))
+    print('{0} iterations, residual {1} error {2}'.format(numIters, err, error))
+    assert(error < 1.e-8)
+
+if __name__ == '__main__':
+    testRandom()
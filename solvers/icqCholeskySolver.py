@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import numpy
+
+
+class CholeskySolver:
+
+    def __init__(self, mat, block_size=256):
+        """
+        Constructor, factor the matrix
+        @param mat dense, symmetric positive definite matrix
+        @param block_size size of the diagonal blocks used in the
+                          triangular solves
+        @note the factor is computed once, each call to solve then costs
+              O(n^2) operations per right hand side
+        """
+        self.shape = mat.shape
+        self.blockSize = block_size
+        try:
+            self.lower = numpy.linalg.cholesky(mat)
+        except numpy.linalg.LinAlgError:
+            msg = 'ERROR: Cholesky factorization failed, the matrix is not positive definite!'
+            raise RuntimeError(msg)
+
+        # inverses of the diagonal blocks, the triangular solves then
+        # reduce to matrix-matrix products
+        n = self.shape[0]
+        self.blocks = []
+        self.lowerInvs = []
+        for k0 in range(0, n, block_size):
+            k1 = min(k0 + block_size, n)
+            self.blocks.append((k0, k1))
+            self.lowerInvs.append(numpy.linalg.inv(self.lower[k0:k1, k0:k1]))
+
+    def solve(self, b):
+        """
+        Solve the linear system for one or several right hand sides
+        @param b right hand side vector or array of shape (n, nrhs)
+        @return solution, same shape as b
+        """
+        lower = self.lower
+        y = numpy.array(b, numpy.float64)
+
+        # forward substitution, L.y = b
+        for (k0, k1), lowerInv in zip(self.blocks, self.lowerInvs):
+            r = y[k0:k1] - lower[k0:k1, :k0].dot(y[:k0])
+            y[k0:k1] = lowerInv.dot(r)
+
+        # backward substitution, L^T.x = y
+        for (k0, k1), lowerInv in reversed(list(zip(self.blocks, self.lowerInvs))):
+            r = y[k0:k1] - lower[k1:, k0:k1].T.dot(y[k1:])
+            y[k0:k1] = lowerInv.T.dot(r)
+
+        return y
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 500
+    a = numpy.random.rand(n, n)
+    mat = a.dot(a.T) + n*numpy.eye(n)
+
+    solver = CholeskySolver(mat, block_size=64)
+    b = numpy.random.rand(n)
+    error = numpy.linalg.norm(solver.solve(b) - numpy.linalg.solve(mat, b))
+    print('single right hand side error: {0}'.format(error))
+    assert(error < 1.e-10)
+
+    b = numpy.random.rand(n, 7)
+    error = numpy.linalg.norm(solver.solve(b) - numpy.linalg.solve(mat, b))
+    print('multiple right hand side error: {0}'.format(error))
+    assert(error < 1.e-10)
+
+if __name__ == '__main__':
+    testRandom()
@@ -1,22 +1,24 @@
 from __future__ import print_function
 import numpy
+from icqsol.solvers.icqPreconditionedSolver import PreconditionedSolver
 
 
-class ConjugateGradient:
+class ConjugateGradient(PreconditionedSolver):
 
     def __init__(self, mat, b):
         """
         Constructor
-        @param mat dense, square matrix
+        @param mat dense, square matrix or any object with dot and
+                   diagonal methods
         @param b right hand side vector
         """
+        PreconditionedSolver.__init__(self, mat)
         self.mat = mat
         self.b = b
         n = len(b)
         self.maxNumIters = n
         self.tol = 1.e-10
         self.verbose = False
-        self.precond = numpy.array([mat[i, i] for i in range(n)])
 
     def setTolerance(self, tol):
         """
@@ -39,13 +41,6 @@ class ConjugateGradient:
         """
         self.verbose = verbose
 
-    def setDiagonalPreconditioner(self, precond):
-        """
-        Set the diagonal preconditioner
-        @param precond preconditioner
-        """
-        self.precond = precond
-
     def solve(self, x0):
         """
         Solve linear system
@@ -55,7 +50,7 @@ class ConjugateGradient:
 
         x = x0.copy()
         r = self.b - self.mat.dot(x)
-        w = r / self.precond
+        w = self.applyPreconditioner(r)
         p = numpy.zeros(x0.shape, numpy.float64)
         beta = 0.0
         rho = r.dot(w)
@@ -66,12 +61,13 @@ class ConjugateGradient:
             z = self.mat.dot(p)
             alpha = rho / p.dot(z)
             r -= alpha*z
-            w = r / self.precond
+            w = self.applyPreconditioner(r)
             rhoOld = rho
             rho = r.dot(w)
             x += alpha*p
             beta = rho/rhoOld
-            err = numpy.linalg.norm(self.b - self.mat.dot(x))
+            # the recursively updated residual saves a matrix-vector product
+            err = numpy.linalg.norm(r)
             if self.verbose:
                 print('iteration {0} error = {1}'.format(k, err))
             k += 1
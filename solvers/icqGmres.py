@@ -0,0 +1,149 @@
+from __future__ import print_function
+import numpy
+from icqsol.solvers.icqPreconditionedSolver import PreconditionedSolver
+
+
+class Gmres(PreconditionedSolver):
+
+    def __init__(self, mat, b):
+        """
+        Constructor
+        @param mat dense, square matrix or any object with dot and
+                   diagonal methods, need not be symmetric
+        @param b right hand side vector
+        """
+        PreconditionedSolver.__init__(self, mat)
+        self.mat = mat
+        self.b = b
+        n = len(b)
+        self.maxNumIters = n
+        self.restart = min(n, 50)
+        self.tol = 1.e-10
+        self.verbose = False
+
+    def setTolerance(self, tol):
+        """
+        Set tolerance
+        @param tol tolerance
+        """
+        self.tol = tol
+
+    def setMaxNumberOfIterations(self, maxNumIters):
+        """
+        Set maximum number of iterations
+        @param maxNumIters  number of iterations
+        """
+        self.maxNumIters = maxNumIters
+
+    def setRestart(self, restart):
+        """
+        Set the number of iterations after which the Krylov basis is 
+        discarded
+        @param restart number of iterations
+        """
+        self.restart = restart
+
+    def setVerbosity(self, verbose):
+        """
+        Set verbosity
+        @param verbose True will print(out messages)
+        """
+        self.verbose = verbose
+
+    def solve(self, x0):
+        """
+        Solve linear system, restarted GMRES with right preconditioning
+        @param x0 initial guess for solution
+        @return solution, error, and number of iterations
+        """
+
+        x = x0.copy()
+        n = len(x)
+        m = self.restart
+        r = self.b - self.mat.dot(x)
+        err = numpy.linalg.norm(r)
+        k = 0
+        while abs(err) > self.tol and k < self.maxNumIters:
+
+            # Arnoldi basis, Hessenberg matrix and Givens rotations
+            v = numpy.zeros((m + 1, n), numpy.float64)
+            h = numpy.zeros((m + 1, m), numpy.float64)
+            cs = numpy.zeros((m,), numpy.float64)
+            sn = numpy.zeros((m,), numpy.float64)
+            g = numpy.zeros((m + 1,), numpy.float64)
+            v[0, :] = r / err
+            g[0] = err
+
+            for j in range(m):
+                w = self.mat.dot(self.applyPreconditioner(v[j, :]))
+                # modified Gram-Schmidt
+                for i in range(j + 1):
+                    h[i, j] = w.dot(v[i, :])
+                    w -= h[i, j] * v[i, :]
+                hNext = numpy.linalg.norm(w)
+                h[j + 1, j] = hNext
+                if hNext != 0:
+                    v[j + 1, :] = w / hNext
+
+                # apply the previous rotations to the new column
+                for i in range(j):
+                    hij = cs[i]*h[i, j] + sn[i]*h[i + 1, j]
+                    h[i + 1, j] = -sn[i]*h[i, j] + cs[i]*h[i + 1, j]
+                    h[i, j] = hij
+                # new rotation, eliminates h[j + 1, j]
+                rad = numpy.sqrt(h[j, j]**2 + h[j + 1, j]**2)
+                cs[j], sn[j] = 1.0, 0.0
+                if rad > 0:
+                    cs[j] = h[j, j] / rad
+                    sn[j] = h[j + 1, j] / rad
+                h[j, j] = rad
+                h[j + 1, j] = 0
+                g[j + 1] = -sn[j]*g[j]
+                g[j] *= cs[j]
+
+                # the residual norm of the least squares problem
+                err = abs(g[j + 1])
+                k += 1
+                if self.verbose:
+                    print('iteration {0} error = {1}'.format(k, err))
+                if err <= self.tol or k >= self.maxNumIters or hNext == 0:
+                    # converged or the Krylov space is invariant
+                    break
+
+            # update the solution
+            y = numpy.linalg.solve(h[:j + 1, :j + 1], g[:j + 1])
+            x += self.applyPreconditioner(v[:j + 1, :].T.dot(y))
+
+            r = self.b - self.mat.dot(x)
+            err = numpy.linalg.norm(r)
+
+        return x, err, k
+
+    def getSolutionError(self, vec):
+        """
+        Get the solution error
+        @param vec solution
+        @return error
+        """
+        return numpy.linalg.norm(self.b - self.mat.dot(vec))
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 200
+    mat = numpy.random.rand(n, n) + n*numpy.eye(n)
+    b = numpy.random.rand(n)
+    for restart in 5, 50:
+        gmres = Gmres(mat, b)
+        gmres.setRestart(restart)
+        x, err, numIters = gmres.solve(numpy.zeros((n,), numpy.float64))
+        error = numpy.linalg.norm(x - numpy.linalg.solve(mat, b))
+        print('restart = {0}: {1} iterations, residual {2} error {3}'.format(\
+            restart, numIters, err, error))
+        assert(error < 1.e-8)
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import numpy
+
+
+class LuSolver:
+
+    def __init__(self, mat, block_size=256):
+        """
+        Constructor, factor the matrix P.mat = L.U with partial pivoting
+        @param mat dense, square matrix
+        @param block_size number of columns of the panels of the
+                          factorization and size of the diagonal blocks
+                          used in the triangular solves
+        @note the factors are computed once, each call to solve then costs
+              O(n^2) operations per right hand side
+        """
+        self.shape = mat.shape
+        self.blockSize = block_size
+        n = self.shape[0]
+        # L (unit diagonal, not stored) and U overwrite the copy of mat
+        lu = numpy.array(mat, numpy.float64)
+        self.perm = numpy.arange(n)
+
+        self.blocks = []
+        for k0 in range(0, n, block_size):
+            k1 = min(k0 + block_size, n)
+            self.blocks.append((k0, k1))
+
+            # factor the panel, the row swaps apply to whole rows
+            for k in range(k0, k1):
+                p = k + numpy.argmax(numpy.fabs(lu[k:, k]))
+                if lu[p, k] == 0.:
+                    msg = 'ERROR: LU factorization failed, the matrix is singular!'
+                    raise RuntimeError(msg)
+                if p != k:
+                    lu[[k, p], :] = lu[[p, k], :]
+                    self.perm[[k, p]] = self.perm[[p, k]]
+                lu[k + 1:, k] /= lu[k, k]
+                lu[k + 1:, k + 1:k1] -= numpy.outer(lu[k + 1:, k], lu[k, k + 1:k1])
+
+            # rows of U right of the panel, then update the trailing matrix
+            lowerInv = numpy.linalg.inv(numpy.tril(lu[k0:k1, k0:k1], -1) + numpy.eye(k1 - k0))
+            lu[k0:k1, k1:] = lowerInv.dot(lu[k0:k1, k1:])
+            lu[k1:, k1:] -= lu[k1:, k0:k1].dot(lu[k0:k1, k1:])
+        self.lu = lu
+
+        # inverses of the diagonal blocks, the triangular solves then
+        # reduce to matrix-matrix products
+        self.lowerInvs = []
+        self.upperInvs = []
+        for k0, k1 in self.blocks:
+            block = lu[k0:k1, k0:k1]
+            self.lowerInvs.append(numpy.linalg.inv(numpy.tril(block, -1) + numpy.eye(k1 - k0)))
+            self.upperInvs.append(numpy.linalg.inv(numpy.triu(block)))
+
+    def solve(self, b):
+        """
+        Solve the linear system for one or several right hand sides
+        @param b right hand side vector or array of shape (n, nrhs)
+        @return solution, same shape as b
+        """
+        lu = self.lu
+        y = numpy.array(numpy.asarray(b, numpy.float64)[self.perm])
+
+        # forward substitution, L.y = P.b
+        for (k0, k1), lowerInv in zip(self.blocks, self.lowerInvs):
+            r = y[k0:k1] - lu[k0:k1, :k0].dot(y[:k0])
+            y[k0:k1] = lowerInv.dot(r)
+
+        # backward substitution, U.x = y
+        for (k0, k1), upperInv in reversed(list(zip(self.blocks, self.upperInvs))):
+            r = y[k0:k1] - lu[k0:k1, k1:].dot(y[k1:])
+            y[k0:k1] = upperInv.dot(r)
+
+        return y
+
+###############################################################################
+
+
+def testRandom():
+
+    numpy.random.seed(1234)
+    n = 500
+    # not symmetric, pivoting is required
+    mat = numpy.random.rand(n, n) - 0.5
+    mat[0, 0] = 0.
+
+    solver = LuSolver(mat, block_size=64)
+    b = numpy.random.rand(n)
+    error = numpy.linalg.norm(solver.solve(b) - numpy.linalg.solve(mat, b))
+    print('single right hand side error: {0}'.format(error))
+    assert(error < 1.e-8)
+
+    b = numpy.random.rand(n, 7)
+    error = numpy.linalg.norm(solver.solve(b) - numpy.linalg.solve(mat, b))
+    print('multiple right hand side error: {0}'.format(error))
+    assert(error < 1.e-8)
+
+    try:
+        LuSolver(numpy.zeros((3, 3)))
+        assert(False)
+    except RuntimeError as err:
+        print(err)
+
+if __name__ == '__main__':
+    testRandom()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import numpy
+
+
+class PreconditionedSolver:
+
+    def __init__(self, mat):
+        """
+        Constructor, the iterative solvers start with the diagonal
+        preconditioner
+        @param mat dense, square matrix or any object with a diagonal method
+        """
+        self.precond = numpy.array(mat.diagonal())
+        self.precondOp = None
+
+    def setDiagonalPreconditioner(self, precond):
+        """
+        Set the diagonal preconditioner
+        @param precond preconditioner
+        """
+        self.precond = precond
+
+    def setPreconditioner(self, precond):
+        """
+        Set a preconditioner, replaces the diagonal preconditioner
+        @param precond object whose solve method applies an approximate
+                       inverse of the matrix to a vector
+        """
+        self.precondOp = precond
+
+    def applyPreconditioner(self, vec):
+        """
+        Apply the preconditioner
+        @param vec vector
+        @return approximate solution of mat.x = vec
+        """
+        if self.precondOp is not None:
+            return self.precondOp.solve(vec)
+        return vec / self.precond
+
+###############################################################################
+
+
+def testDiagonalAndOperator():
+
+    class Exact:
+        def __init__(self, mat):
+            self.mat = mat
+        def solve(self, vec):
+            return numpy.linalg.solve(self.mat, vec)
+
+    numpy.random.seed(1234)
+    n = 10
+    mat = numpy.random.rand(n, n) + n*numpy.eye(n)
+    vec = numpy.random.rand(n)
+    solver = PreconditionedSolver(mat)
+    assert(numpy.allclose(solver.applyPreconditioner(vec), vec / mat.diagonal()))
+    solver.setPreconditioner(Exact(mat))
+    assert(numpy.allclose(mat.dot(solver.applyPreconditioner(vec)), vec))
+
+if __name__ == '__main__':
+    testDiagonalAndOperator()
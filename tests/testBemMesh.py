@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Laplace and Poisson solvers sharing the refined surface and the
+assembled Green matrix
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqBemMesh import BemMesh
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqPoissonSolver import PoissonSolver
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+# the surface is triangulated once
+mesh = BemMesh(pdata, max_edge_length=float('inf'))
+
+for storage in 'dense', 'packed':
+    lslv = LaplaceSolver(mesh, max_edge_length=None, storage=storage)
+    lslv.setSourceFromExpression('1.0 + x*y')
+    src = lslv.getSourceArray(lslv.getSourceArrayIndex())
+    lslv.computeResponseField()
+
+    # the Green operator assembled by the Laplace solver is reused
+    pslv = PoissonSolver(mesh, max_edge_length=None, storage=storage)
+    assert(pslv.getGreenOperator() is lslv.getGreenOperator())
+    pot = pslv.computeResponseField(lslv.getSurfaceDensity())
+    error = numpy.linalg.norm(pot - src) / numpy.linalg.norm(src)
+    print('{0}: potential error {1}'.format(storage, error))
+    assert(error < 1.e-10)
+
+    # the fields of the solvers are kept apart
+    assert(pslv.getVtkPolyData().GetCellData().GetArray(lslv.responseName) is None)
+    assert(mesh.getVtkPolyData().GetCellData().GetArray(lslv.sourceName) is None)
+
+# other assembly parameters, new operator
+lslv2 = LaplaceSolver(mesh, max_edge_length=None, quadrature_tol=1.e-8)
+assert(lslv2.getGreenOperator() is not lslv.getGreenOperator())
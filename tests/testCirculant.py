@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""
+Block circulant storage of the Green matrix of a sphere, made of n_theta
+identical slices about the y axis
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqBemMesh import BemMesh
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import GALERKIN, COLLOCATION
+from icqsol import util
+
+nTheta = 16
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=nTheta,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+mesh = BemMesh(pdata, max_edge_length=float('inf'))
+n = mesh.numTriangles
+
+numpy.random.seed(1234)
+x = numpy.random.rand(n)
+src = numpy.ones((n,))
+
+# the point coordinates are single precision, the mesh is symmetric up
+# to rounding errors
+for method, storage in (GALERKIN, 'packed'), (COLLOCATION, 'stream'):
+    slv = LaplaceSolver(mesh, max_edge_length=None, method=method,
+                        storage='circulant', num_sectors=nTheta)
+    ref = LaplaceSolver(mesh, max_edge_length=None, method=method,
+                        storage=storage, solver='gmres', tol=1.e-12)
+
+    gOp = slv.getGreenOperator()
+    y = gOp.dot(x)
+    yRef = ref.getGreenOperator().dot(x)
+    error = numpy.linalg.norm(y - yRef) / numpy.linalg.norm(yRef)
+    print('{0}: error of the block circulant product {1}'.format(method, error))
+    assert(error < 1.e-6)
+
+    error = numpy.linalg.norm(gOp.diagonal() - ref.getGreenOperator().diagonal())
+    assert(error < 1.e-6 * numpy.linalg.norm(gOp.diagonal()))
+
+    rsp = slv.computeResponseField(src)
+    rspRef = ref.computeResponseField(src)
+    error = numpy.linalg.norm(rsp - rspRef) / numpy.linalg.norm(rspRef)
+    print('{0}: error of the FFT solve {1}'.format(method, error))
+    assert(error < 1.e-4)
+
+# the symmetry is checked
+try:
+    LaplaceSolver(mesh, max_edge_length=None, storage='circulant',
+                  num_sectors=2*nTheta).assemble()
+    assert(False)
+except RuntimeError as err:
+    print(err)
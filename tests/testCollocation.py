@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""
+Collocation and Galerkin solutions of a sphere held at a constant potential
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqBemMesh import BemMesh
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import GALERKIN, COLLOCATION
+from icqsol import util
+
+radius = 2.0
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=radius,
+                          n_theta=24,
+                          n_phi=12)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+mesh = BemMesh(pdata, max_edge_length=float('inf'))
+
+# the jump of the normal electric field is 1/radius
+exact = 1.0 / radius
+rsps = {}
+for method in GALERKIN, COLLOCATION:
+    for storage in 'dense', 'stream':
+        slv = LaplaceSolver(mesh, max_edge_length=None, method=method, storage=storage)
+        rsp = slv.computeResponseField(numpy.ones((slv.numTriangles,)))
+        error = abs(rsp.dot(slv.areas) / slv.areas.sum() - exact) / exact
+        print('{0} {1}: relative error of the average response {2}'.format(method, storage, error))
+        assert(error < 0.02)
+        rsps[method, storage] = rsp
+
+# same collocation matrix, assembled or applied on the fly
+error = numpy.linalg.norm(rsps[COLLOCATION, 'stream'] - rsps[COLLOCATION, 'dense'])
+assert(error < 1.e-6 * numpy.linalg.norm(rsps[COLLOCATION, 'dense']))
+
+# the collocation matrix is not compatible with the symmetric storage
+try:
+    LaplaceSolver(mesh, max_edge_length=None, method=COLLOCATION, storage='packed')
+    assert(False)
+except RuntimeError as err:
+    print(err)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""
+Compare the dense Green matrices assembled by one and by several processes
+"""
+
+from __future__ import print_function
+import os
+import glob
+import sys
+import shutil
+import socket
+import subprocess
+import tempfile
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqDistributedAssembly import FileCoordinator, runWorker
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+gMat = LaplaceSolver(pdata, max_edge_length=float('inf')).getGreenMatrix()
+
+# local pool of processes
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'), num_procs=3)
+error = numpy.fabs(numpy.asarray(slv.getGreenMatrix()) - gMat).max()
+print('pool assembly error: {0}'.format(error))
+assert(error < 1.e-14)
+
+# job directory, workers on other hosts could join
+jobDir = tempfile.mkdtemp()
+try:
+    # left over by an earlier job, the claim belongs to a dead process
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    open(os.path.join(jobDir, 'block_0000000000_0000000003.todo'), 'w').close()
+    open(os.path.join(jobDir, 'block_0000000003_0000000005.running.{0}.{1}'.format(
+        socket.gethostname(), dead.pid)), 'w').close()
+    slv = LaplaceSolver(pdata, max_edge_length=float('inf'), num_procs=2,
+                        job_dir=jobDir, job_timeout=600.)
+    error = numpy.fabs(numpy.asarray(slv.getGreenMatrix()) - gMat).max()
+    print('job directory assembly error: {0}'.format(error))
+    assert(error < 1.e-14)
+    # all the tasks were consumed
+    assert(not [f for f in os.listdir(jobDir) if f.startswith('block_')])
+
+    # a task claimed by a worker that crashed is put back in the queue
+    coordinator = FileCoordinator(jobDir)
+    coordinator.submit(slv.getPoints(), slv.getCells(), slv.areas, numBlocks=2)
+    todo = sorted(glob.glob(os.path.join(jobDir, 'block_*.todo')))[0]
+    os.rename(todo, todo[:-5] + '.running.{0}.{1}'.format(socket.gethostname(), dead.pid))
+    assert(coordinator.requeueStaleTasks() == 1)
+    assert(runWorker(jobDir) == 2)
+finally:
+    shutil.rmtree(jobDir)
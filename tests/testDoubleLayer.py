@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+"""
+Single and double layer matrices assembled in the same pass
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=32,
+                          n_phi=16)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+gMat = LaplaceSolver(pdata, max_edge_length=float('inf')).getGreenMatrix()
+
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'), double_layer=True)
+error = numpy.fabs(slv.getGreenMatrix() - gMat).max()
+print('single layer error: {0}'.format(error))
+assert(error < 1.e-14)
+
+# Gauss: the double layer potential of a unit density is 1/2 on a closed
+# surface (-1/2 if the triangles are oriented inwards)
+kMat = slv.getDoubleLayerMatrix()
+rowSums = numpy.fabs(kMat.sum(axis=1))
+print('double layer row sums min/max: {0}/{1}'.format(rowSums.min(), rowSums.max()))
+assert(numpy.fabs(rowSums - 0.5).max() < 0.05)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""
+Compare the FMM and dense Laplace/Poisson solvers on a sphere
+"""
+
+from __future__ import print_function
+import argparse
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqPoissonSolver import PoissonSolver
+from icqsol.bem.icqBaseLaplaceSolver import DENSE, FMM
+from icqsol import util
+
+description = 'Compare the FMM and dense solvers on a sphere'
+parser = argparse.ArgumentParser(description=description)
+
+parser.add_argument('--n_theta', dest='n_theta', default=32, type=int,
+                    help='Number of longitude sections')
+
+parser.add_argument('--n_phi', dest='n_phi', default=16, type=int,
+                    help='Number of latitude sections')
+
+parser.add_argument('--theta', dest='theta', default=0.5, type=float,
+                    help='FMM opening parameter')
+
+args = parser.parse_args()
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=args.n_theta,
+                          n_phi=args.n_phi)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+# Poisson, potential from a charge
+rsps = {}
+for storage in DENSE, FMM:
+    slv = PoissonSolver(pdata, max_edge_length=float('inf'),
+                        storage=storage, fmm_theta=args.theta)
+    slv.setSourceFromExpression('1.0 + x*y')
+    rsps[storage] = slv.computeResponseField()
+error = numpy.linalg.norm(rsps[FMM] - rsps[DENSE]) / numpy.linalg.norm(rsps[DENSE])
+print('Poisson FMM relative error: {0}'.format(error))
+assert(error < 1.e-2)
+
+# Laplace, normal electric field from a potential
+rsps = {}
+for storage in DENSE, FMM:
+    slv = LaplaceSolver(pdata, max_edge_length=float('inf'),
+                        storage=storage, fmm_theta=args.theta)
+    slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+    rsps[storage] = slv.computeResponseField()
+error = numpy.linalg.norm(rsps[FMM] - rsps[DENSE]) / numpy.linalg.norm(rsps[DENSE])
+print('Laplace FMM relative error: {0}'.format(error))
+assert(error < 5.e-2)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+"""
+Compare the iterative and direct Laplace solvers on a sphere
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver, DIRECT, CG, GMRES, BICGSTAB
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+rsps = {}
+for solver in DIRECT, CG, GMRES, BICGSTAB:
+    slv = LaplaceSolver(pdata, max_edge_length=float('inf'),
+                        solver=solver, tol=1.e-10)
+    slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+    rsps[solver] = slv.computeResponseField()
+    print('{0}: {1} iterations'.format(solver, slv.numIterations))
+
+    if solver != DIRECT:
+        error = numpy.linalg.norm(rsps[solver] - rsps[DIRECT]) / numpy.linalg.norm(rsps[DIRECT])
+        print('{0} relative error: {1}'.format(solver, error))
+        assert(error < 1.e-8)
+
+        # starting from the solution takes no iteration
+        slv.computeResponseField(x0=rsps[DIRECT])
+        print('{0}: {1} iterations from the exact solution'.format(solver, slv.numIterations))
+        assert(slv.numIterations <= 1)
+
+# the direct solver falls back to LU if -A.G is not positive definite
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'), solver=DIRECT)
+slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+gMat = slv.getGreenMatrix()
+gMat[0, 0] *= -1.
+rsp = slv.computeResponseField()
+error = numpy.linalg.norm(rsp + numpy.linalg.solve(gMat, slv.getSourceArray(slv.getSourceArrayIndex())))
+print('error of the LU fallback: {0}'.format(error))
+assert(error < 1.e-8 * numpy.linalg.norm(rsp))
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+Solve Laplace equation on sphere for a time dependent potential, all
+time points at once
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+# one component per time point
+timePoints = [0.0, 0.5, 1.0]
+pdata = shape_mgr.addSurfaceFieldFromExpressionToVtkPolyData(pdata, 'v',
+                                                             '(1.0 + t)/sqrt(x**2 + y**2 + (z - 3.)**2)',
+                                                             timePoints)
+
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'))
+slv.setSourceFieldName('v')
+en = slv.computeResponseField()
+print('response shape: {0}'.format(en.shape))
+assert(en.shape == (slv.numTriangles, len(timePoints)))
+
+# the response array has one component per time point
+rspArray = slv.getVtkPolyData().GetCellData().GetArray(slv.responseName)
+assert(rspArray.GetNumberOfComponents() == len(timePoints))
+
+# the response is linear in the source
+for j in range(len(timePoints)):
+    error = numpy.linalg.norm(en[:, j] - (1.0 + timePoints[j])*en[:, 0])
+    print('time point {0} error: {1}'.format(timePoints[j], error))
+    assert(error < 1.e-10 * numpy.linalg.norm(en[:, j]))
+
+# solving for a single component reuses the factorization
+src = slv.getSourceArray(slv.getSourceArrayIndex())
+en1 = slv.computeResponseField(src[:, 1])
+error = numpy.linalg.norm(en1 - en[:, 1])
+print('single component error: {0}'.format(error))
+assert(error < 1.e-10 * numpy.linalg.norm(en1))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+"""
+The Green operator is assembled on first use, or by assemble()
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+# construction only triangulates the surface
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'))
+slv.setSourceFromExpression('1.0 + x*y')
+assert(slv.getVtkPolyData().GetNumberOfPolys() == slv.numTriangles)
+assert(not slv.isAssembled())
+
+# assembled by the first solve
+rsp = slv.computeResponseField()
+assert(slv.isAssembled())
+
+# explicit assembly gives the same response
+slv2 = LaplaceSolver(pdata, max_edge_length=float('inf'))
+slv2.setSourceFromExpression('1.0 + x*y')
+slv2.assemble()
+assert(slv2.isAssembled())
+error = numpy.linalg.norm(slv2.computeResponseField() - rsp)
+print('difference between lazy and explicit assembly: {0}'.format(error))
+assert(error == 0.)
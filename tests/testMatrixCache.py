@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+"""
+Check that a cached Green matrix is reused by a second solver
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import DENSE, PACKED
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+cacheDir = tempfile.mkdtemp()
+try:
+    for storage in DENSE, PACKED:
+        rsps = []
+        for i in range(2):
+            slv = LaplaceSolver(pdata, max_edge_length=float('inf'),
+                                storage=storage, cache_dir=cacheDir)
+            slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+            rsps.append(slv.computeResponseField())
+        error = numpy.linalg.norm(rsps[1] - rsps[0])
+        print('{0}: difference between assembled and cached {1}'.format(storage, error))
+        assert(error == 0.)
+    # one file per storage
+    assert(len(os.listdir(cacheDir)) == 2)
+    # the cached dense matrix is memory-mapped
+    slv = LaplaceSolver(pdata, max_edge_length=float('inf'), cache_dir=cacheDir)
+    assert(isinstance(slv.getGreenMatrix(), numpy.memmap))
+finally:
+    shutil.rmtree(cacheDir)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+Mirror symmetric storage of the Green matrix of a sphere, cut by the planes
+through its centroid normal to x and z and rebuilt from the reflections
+of a quarter
+"""
+
+from __future__ import print_function
+import numpy
+from vtk.util import numpy_support
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqBemMesh import BemMesh
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import GALERKIN, COLLOCATION
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0.1, 0.2, 0.3),
+                          radius=1.0,
+                          n_theta=12,
+                          n_phi=7)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+mesh = BemMesh(pdata, max_edge_length=float('inf'), mirror_planes=['x', 'z'])
+n = mesh.numTriangles
+m = mesh.numFundamentalTriangles
+assert(n == 4 * m)
+
+# the surface is preserved
+area = BemMesh(pdata, max_edge_length=float('inf')).getAreas().sum()
+error = abs(mesh.getAreas().sum() - area) / area
+print('error of the area of the reflected surface {0}'.format(error))
+assert(error < 1.e-6)
+
+numpy.random.seed(1234)
+x = numpy.random.rand(n)
+for method in GALERKIN, COLLOCATION:
+    slv = LaplaceSolver(mesh, max_edge_length=None, method=method,
+                        storage='mirror')
+    ref = LaplaceSolver(mesh, max_edge_length=None, method=method,
+                        storage='stream', solver='gmres', tol=1.e-12)
+
+    gOp = slv.getGreenOperator()
+    y = gOp.dot(x)
+    yRef = ref.getGreenOperator().dot(x)
+    error = numpy.linalg.norm(y - yRef) / numpy.linalg.norm(yRef)
+    print('{0}: error of the mirror symmetric product {1}'.format(method, error))
+    assert(error < 1.e-12)
+
+    error = numpy.linalg.norm(gOp.diagonal() - ref.getGreenOperator().diagonal())
+    assert(error < 1.e-12 * numpy.linalg.norm(gOp.diagonal()))
+
+    # symmetric source, a single parity block is inverted
+    for src in numpy.ones((n,)), x:
+        rsp = slv.computeResponseField(src)
+        rspRef = ref.computeResponseField(src)
+        error = numpy.linalg.norm(rsp - rspRef) / numpy.linalg.norm(rspRef)
+        print('{0}: error of the parity solve {1}'.format(method, error))
+        assert(error < 1.e-8)
+
+# source from a point field of the polydata, y is symmetric about the
+# planes and linear, its projection onto the triangles is exact
+points = numpy_support.vtk_to_numpy(pdata.GetPoints().GetData())
+v = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(points[:, 1], numpy.float64), deep=1)
+v.SetName('v')
+pdata.GetPointData().AddArray(v)
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'), storage='mirror',
+                    mirror_planes=['x', 'z'])
+rsp = slv.computeResponseField()
+rspRef = slv.computeResponseField(slv.mesh.getCenters()[:, 1])
+error = numpy.linalg.norm(rsp - rspRef) / numpy.linalg.norm(rspRef)
+print('error of the solve from the point field {0}'.format(error))
+assert(error < 1.e-10)
+
+# the surface is not symmetric about planes away from its center
+try:
+    BemMesh(pdata, max_edge_length=float('inf'), mirror_planes=['x'],
+            mirror_center=(0.3, 0.2, 0.3))
+    assert(False)
+except RuntimeError as err:
+    print(err)
+
+# the mirror planes are required
+try:
+    LaplaceSolver(pdata, max_edge_length=float('inf'), storage='mirror')
+    assert(False)
+except RuntimeError as err:
+    print(err)
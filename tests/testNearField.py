@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+"""
+Influence matrix elements of two triangles sharing an edge or a vertex, 
+over which the kernel is nearly singular. The elements are compared with a
+reference computed from the closed form integral of 1/R over a triangle 
+seen from a point in its plane, the observer triangle being subdivided
+"""
+
+from __future__ import print_function
+import vtk
+import numpy
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqBaseLaplaceSolver import GALERKIN, COLLOCATION
+from icqsol.bem.icqQuadrature import gaussPtsAndWeights
+
+NUM_SUBDIVISIONS = 32
+
+
+def integralOneOverR(p, xa, xb, xc):
+    """
+    Integral of 1/|p - y| over a triangle, p being in the plane of the
+    triangle: sum over the edges of t*log((r1 + s1)/(r0 + s0)), t being 
+    the distance of p to the line of the edge, positive inside, and s0, s1
+    the coordinates of the edge end points along the edge
+    """
+    normal = numpy.cross(xb - xa, xc - xa)
+    normal /= numpy.linalg.norm(normal)
+    res = numpy.zeros(p.shape[:-1], numpy.float64)
+    for x0, x1 in (xa, xb), (xb, xc), (xc, xa):
+        edge = (x1 - x0) / numpy.linalg.norm(x1 - x0)
+        t = (x0 - p).dot(numpy.cross(edge, normal))
+        s0 = (x0 - p).dot(edge)
+        s1 = (x1 - p).dot(edge)
+        r0 = numpy.sqrt(((x0 - p)**2).sum(axis=-1))
+        r1 = numpy.sqrt(((x1 - p)**2).sum(axis=-1))
+        # same value without cancellation when the edge is behind p
+        f = numpy.where(s0 + s1 >= 0.,
+                        numpy.log(numpy.maximum(r1 + s1, 1.e-300) / numpy.maximum(r0 + s0, 1.e-300)),
+                        numpy.log(numpy.maximum(r0 - s0, 1.e-300) / numpy.maximum(r1 - s1, 1.e-300)))
+        res += numpy.where(numpy.fabs(t) > 1.e-14, t * f, 0.)
+    return res
+
+
+def subdivide(xa, xb, xc, n):
+    """
+    Split a triangle into n*n triangles
+    """
+    res = []
+    def point(i, j):
+        return xa + (xb - xa)*i/float(n) + (xc - xa)*j/float(n)
+    for i in range(n):
+        for j in range(n - i):
+            res.append((point(i, j), point(i + 1, j), point(i, j + 1)))
+            if i + j < n - 1:
+                res.append((point(i + 1, j), point(i + 1, j + 1), point(i, j + 1)))
+    return res
+
+
+def createPolyData(pts, cells):
+    """
+    Polydata of triangles
+    """
+    points = vtk.vtkPoints()
+    points.SetDataTypeToDouble()
+    points.SetNumberOfPoints(len(pts))
+    for i in range(len(pts)):
+        points.SetPoint(i, pts[i])
+    pdata = vtk.vtkPolyData()
+    pdata.SetPoints(points)
+    pdata.Allocate(len(cells), 1)
+    ptIds = vtk.vtkIdList()
+    ptIds.SetNumberOfIds(3)
+    for cell in cells:
+        for j in range(3):
+            ptIds.SetId(j, cell[j])
+        pdata.InsertNextCell(vtk.VTK_POLYGON, ptIds)
+    return pdata
+
+
+def checkPair(name, pts, cells):
+    """
+    Compare the elements of a pair of triangles with the reference
+    """
+    pdata = createPolyData(pts, cells)
+    obsIds = numpy.array([0, 1], numpy.int32)
+    srcIds = numpy.array([1, 0], numpy.int32)
+    tris = [pts[list(cell), :] for cell in cells]
+    c = -1.0 / (4. * numpy.pi)
+
+    # collocation, the observer is the centroid of the other triangle
+    slv = LaplaceSolver(pdata, max_edge_length=1000., method=COLLOCATION, storage='stream')
+    vals = slv.getGreenMatrixElements(obsIds, srcIds)
+    for k in range(2):
+        center = tris[obsIds[k]].mean(axis=0)
+        exact = c * integralOneOverR(center, *tris[srcIds[k]])
+        error = abs(vals[k] - exact) / abs(exact)
+        print('{0}, collocation element {1}: {2} reference: {3} error: {4}'.format(
+            name, k, vals[k], exact, error))
+        assert(error < 1.e-8)
+
+    # Galerkin, the observer triangle is split into small triangles with
+    # Gauss points
+    xsi, eta, wgh = gaussPtsAndWeights[8]
+    slv = LaplaceSolver(pdata, max_edge_length=1000., method=GALERKIN, storage='stream')
+    vals = slv.getGreenMatrixElements(obsIds, srcIds)
+    for k in range(2):
+        obs = tris[obsIds[k]]
+        subTris = subdivide(obs[0], obs[1], obs[2], NUM_SUBDIVISIONS)
+        p = numpy.concatenate([xa + numpy.outer(xsi, xb - xa) + numpy.outer(eta, xc - xa)
+                               for xa, xb, xc in subTris])
+        exact = c * numpy.tile(wgh, len(subTris)).dot(integralOneOverR(p, *tris[srcIds[k]]))
+        exact /= len(subTris)
+        error = abs(vals[k] - exact) / abs(exact)
+        print('{0}, Galerkin element {1}: {2} reference: {3} error: {4}'.format(
+            name, k, vals[k], exact, error))
+        assert(error < 1.e-6)
+
+
+# two coplanar triangles sharing the edge (1, 3)
+checkPair('shared edge',
+          numpy.array([[0., 0., 0.], [1., 0., 0.], [1., 1., 0.], [0., 1., 0.]]),
+          [(0, 1, 3), (1, 2, 3)])
+
+# two coplanar equilateral triangles sharing the vertex 0, the centroids 
+# are further apart than the edge length
+h = numpy.sqrt(3.) / 2.
+checkPair('shared vertex',
+          numpy.array([[0., 0., 0.], [1., 0., 0.], [0.5, h, 0.], [-1., 0., 0.], [-0.5, -h, 0.]]),
+          [(0, 1, 2), (0, 3, 4)])
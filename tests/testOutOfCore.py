@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+
+"""
+Compare the out-of-core and dense solvers on a sphere
+"""
+
+from __future__ import print_function
+import os
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol.bem.icqPoissonSolver import PoissonSolver
+from icqsol.bem.icqBaseLaplaceSolver import DENSE, OUT_OF_CORE
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+# Poisson, potential from a charge
+rsps = {}
+for storage in DENSE, OUT_OF_CORE:
+    slv = PoissonSolver(pdata, max_edge_length=float('inf'),
+                        storage=storage, tile_size=64)
+    slv.setSourceFromExpression('1.0 + x*y')
+    rsps[storage] = slv.computeResponseField()
+error = numpy.linalg.norm(rsps[OUT_OF_CORE] - rsps[DENSE]) / numpy.linalg.norm(rsps[DENSE])
+print('Poisson out-of-core relative error: {0}'.format(error))
+assert(error < 1.e-12)
+
+# the memory-mapped file is removed with the matrix
+fileName = slv.getGreenOperator().getFileName()
+assert(os.path.exists(fileName))
+slv.getGreenOperator().close()
+assert(not os.path.exists(fileName))
+
+# Laplace, iterative solve
+rsps = {}
+for storage in DENSE, OUT_OF_CORE:
+    slv = LaplaceSolver(pdata, max_edge_length=float('inf'),
+                        storage=storage, tile_size=64)
+    slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+    rsps[storage] = slv.computeResponseField()
+error = numpy.linalg.norm(rsps[OUT_OF_CORE] - rsps[DENSE]) / numpy.linalg.norm(rsps[DENSE])
+print('Laplace out-of-core relative error: {0}'.format(error))
+assert(error < 1.e-8)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Potential and electric field of a sphere held at a constant potential,
+evaluated on a probe grid outside the sphere
+"""
+
+from __future__ import print_function
+import vtk
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=32,
+                          n_phi=16)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+slv = LaplaceSolver(pdata, max_edge_length=float('inf'))
+slv.setSourceFromExpression('1.0')
+slv.computeResponseField()
+
+# outside the sphere the potential is 1/r and the field r/r^3
+points = numpy.array([[0., 0., 2.], [1.5, 1.5, 0.], [0., 3., 0.], [-2., 1., 1.]])
+radii = numpy.sqrt((points**2).sum(axis=1))
+for theta in 0., 0.5:
+    potential, gradient = slv.computePotentialAndGradient(points, tree_theta=theta)
+    error = numpy.fabs(potential - 1./radii).max()
+    print('theta = {0} potential error: {1}'.format(theta, error))
+    assert(error < 0.01)
+    error = numpy.fabs(- gradient - points / radii[:, numpy.newaxis]**3).max()
+    print('theta = {0} field error: {1}'.format(theta, error))
+    assert(error < 0.01)
+
+# probe grid
+grid = vtk.vtkImageData()
+grid.SetDimensions(5, 5, 5)
+grid.SetOrigin(-4., -4., -4.)
+grid.SetSpacing(2., 2., 2.)
+slv.computeFieldOnGrid(grid, tree_theta=0.5)
+potentialArray = grid.GetPointData().GetArray('potential')
+fieldArray = grid.GetPointData().GetArray('electric_field')
+assert(fieldArray.GetNumberOfComponents() == 3)
+for i in range(grid.GetNumberOfPoints()):
+    r = numpy.sqrt(numpy.dot(grid.GetPoint(i), grid.GetPoint(i)))
+    if r > 1.5:
+        assert(abs(potentialArray.GetTuple(i)[0] - 1./r) < 0.01)
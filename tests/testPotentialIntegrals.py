@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
-from icqsol.bem.icqPotentialIntegrals import PotentialIntegrals
-from icqsol.bem.icqLaplaceMatrices import getFullyQualifiedSharedLibraryName
+from icqsol.bem.icqPotentialIntegrals import PotentialIntegrals, getIntegralsOneOverR
+from icqsol.util.icqSharedLibraryUtils import getSharedLibraryName
 import numpy
 
 def testObserverOnA(order):
@@ -34,48 +34,44 @@ def testObserverOnC(order):
     print('testObserverOnC: order = {0} integral = {1} exact = {2} error = {3}'.format(\
         order, integral, exact, integral - exact))
 
+def testBatch(order):
+    xObs = numpy.array([[0., 0., 0.], [0.2, 0.3, 0.], [0.1, 0.1, 0.5]])
+    pbSrc = numpy.array([1., 0., 0.])
+    pcSrc = numpy.array([0., 1., 0.])
+    integrals = getIntegralsOneOverR(xObs, pbSrc, pcSrc, order)
+    for i in range(xObs.shape[0]):
+        integral = PotentialIntegrals(xObs[i, :], pbSrc, pcSrc, order).getIntegralOneOverR()
+        assert(abs(integrals[i] - integral) < 1.e-12)
+    print('testBatch: order = {0} integrals = {1}'.format(order, integrals))
+
 def testOffDiagonal2Triangles():
-    import vtk
-    import sys
-    import pkg_resources
-    PY_MAJOR_VERSION = sys.version_info[0]
-    from ctypes import cdll, c_long, POINTER, c_double
+    from ctypes import cdll, c_long, c_int, POINTER, c_double
 
-    pdata = vtk.vtkPolyData()
-    points = vtk.vtkPoints()
-    points.SetNumberOfPoints(4)
-    points.SetPoint(0, (0., 0., 0.))
-    points.SetPoint(1, (1., 0., 0.))
-    points.SetPoint(2, (1., 1., 0.))
-    points.SetPoint(3, (0., 1., 0.))
-    pdata.SetPoints(points)
-    pdata.Allocate(2, 1)
-    ptIds = vtk.vtkIdList()
-    ptIds.SetNumberOfIds(3)
-    ptIds.SetId(0, 0); ptIds.SetId(1, 1); ptIds.SetId(2, 3)
-    pdata.InsertNextCell(vtk.VTK_POLYGON, ptIds)
-    ptIds.SetId(0, 1); ptIds.SetId(1, 2); ptIds.SetId(2, 3)
-    pdata.InsertNextCell(vtk.VTK_POLYGON, ptIds)
-    addr = int(pdata.GetAddressAsString('vtkPolyData')[5:], 0)
+    # unit square split into two triangles
+    points = numpy.array([[0., 0., 0.], [1., 0., 0.], [1., 1., 0.], [0., 1., 0.]])
+    cells = numpy.array([[0, 1, 3], [1, 2, 3]], numpy.int32)
     gMat = numpy.zeros((2,2), numpy.float64)
-    if PY_MAJOR_VERSION < 3:
-        fullyQualifiedLibName = pkg_resources.resource_filename('icqsol', 'icqLaplaceMatricesCpp.so')
-    else:
-        libName = pkg_resources.resource_filename('icqsol', 'icqLaplaceMatricesCpp')
-        fullyQualifiedLibName = getFullyQualifiedSharedLibraryName(libName)
-    lib = cdll.LoadLibrary(fullyQualifiedLibName)
-    lib.computeOffDiagonalTerms(c_long(addr),
-                                gMat.ctypes.data_as(POINTER(c_double)))
-    exact = numpy.array([[0, -0.07635909342383773],[-0.07635909342383773, 0]])
+    lib = cdll.LoadLibrary(getSharedLibraryName('icqLaplaceMatricesCpp'))
+    lib.computeOffDiagonalTerms(points.ctypes.data_as(POINTER(c_double)),
+                                cells.ctypes.data_as(POINTER(c_int)),
+                                c_long(2),
+                                gMat.ctypes.data_as(POINTER(c_double)),
+                                c_int(0), c_double(0.))
+    # both triangles are integrated over, the reference is the converged
+    # value of the subdivided observer triangle (see testNearField)
+    exact = numpy.array([[0, -0.07695761],[-0.07695761, 0]])
+    error = numpy.fabs(gMat - exact).max() / 0.07695761
     print(gMat)
     print(exact)
-    print('error: {0}'.format(gMat - exact))
+    print('error: {0}'.format(error))
+    assert(error < 1.e-7)
 
 if __name__ == '__main__':
     for order in range(1, 6):
         testObserverOnA(order)
         testObserverOnB(order)
         testObserverOnC(order)
+        testBatch(order)
         print('-'*80)
     testOffDiagonal2Triangles()
 
@@ -1,5 +1,5 @@
 from __future__ import print_function
-from ctypes import cdll, POINTER, byref, c_void_p, c_double
+from ctypes import cdll, POINTER, byref, c_void_p, c_double, c_long
 import numpy
 import pkg_resources
 from icqsol.bem.icqQuadrature import triangleQuadrature
@@ -52,5 +52,19 @@ for order in range(1, maxOrder + 1):
     print('order = ', order, ' integral = ', integral, ' integral2 = ', integral2)
     assert(abs(integral - integral2) < 1.e-10)
 
+# Batched kernel evaluation
+numObs, numSrc = 5, 7
+pObs = numpy.random.rand(numObs, 3)
+pSrc = numpy.random.rand(numSrc, 3) + 2.
+vals = numpy.zeros((numObs, numSrc), numpy.float64)
+lib.icqQuadratureEvaluateKernelBlock(byref(handle), 
+                                     c_long(numObs), pObs.ctypes.data_as(POINTER(c_double)),
+                                     c_long(numSrc), pSrc.ctypes.data_as(POINTER(c_double)),
+                                     vals.ctypes.data_as(POINTER(c_double)))
+for i in range(numObs):
+    for j in range(numSrc):
+        assert(abs(vals[i, j] - func(pSrc[j, :] - pObs[i, :])) < 1.e-12)
+print('kernel block OK')
+
 # Destructor
 lib.icqQuadratureDel(byref(handle))
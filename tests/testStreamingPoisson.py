@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+
+"""
+Compare the streaming (matrix-free) and dense Poisson solvers on a sphere
+"""
+
+from __future__ import print_function
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqPoissonSolver import PoissonSolver
+from icqsol.bem.icqBaseLaplaceSolver import DENSE, STREAM
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+s = shape_mgr.createShape('sphere',
+                          origin=(0., 0., 0.),
+                          radius=1.0,
+                          n_theta=16,
+                          n_phi=8)
+pdata = shape_mgr.shapeToVTKPolyData(s)
+
+rsps = {}
+for storage in DENSE, STREAM:
+    slv = PoissonSolver(pdata, max_edge_length=float('inf'), storage=storage)
+    slv.setSourceFromExpression('1.0 + x*y')
+    src = slv.getSourceArray(slv.getSourceArrayIndex())
+    # several charge distributions at once
+    rsps[storage] = slv.computeResponseField(numpy.array([src, 2*src - 1.]).T)
+error = numpy.linalg.norm(rsps[STREAM] - rsps[DENSE]) / numpy.linalg.norm(rsps[DENSE])
+print('Poisson streaming relative error: {0}'.format(error))
+assert(error < 1.e-12)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+Iterative Laplace solves on a sphere with the two-level preconditioner. The
+fine meshes split each triangle of the coarse meshes into 4, the number of
+iterations should not grow as both meshes are refined
+"""
+
+from __future__ import print_function
+import vtk
+import numpy
+from icqsol.shapes.icqShapeManager import ShapeManager
+from icqsol.bem.icqLaplaceSolver import LaplaceSolver, CG, GMRES, DIAGONAL, TWO_LEVEL
+from icqsol.bem.icqBaseLaplaceSolver import GALERKIN, COLLOCATION
+from icqsol import util
+
+shape_mgr = ShapeManager(file_format=util.VTK_FORMAT,
+                         vtk_dataset_type='POLYDATA')
+
+
+def getMeshes(nTheta):
+    """
+    Coarse sphere and its refinement, each triangle split into 4
+    """
+    s = shape_mgr.createShape('sphere',
+                              origin=(0., 0., 0.),
+                              radius=1.0,
+                              n_theta=nTheta,
+                              n_phi=nTheta//2)
+    pdata = shape_mgr.shapeToVTKPolyData(s)
+    triFilter = vtk.vtkTriangleFilter()
+    triFilter.SetInputData(pdata)
+    triFilter.Update()
+    subdivFilter = vtk.vtkLinearSubdivisionFilter()
+    subdivFilter.SetInputData(triFilter.GetOutput())
+    subdivFilter.SetNumberOfSubdivisions(1)
+    subdivFilter.Update()
+    return triFilter.GetOutput(), subdivFilter.GetOutput()
+
+
+for method, solver, storage in (GALERKIN, CG, 'packed'), (COLLOCATION, GMRES, 'stream'):
+    numIters = []
+    for nTheta in 8, 16:
+        coarse, fine = getMeshes(nTheta)
+
+        rsps = {}
+        iters = {}
+        for precond in DIAGONAL, TWO_LEVEL:
+            slv = LaplaceSolver(fine, max_edge_length=float('inf'), method=method,
+                                storage=storage, solver=solver, tol=1.e-10,
+                                preconditioner=precond, coarse_mesh=coarse)
+            slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+            rsps[precond] = slv.computeResponseField()
+            iters[precond] = slv.numIterations
+        error = numpy.linalg.norm(rsps[TWO_LEVEL] - rsps[DIAGONAL]) / numpy.linalg.norm(rsps[DIAGONAL])
+        print('{0} {1}, {2} triangles: {3} iterations ({4} diagonal), error {5}'.format(
+            method, solver, slv.numTriangles, iters[TWO_LEVEL], iters[DIAGONAL], error))
+        assert(error < 1.e-6)
+        assert(iters[TWO_LEVEL] < iters[DIAGONAL])
+        numIters.append(iters[TWO_LEVEL])
+
+    # the iteration count stays about flat
+    assert(numIters[1] <= numIters[0] + 2)
+
+# default coarse mesh, the input refined with COARSENING_FACTOR times the
+# maximum edge length
+coarse, fine = getMeshes(8)
+maxEdgeLength = 0.3
+for precond in DIAGONAL, TWO_LEVEL:
+    slv = LaplaceSolver(coarse, max_edge_length=maxEdgeLength, solver=CG,
+                        preconditioner=precond)
+    slv.setSourceFromExpression('1.0/sqrt(x**2 + y**2 + (z - 3.)**2)')
+    rsps[precond] = slv.computeResponseField()
+    iters[precond] = slv.numIterations
+error = numpy.linalg.norm(rsps[TWO_LEVEL] - rsps[DIAGONAL]) / numpy.linalg.norm(rsps[DIAGONAL])
+print('default coarse mesh, {0} triangles: {1} iterations ({2} diagonal), error {3}'.format(
+    slv.numTriangles, iters[TWO_LEVEL], iters[DIAGONAL], error))
+assert(error < 1.e-6)
+assert(iters[TWO_LEVEL] < iters[DIAGONAL])
+
+# the refinement cannot coarsen the input
+try:
+    LaplaceSolver(fine, max_edge_length=float('inf'), solver=CG, preconditioner=TWO_LEVEL)
+    assert(False)
+except RuntimeError as err:
+    print(err)
+
+# a coarse mesh as fine as the fine mesh is rejected
+slv = LaplaceSolver(fine, max_edge_length=float('inf'), solver=CG, preconditioner=TWO_LEVEL,
+                    coarse_mesh=fine)
+slv.setSourceFromExpression('1.0')
+try:
+    slv.computeResponseField()
+    assert(False)
+except RuntimeError as err:
+    print(err)
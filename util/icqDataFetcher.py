@@ -2,6 +2,7 @@
 
 from __future__ import print_function
 import vtk
+from vtk.util import numpy_support
 import numpy
 
 def getArrayIndexFromName(data, name):
@@ -36,25 +37,14 @@ def getArrayIndexFromNameAndProjectOntoCells(pdata, name):
         index2 = getArrayIndexFromName(pointData, name)
 
         if index2 >= 0:
-            # Project from points to cells
-            pointArr = pointData.GetArray(index2)
-            numCells = pdata.GetNumberOfPolys()
-            cellArr = vtk.vtkDoubleArray()
+            # Project from points to cells, all the components (e.g. time points)
+            pointArr = numpy_support.vtk_to_numpy(pointData.GetArray(index2))
+            # We know for sure that all cells are triangles, (3, ia, ib, ic)
+            conn = numpy_support.vtk_to_numpy(pdata.GetPolys().GetData()).reshape((-1, 4))
+            cellVals = pointArr[conn[:, 1:]].mean(axis=1)
+            cellArr = numpy_support.numpy_to_vtk(numpy.ascontiguousarray(cellVals, numpy.float64),
+                                                 deep=1)
             cellArr.SetName(name) # same name as the point array
-            cellArr.SetNumberOfComponents(1)
-            cellArr.SetNumberOfTuples(numCells)
-            cells = pdata.GetPolys()
-            ptIds = vtk.vtkIdList()
-            cells.InitTraversal()
-            for i in range(numCells):
-                cells.GetNextCell(ptIds)
-                # We know for sure that all cells are triangles
-                ia, ib, ic = ptIds.GetId(0), \
-                    ptIds.GetId(1), ptIds.GetId(2)
-                va = pointArr.GetComponent(ia, 0)
-                vb = pointArr.GetComponent(ib, 0)
-                vc = pointArr.GetComponent(ic, 0)
-                cellArr.SetComponent(i, 0, (va + vb + vc)/3.)
             # Add the cell array
             cellData.AddArray(cellArr)
             return getArrayIndexFromName(cellData, name)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""
+@brief Vectorized evaluation of user supplied expressions, e.g.
+       'sin(pi*x)*cos(pi*y)*(1 + t)'. The expression is parsed once,
+       checked against the allowed names and node types and compiled.
+       It is then evaluated over whole numpy arrays of x, y, z and t.
+"""
+
+from __future__ import print_function
+import ast
+import numbers
+import numpy
+
+# The math names that can appear in an expression, mapped onto their
+# numpy (element wise) counterparts
+FUNCTIONS = {
+    'sqrt': numpy.sqrt,
+    'sin': numpy.sin,
+    'cos': numpy.cos,
+    'tan': numpy.tan,
+    'asin': numpy.arcsin,
+    'acos': numpy.arccos,
+    'atan': numpy.arctan,
+    'atan2': numpy.arctan2,
+    'log': numpy.log,
+    'exp': numpy.exp,
+    'abs': numpy.abs,
+    # generated when rewriting 'and', 'or', 'not' and 'a if c else b'
+    '_logical_and': numpy.logical_and,
+    '_logical_or': numpy.logical_or,
+    '_logical_not': numpy.logical_not,
+    '_where': numpy.where,
+}
+
+CONSTANTS = {
+    'pi': numpy.pi,
+    'e': numpy.e,
+}
+
+VARIABLES = ('x', 'y', 'z', 't')
+
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare,
+                  ast.BoolOp, ast.IfExp, ast.Call, ast.Name, ast.Load,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+                  ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+                  ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+# number literals, ast.Num up to python 3.7, ast.Constant afterwards
+_NUMBER_NODES = tuple([getattr(ast, name) for name in ('Num', 'Constant')
+                       if hasattr(ast, name)])
+
+
+class _ArrayTransformer(ast.NodeTransformer):
+    """
+    Rewrite the constructs that do not apply element wise to numpy arrays
+    """
+
+    def _call(self, name, args, node):
+        res = ast.Call(func=ast.Name(id=name, ctx=ast.Load()),
+                       args=args, keywords=[])
+        return ast.copy_location(res, node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        name = '_logical_and' if isinstance(node.op, ast.And) else '_logical_or'
+        res = node.values[0]
+        for value in node.values[1:]:
+            res = self._call(name, [res, value], node)
+        return res
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._call('_logical_not', [node.operand], node)
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._call('_where', [node.test, node.body, node.orelse], node)
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        # a < b < c  ->  (a < b) and (b < c)
+        res = None
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):
+            cmp = ast.copy_location(ast.Compare(left=left, ops=[op], comparators=[right]), node)
+            res = cmp if res is None else self._call('_logical_and', [res, cmp], node)
+            left = right
+        return res
+
+
+class Expression:
+
+    def __init__(self, expression, variables=VARIABLES):
+        """
+        Constructor, parse and validate the expression
+        @param expression expression string, e.g. 'x**2 + sin(pi*t)'
+        @param variables names of the variables that may appear in
+                         the expression
+        """
+        self.expression = expression
+        self.variables = tuple(variables)
+
+        # Sometimes the received expression has been mangled.
+        for op in [('__gt__', '>'), ('__lt__', '<'),
+                   ('__ge__', '>='), ('__le__', '<='),
+                   ('__eq__', '=='), ('__ne__', '!=')]:
+            expression = expression.replace(op[0], op[1])
+
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as err:
+            msg = 'ERROR: invalid expression "{0}": {1}'.format(self.expression, err)
+            raise RuntimeError(msg)
+        self.__validate(tree)
+
+        tree = ast.fix_missing_locations(_ArrayTransformer().visit(tree))
+        self.code = compile(tree, '<expression>', 'eval')
+
+    def __validate(self, tree):
+        """
+        Check that the expression only involves arithmetic, comparisons,
+        the allowed functions, constants and variables
+        @param tree abstract syntax tree
+        """
+        for node in ast.walk(tree):
+            if isinstance(node, _NUMBER_NODES):
+                value = getattr(node, 'value', getattr(node, 'n', None))
+                if isinstance(value, numbers.Real) and not isinstance(value, bool):
+                    continue
+                msg = 'ERROR: only number literals are allowed in "{0}"'.format(self.expression)
+                raise RuntimeError(msg)
+            if not isinstance(node, _ALLOWED_NODES):
+                msg = 'ERROR: {0} is not allowed in "{1}"'.format(type(node).__name__,
+                                                                 self.expression)
+                raise RuntimeError(msg)
+            if isinstance(node, ast.Name):
+                if node.id not in self.variables and node.id not in CONSTANTS \
+                   and node.id not in FUNCTIONS or node.id.startswith('_'):
+                    msg = 'ERROR: unknown name "{0}" in "{1}"'.format(node.id, self.expression)
+                    raise RuntimeError(msg)
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS \
+                   or node.keywords or getattr(node, 'starargs', None) \
+                   or getattr(node, 'kwargs', None):
+                    msg = 'ERROR: only calls to {0} are allowed in "{1}"'.format(
+                        ', '.join(sorted([f for f in FUNCTIONS if not f.startswith('_')])),
+                        self.expression)
+                    raise RuntimeError(msg)
+
+    def evaluate(self, **values):
+        """
+        Evaluate the expression
+        @param values the variable values (numbers or numpy arrays, which
+                      are broadcast against each other)
+        @return float64 array with the broadcast shape of the values
+        """
+        namespace = dict(FUNCTIONS)
+        namespace.update(CONSTANTS)
+        for name in self.variables:
+            if name in values:
+                namespace[name] = numpy.asarray(values[name], numpy.float64)
+        shape = numpy.broadcast(*[numpy.asarray(v) for v in values.values()]).shape \
+            if values else ()
+        try:
+            res = eval(self.code, {'__builtins__': {}}, namespace)
+        except NameError as err:
+            msg = 'ERROR: missing variable value when evaluating "{0}": {1}'.format(
+                self.expression, err)
+            raise RuntimeError(msg)
+        # constant expressions still yield an array of the full shape
+        return numpy.array(numpy.broadcast_to(res, shape), numpy.float64)
+
+###############################################################################
+
+
+def testExpression():
+    x = numpy.linspace(0., 1., 5)
+    y = 2*x
+    z = -x
+
+    expr = Expression('1.0 + x*y')
+    assert(numpy.allclose(expr.evaluate(x=x, y=y, z=z), 1.0 + x*y))
+
+    # constant expressions are broadcast
+    expr = Expression('1.0')
+    assert(expr.evaluate(x=x, y=y, z=z).shape == x.shape)
+
+    # outer product of points and time points
+    t = numpy.array([0., 0.5, 1.0])
+    expr = Expression('(1.0 + t)/sqrt(x**2 + y**2 + (z - 3.)**2)')
+    res = expr.evaluate(x=x[:, None], y=y[:, None], z=z[:, None], t=t[None, :])
+    assert(res.shape == (len(x), len(t)))
+    assert(abs(res[2, 1] - 1.5/numpy.sqrt(x[2]**2 + y[2]**2 + (z[2] - 3.)**2)) < 1.e-14)
+
+    # comparisons, boolean operators and conditional expressions
+    expr = Expression('0.2 < x < 0.8 and y __gt__ 0.1')
+    assert((expr.evaluate(x=x, y=y) == [0., 1., 1., 1., 0.]).all())
+    expr = Expression('x if not x > 0.5 else atan2(y, 1.)')
+    assert(numpy.allclose(expr.evaluate(x=x, y=y),
+                          numpy.where(x > 0.5, numpy.arctan2(y, 1.), x)))
+
+    # rejected expressions
+    for bad in ('__import__("os")', 'x.real', 'open("f")', 'w + 1', '[x]',
+                'sqrt(x=1)', '"a"', 'x +'):
+        try:
+            Expression(bad)
+            assert(False)
+        except RuntimeError as err:
+            print(err)
+
+if __name__ == '__main__':
+    testExpression()